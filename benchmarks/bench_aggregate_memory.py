@@ -0,0 +1,104 @@
+# bench_aggregate_memory.py
+# 每个SQL键的聚合内存：原来的 defaultdict-of-dicts（字符串逐条覆盖）对比列式表（字符串 intern + 主机/账号计数），
+# 分位数草图、时段分布和按来源的汇总单独列出
+# 用法: python benchmarks/bench_aggregate_memory.py
+
+import json
+import tracemalloc
+from collections import defaultdict
+
+from fake_aliyun import make_record
+from slow_sql.aggregator import MAX_HEAT_ROWS, aggregate_page, new_stats, new_summary
+from slow_sql.decoding import to_record
+from slow_sql.rules import Rules
+
+KEY_COUNT = 50000
+RECORDS_PER_KEY = 4
+SOURCE_COMBINATIONS = 2  # 一个账号、一个数据库、两个主机
+PAGE_SIZE = 100
+
+# 不排除任何记录
+NO_RULES = Rules({})
+
+
+def pages():
+    """按页生成记录，经过一次 JSON 编解码，使每条记录的字符串都是新对象（与解析 API 返回时一致）"""
+    total = KEY_COUNT * RECORDS_PER_KEY
+    for start in range(0, total, PAGE_SIZE):
+        page = []
+        for i in range(start, min(start + PAGE_SIZE, total)):
+            record = make_record(i)
+            record["SQLHash"] = f"hash{i % KEY_COUNT}"
+            record["SQLText"] = f"SELECT * FROM t{i % KEY_COUNT} WHERE id = ?"
+            record["HostAddress"] = f"10.0.0.{i // KEY_COUNT % 2}"  # 每个键的记录来自两个主机
+            page.append(record)
+        yield json.loads(json.dumps(page))
+
+
+def legacy_aggregate():
+    """改造前的聚合方式"""
+    summary = defaultdict(lambda: {"count": 0, "total_time": 0.0, "max_time": 0.0, "total_scanned_rows": 0, "total_parse_rows": 0})
+    for page in pages():
+        for record in page:
+            sql = record.get("SQLText", "").strip()
+            key = record.get("SQLHash")
+            query_time = float(record.get("QueryTimeMS", 0))
+            if key not in summary:
+                summary[key]["sql"] = sql
+            summary[key]["count"] += int(record.get("QueryTimes", 1))
+            summary[key]["total_time"] += query_time
+            summary[key]["db_name"] = record.get("DBName", "")
+            summary[key]["max_time"] = max(summary[key]["max_time"], query_time)
+            summary[key]["host_address"] = record.get("HostAddress", "")
+            summary[key]["username"] = record.get("AccountName", "")
+            summary[key]["total_scanned_rows"] += int(record.get("ScanRows", 0))
+            summary[key]["total_parse_rows"] += int(record.get("ParseRowCounts", 0))
+    return summary
+
+
+def table_aggregate():
+    summary, stats = new_summary(), new_stats()
+    for page in pages():
+        aggregate_page(summary, [to_record(record) for record in page], NO_RULES, stats)
+    return summary
+
+
+def retained_bytes(func):
+    """返回 (聚合结果占用的内存, {单独列出的部分: 占用的内存})"""
+    tracemalloc.start()
+    summary = func()
+    current, _ = tracemalloc.get_traced_memory()
+    parts = {}
+    if hasattr(summary, "time_sketch"):
+        # 依次释放，每一部分的内存为释放前后的差值
+        for name, attributes, empty in (("sketches", ("time_sketch", "scan_sketch"), None),
+                                        ("heat", ("heat",), {}), ("source_totals", ("source_totals",), {})):
+            before = tracemalloc.get_traced_memory()[0]
+            for attribute in attributes:
+                setattr(summary, attribute, empty)
+            parts[name] = before - tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(summary) == KEY_COUNT
+    return current, parts
+
+
+def main():
+    legacy, _ = retained_bytes(legacy_aggregate)
+    table, parts = retained_bytes(table_aggregate)
+    columns = table - sum(parts.values())
+    print(f"{KEY_COUNT} 个SQL键，每个键 {RECORDS_PER_KEY} 条记录（来自两个主机）")
+    print("| 聚合方式 | 总内存(MB) | 每个键(字节) |")
+    print("|----------|-----------|-------------|")
+    print(f"| defaultdict-of-dicts | {legacy / 1024 / 1024:.1f} | {legacy / KEY_COUNT:.0f} |")
+    print(f"| 列式表 + intern + 计数（同样的字段） | {columns / 1024 / 1024:.1f} | {columns / KEY_COUNT:.0f} |")
+    print(f"| 耗时/扫描行数分位数草图 | {parts['sketches'] / 1024 / 1024:.1f} | {parts['sketches'] / KEY_COUNT:.0f} |")
+    # 以下两项有上限，不随SQL键数增长，按键平均只是为了对比
+    print(f"| 时段分布（最多 {2 * MAX_HEAT_ROWS} 行，与键数无关） | {parts['heat'] / 1024 / 1024:.1f} | {parts['heat'] / KEY_COUNT:.0f} |")
+    print(f"| (账号, 主机, 数据库) 汇总（{SOURCE_COMBINATIONS} 个组合，与键数无关） | "
+          f"{parts['source_totals'] / 1024 / 1024:.1f} | {parts['source_totals'] / KEY_COUNT:.0f} |")
+    print(f"\n同样的字段每个键节省 {(1 - columns / legacy) * 100:.0f}% 内存，且保留了每个SQL全部主机的执行次数；"
+          f"分位数草图随键数增长，时段分布和按来源的汇总有上限")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_analysis.py
+# SQL 分析缓存：连续若干周生成报告时每周 Top-200 的缓存命中率和分析耗时（首周全部未命中，之后只解析新出现的SQL），
+# 以及不使用缓存时每周全部重新解析的耗时；最后检查缓存条目数不超过上限
+# 用法: python benchmarks/bench_analysis.py [--weeks 12] [--churn 0.1] [--cache-size 1000]
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.analysis import AnalysisCache, analyze, open_analysis_cache
+
+TOP_K = 200
+TABLES = [f"t_{name}_{i}" for name in ("orders", "users", "payments", "coupons", "logs") for i in range(20)]
+COLUMNS = ["user_id", "status", "created_at", "updated_at", "amount", "shop_id", "type", "deleted", "code", "name"]
+
+
+def random_sql(rng):
+    """随机组合表、条件列、排序和分页，得到结构各不相同的SQL（字面量随机，指纹由结构决定）"""
+    table, other = rng.sample(TABLES, 2)
+    columns = rng.sample(COLUMNS, rng.randrange(1, 4))
+    conditions = [f"a.{column} = {rng.randrange(10 ** 6)}" for column in columns[:-1]]
+    conditions.append(f"a.{columns[-1]} >= '2024-01-{rng.randrange(1, 29):02d}'")
+    if rng.random() < 0.2:
+        conditions.append(f"a.name LIKE '%{rng.randrange(1000)}'")
+    join = f" JOIN {other} b ON a.id = b.{rng.choice(COLUMNS)}" if rng.random() < 0.3 else ""
+    order = f" ORDER BY a.{rng.choice(COLUMNS)} DESC LIMIT {rng.randrange(0, 50000)}, 20" if rng.random() < 0.5 else ""
+    return f"SELECT a.* FROM {table} a{join} WHERE {' AND '.join(conditions)}{order}"
+
+
+def weekly_tops(weeks, churn, rng):
+    """每周的 Top-200：每周约 churn 比例的SQL换成新出现的SQL，其余与上周相同（同一结构、不同字面量）"""
+    top = [random_sql(rng) for _ in range(TOP_K)]
+    tops = []
+    for _ in range(weeks):
+        tops.append(list(top))
+        top = [random_sql(rng) if rng.random() < churn else sql for sql in top]
+    return tops
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--churn", type=float, default=0.1, help="每周新出现的SQL比例")
+    parser.add_argument("--cache-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    tops = weekly_tops(args.weeks, args.churn, random.Random(21))
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "analysis.db")
+    first_week = datetime.datetime(2025, 1, 6)
+    print("| 周 | 命中 | 新解析 | 命中率 | 缓存分析(ms) | 全部重新解析(ms) |")
+    print("|----|------|--------|--------|-------------|-----------------|")
+    total_cached = total_uncached = 0.0
+    try:
+        for week, top in enumerate(tops):
+            # 每周是一次独立的运行：重新打开缓存，进程内没有已解析的结果
+            started = time.perf_counter()
+            cache = AnalysisCache(open_analysis_cache(path), args.cache_size, first_week + datetime.timedelta(weeks=week))
+            cached = cache.analyze_all(top)
+            cache.conn.close()
+            cached_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            uncached = [analyze(sql) for sql in top]
+            uncached_ms = (time.perf_counter() - started) * 1000
+            assert cached == uncached, "缓存的解析结果与重新解析的结果不一致"
+
+            total_cached += cached_ms
+            total_uncached += uncached_ms
+            print(f"| {week + 1} | {cache.hits} | {cache.misses} | {cache.hits * 100 / len(top):.0f}% | "
+                  f"{cached_ms:.1f} | {uncached_ms:.1f} |")
+        conn = open_analysis_cache(path)
+        (entries,) = conn.execute("SELECT COUNT(*) FROM sql_analysis").fetchone()
+        conn.close()
+        assert entries <= args.cache_size, f"缓存条目数 {entries} 超过上限 {args.cache_size}"
+    finally:
+        shutil.rmtree(directory)
+    print(f"合计: 使用缓存 {total_cached:.1f}ms，全部重新解析 {total_uncached:.1f}ms；缓存条目 {entries}/{args.cache_size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_card_split.py
+# 飞书卡片拆分：Top-200 周报按不同的字节上限拆分为多张卡片，检查每张卡片序列化后都不超过上限，
+# 并对比每加一个元素就重新序列化整张卡片检查大小的做法与按元素累计字节数（render.CardSplitter）的耗时
+# 用法: python benchmarks/bench_card_split.py [--records 200000]
+
+import argparse
+import datetime
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql import render
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary, top_items
+from slow_sql.decoding import to_record
+from slow_sql.feishu import encode_payload
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.report import TOP_K, build_report
+from slow_sql.rules import Rules
+from slow_sql.settings import DEFAULTS
+from slow_sql.synthetic import SyntheticClient
+
+BUDGETS = (4000, 10000, 20000, 30000)
+WEEK_START = datetime.datetime(2024, 1, 1)
+
+RULES = Rules()
+
+
+class BenchConfig(object):
+    REGRESSION_BASELINE_WEEKS = DEFAULTS["REGRESSION_BASELINE_WEEKS"]
+
+
+def make_report(total_records):
+    week_end = WEEK_START + datetime.timedelta(days=7)
+    client = SyntheticClient(total_records, WEEK_START, week_end)
+    summary, stats = new_summary(), new_stats()
+    for offset in range(0, total_records, PAGE_SIZE):
+        records = client.records("rm-bench", 0, 7 * 1440 - 1, offset, PAGE_SIZE)
+        aggregate_page(summary, [to_record(record) for record in records], RULES, stats)
+    result = {"summary": summary, "stats": stats, "total_records": stats["fetched"], "instance_results": {},
+              "failed_instances": []}
+    return build_report(BenchConfig, 1, WEEK_START, week_end, result, "", None, top_items(summary, TOP_K))
+
+
+def split_by_reserializing(elements, title, max_bytes):
+    """对照组：每加入一个元素就序列化整张卡片检查大小，超过时移到新卡片"""
+    cards = [render.new_card(title, "red")]
+    for element in elements:
+        current = cards[-1]["card"]["elements"]
+        current.append(element)
+        if len(encode_payload(cards[-1])) > max_bytes and len(current) > 1:
+            current.pop()
+            cards.append(render.new_card(title, "red"))
+            cards[-1]["card"]["elements"].append(element)
+    return cards
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+
+    report = make_report(args.records)
+    single = render.build_report_cards(report, 10 ** 9)
+    print(f"Top-{len(report['top'])}，不拆分时卡片 {len(encode_payload(single[0])):,} 字节")
+    print("| 上限(字节) | 卡片数 | 最大卡片(字节) | 按元素累计(ms) | 每次重新序列化(ms) |")
+    print("|-----------|-------|--------------|--------------|------------------|")
+    elements = single[0]["card"]["elements"]
+    title = render.report_title(report)
+    for max_bytes in BUDGETS:
+        seconds, cards = timed(render.build_report_cards, report, max_bytes)
+        sizes = [len(encode_payload(card)) for card in cards]
+        assert max(sizes) <= max_bytes, f"卡片 {max(sizes)} 字节，超过上限 {max_bytes}"
+        # 拆分不丢失、不重复内容：各卡片的元素按顺序拼接后与不拆分时一致（分隔线和表格分段除外）
+        details = [element for card in cards for element in card["card"]["elements"] if element.get("fields")]
+        assert details == [element for element in elements if element.get("fields")]
+        naive_seconds, _ = timed(split_by_reserializing, elements, title, max_bytes)
+        print(f"| {max_bytes:,} | {len(cards)} | {max(sizes):,} | {seconds * 1000:.1f} | {naive_seconds * 1000:.1f} |")
+    print(f"默认上限 FEISHU_CARD_MAX_BYTES = {DEFAULTS['FEISHU_CARD_MAX_BYTES']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_combined.py
+# 综合报告：合成一周数据（模板统计 + 明细）并录制，回放时每个请求模拟网络延迟，
+# 对比先后拉取两个API与并发拉取的耗时，以及按SQL指纹关联模板与明细的耗时和关联率
+# 用法: python benchmarks/bench_combined.py [--records 200000] [--instances 2] [--latency 0.05]
+
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql import combined, report, statistics, synthetic
+from slow_sql.fetcher import last_days
+from slow_sql.replay import ReplayClient, read_manifest_time
+
+
+class BenchConfig(object):
+    pass
+
+
+class DelayedClient(object):
+    """回放录制的响应，每个请求先等待 latency 秒，模拟调用阿里云 API 的网络往返"""
+
+    def __init__(self, client, latency):
+        self.client = client
+        self.latency = latency
+
+    def do_action_with_exception(self, request):
+        time.sleep(self.latency)
+        return self.client.do_action_with_exception(request)
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200000, help="每个实例的明细记录数")
+    parser.add_argument("--instances", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟的单次请求耗时（秒）")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        instance_ids = [f"rm-bench{i}" for i in range(args.instances)]
+        elapsed, _ = timed(synthetic.main, ["--records", str(args.records), "--instances", ",".join(instance_ids),
+                                            "--output", directory, "--statistics"])
+        print(f"合成并录制 {args.instances} 个实例、每个实例 {args.records} 条明细耗时 {elapsed:.1f}s，"
+              f"回放时每个请求延迟 {args.latency * 1000:.0f}ms")
+        instances = [{"instance_id": instance_id, "region_id": "local"} for instance_id in instance_ids]
+        clients = {"local": DelayedClient(ReplayClient(directory), args.latency)}
+        _, _, window_start, window_end = last_days(7, read_manifest_time(directory))
+
+        template_seconds, (templates, _, _) = timed(statistics.collect, BenchConfig, instances, window_start, window_end,
+                                                    replay_dir=directory, clients=clients)
+        record_seconds, _ = timed(report.collect, BenchConfig, instances, window_start, window_end,
+                                  replay_dir=directory, clients=clients)
+        concurrent_seconds, (templates, _, _, records_result, _) = timed(
+            combined.collect, BenchConfig, instances, window_start, window_end, replay_dir=directory, clients=clients)
+
+        started = time.perf_counter()
+        groups = combined.group_templates(templates)
+        items, matching = combined.join(groups, records_result["summary"])
+        join_seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory)
+
+    print("| 步骤 | 耗时(s) |")
+    print("|------|--------|")
+    print(f"| 拉取模板统计（DescribeSlowLogs） | {template_seconds:.2f} |")
+    print(f"| 拉取明细并聚合（DescribeSlowLogRecords） | {record_seconds:.2f} |")
+    print(f"| 先后拉取合计 | {template_seconds + record_seconds:.2f} |")
+    print(f"| 并发拉取（combined.collect） | {concurrent_seconds:.2f} |")
+    print(f"| 按指纹关联 | {join_seconds:.3f} |")
+    total_count = sum(item["count"] for item in items)
+    print(f"{len(templates)} 条模板统计合并为 {len(groups)} 条SQL，明细聚合为 {len(records_result['summary'])} 条SQL；"
+          f"{matching['matched']} 条模板关联到明细，明细样本 {matching['sample_count']} 次执行"
+          f"（模板统计 {total_count} 次），{matching['unmatched_sql']} 条明细SQL没有对应的模板")
+
+
+if __name__ == "__main__":
+    main()
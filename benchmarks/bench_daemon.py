@@ -0,0 +1,120 @@
+# bench_daemon.py
+# 常驻模式长时间运行：用合成慢日志模拟连续多天、每5分钟拉取一次，第8天上午注入一条突增的慢SQL，
+# 检查告警是否及时触发、有没有误报，以及每轮耗时和内存是否随运行时间保持稳定。
+# 内存默认为进程当前的常驻内存；--tracemalloc 时为 Python 分配的内存（更准确，但每轮耗时会变为数倍）
+# 用法: python benchmarks/bench_daemon.py [--records-per-day 20000] [--days 8] [--tracemalloc]（--days 至少为 8 才包含突增）
+
+import argparse
+import contextlib
+import datetime
+import os
+import time
+import tracemalloc
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.daemon import Monitor
+from slow_sql.settings import DEFAULTS
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+START = datetime.datetime(2024, 1, 1)
+POLL_INTERVAL = datetime.timedelta(minutes=5)
+# 突增：第8天 10:00 起30分钟，每分钟额外执行 SPIKE_PER_MINUTE 次一条此前没有出现过的慢SQL
+SPIKE_START = START + datetime.timedelta(days=7, hours=10)
+SPIKE_MINUTES = 30
+SPIKE_PER_MINUTE = 40
+SPIKE_HASH = "spike-sql-hash"
+
+
+class BenchConfig(object):
+    pass
+
+
+def current_rss():
+    """进程当前的常驻内存（字节，读取 /proc/self/statm），无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class SpikeClient(SyntheticClient):
+    """在 SyntheticClient 的基础上，SPIKE_START 起每分钟多出 SPIKE_PER_MINUTE 条同一SQL的记录"""
+
+    def __init__(self, total_records, start_time, end_time):
+        super().__init__(total_records, start_time, end_time)
+        counts = [self.prefix[m + 1] - self.prefix[m] for m in range(len(self.prefix) - 1)]
+        first = self.minute_index(SPIKE_START)
+        self.spike = range(first, first + SPIKE_MINUTES)
+        for minute in self.spike:
+            counts[minute] += SPIKE_PER_MINUTE
+        self.prefix = self.prefix[:1]
+        for count in counts:
+            self.prefix.append(self.prefix[-1] + count)
+
+    def minute_records(self, instance_id, minute):
+        records = super().minute_records(instance_id, minute)
+        if minute in self.spike:
+            for record in records[:SPIKE_PER_MINUTE]:
+                record.update(SQLHash=SPIKE_HASH, SQLText="SELECT * FROM orders WHERE remark LIKE '%退款%'",
+                              QueryTimeMS=15000, AccountName="app_rw")
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records-per-day", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=8)
+    parser.add_argument("--tracemalloc", action="store_true", help="用 tracemalloc 统计 Python 分配的内存")
+    args = parser.parse_args()
+    if START + datetime.timedelta(days=args.days) < SPIKE_START + datetime.timedelta(minutes=SPIKE_MINUTES):
+        parser.error(f"--days 至少为 {(SPIKE_START - START).days + 1}，模拟时间需要包含 {SPIKE_START} 开始的突增")
+
+    end = START + datetime.timedelta(days=args.days)
+    client = SpikeClient(args.records_per_day * args.days, START, end)
+    monitor = Monitor(BenchConfig, [{"instance_id": INSTANCE_ID, "region_id": "local"}], {"local": client}, replay=True)
+    now = START + datetime.timedelta(days=1)
+    monitor.warm_up(now)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    alerts_seen = []
+    print(f"每天 {args.records_per_day} 条记录，每 {POLL_INTERVAL.seconds // 60} 分钟拉取一次，"
+          f"突增 {SPIKE_START} 起 {SPIKE_MINUTES} 分钟")
+    print("| 模拟时间 | 累计记录数 | 每轮平均耗时(ms) | 最大耗时(ms) | 7天窗口SQL数 | 内存(MB) | 本日告警 |")
+    print("|---------|-----------|----------------|------------|------------|---------|--------|")
+    total_added = 0
+    day_seconds, day_max, day_polls, day_alerts = 0.0, 0.0, 0, 0
+    while now <= end:
+        # 不输出每一页的拉取日志
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            added, alerts = monitor.poll(now)
+            elapsed = time.perf_counter() - started
+        total_added += added
+        day_seconds += elapsed
+        day_max = max(day_max, elapsed)
+        day_polls += 1
+        day_alerts += len(alerts)
+        alerts_seen.extend((now, alert) for alert in alerts)
+        now += POLL_INTERVAL
+        if now.hour == 0 and now.minute == 0:
+            current = tracemalloc.get_traced_memory()[0] if args.tracemalloc else current_rss()
+            memory = "-" if current is None else f"{current / 1024 / 1024:.1f}"
+            print(f"| {now.date()} | {total_added} | {day_seconds * 1000 / day_polls:.1f} | {day_max * 1000:.1f} | "
+                  f"{len(monitor.live.week.totals)} | {memory} | {day_alerts} |")
+            day_seconds, day_max, day_polls, day_alerts = 0.0, 0.0, 0, 0
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    spike_alerts = [(ts, alert) for ts, alert in alerts_seen if alert["key"][1] == SPIKE_HASH]
+    assert spike_alerts, "突增的SQL没有触发告警"
+    first, alert = spike_alerts[0]
+    print(f"突增的SQL在 {first} 触发告警（突增开始后 {(first - SPIKE_START).seconds // 60} 分钟）: {'；'.join(alert['reasons'])}")
+    print(f"其余告警 {len(alerts_seen) - len(spike_alerts)} 条，默认阈值: 执行次数 >= {DEFAULTS['ALERT_MIN_EXECUTIONS']}，"
+          f"频率 {DEFAULTS['ALERT_RATE_RATIO']} 倍，耗时 {DEFAULTS['ALERT_LATENCY_RATIO']} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_decode.py
+# API 响应解析后端对比：标准库 json、orjson、msgspec 解析 DescribeSlowLogRecords 分页的吞吐，
+# 以及解析后聚合的总吞吐；未安装的后端跳过
+# 用法: python benchmarks/bench_decode.py [--records 200000]
+
+import argparse
+import datetime
+import json
+import random
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary
+from slow_sql.decoding import BACKENDS, page_decoder
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.rules import Rules
+from slow_sql.synthetic import SyntheticClient
+
+# API 返回、但聚合和本地存储用不到的字段（锁等待、CPU、IO 等），只解析需要的字段时可以直接跳过
+EXTRA_FIELDS = ("LockTimes", "CpuTime", "RowsAffectedCount", "LastRowsAffectedCount",
+                "PhysicalIORead", "LogicalIORead", "ApplicationName", "ClientHostName")
+
+RULES = Rules()
+
+
+def make_bodies(total_records):
+    """按页生成响应体（SQLSlowRecord 附带 EXTRA_FIELDS），不计入耗时"""
+    start = datetime.datetime(2024, 1, 1)
+    client = SyntheticClient(total_records, start, start + datetime.timedelta(days=1))
+    rng = random.Random(3)
+    bodies = []
+    for offset in range(0, total_records, PAGE_SIZE):
+        records = client.records("rm-bench", 0, 1439, offset, PAGE_SIZE)
+        for record in records:
+            for field in EXTRA_FIELDS:
+                record[field] = f"client-{rng.randrange(50)}" if field.endswith("Name") else rng.randrange(10 ** 6)
+        bodies.append(json.dumps({"TotalRecordCount": len(records), "PageNumber": 1,
+                                  "PageRecordCount": len(records), "Items": {"SQLSlowRecord": records}}).encode())
+    return bodies
+
+
+def run(decode_page, bodies):
+    """返回 (解析耗时, 聚合耗时, summary, 记录数)"""
+    summary, stats = new_summary(), new_stats()
+    decode_seconds = aggregate_seconds = 0.0
+    for body in bodies:
+        started = time.perf_counter()
+        _, records = decode_page(body)
+        decoded = time.perf_counter()
+        aggregate_page(summary, records, RULES, stats)
+        aggregate_seconds += time.perf_counter() - decoded
+        decode_seconds += decoded - started
+    return decode_seconds, aggregate_seconds, summary, stats["fetched"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+
+    bodies = make_bodies(args.records)
+    print(f"{len(bodies)} 页，共 {sum(len(body) for body in bodies) / 1024 / 1024:.1f} MB")
+    print("| 后端 | 解析(记录/秒) | 解析+聚合(记录/秒) | 解析加速比 |")
+    print("|------|-------------|------------------|-----------|")
+    baseline = None
+    reference = None
+    for backend in reversed(BACKENDS):  # 先测标准库 json 作为基准
+        try:
+            decode_page = page_decoder(backend)
+        except ImportError:
+            print(f"| {backend} | 未安装，跳过 | - | - |")
+            continue
+        decode_seconds, aggregate_seconds, summary, fetched = run(decode_page, bodies)
+        # 各后端的聚合结果应当完全一致
+        result = (len(summary), sum(summary.count), sum(summary.total_time), sum(summary.total_scanned_rows))
+        assert reference is None or result == reference, f"{backend} 的聚合结果与标准库 json 不一致"
+        reference = result
+        baseline = baseline or decode_seconds
+        print(f"| {backend} | {fetched / decode_seconds:,.0f} | {fetched / (decode_seconds + aggregate_seconds):,.0f} "
+              f"| {baseline / decode_seconds:.1f}x |")
+
+
+if __name__ == "__main__":
+    main()
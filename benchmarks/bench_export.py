@@ -0,0 +1,107 @@
+# bench_export.py
+# 导出原始记录和每日聚合：不同记录数下 Parquet 与 gzip CSV 的写入吞吐、峰值内存（应与记录数无关）和文件大小，
+# 以及 report --from-export 读回导出文件的吞吐；读回的记录数和执行次数应与写入的一致
+# 用法: python benchmarks/bench_export.py [--records 200000,1000000]
+
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.decoding import to_record
+from slow_sql.export import Exporter, iter_export_pages, resolve_format
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+START = datetime.datetime(2024, 1, 1)
+END = START + datetime.timedelta(days=7)
+
+
+def synthetic_pages(total_records):
+    """逐页生成一周的合成记录，不在内存中保留"""
+    client = SyntheticClient(total_records, START, END)
+    for offset in range(0, total_records, PAGE_SIZE):
+        yield [to_record(record) for record in client.records(INSTANCE_ID, 0, 7 * 1440 - 1, offset, PAGE_SIZE)]
+
+
+def arrow_peak():
+    """pyarrow 的缓冲区不经过 tracemalloc，单独从内存池读取峰值（进程内累计的峰值，只用于 Parquet）"""
+    try:
+        import pyarrow
+    except ImportError:
+        return 0
+    return pyarrow.default_memory_pool().max_memory() or 0
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+
+def timed(pages, spent):
+    """逐页转发，把生成每页的耗时累加到 spent[0]（与写入在同一遍、同样的 tracemalloc 开销下计时）"""
+    pages = iter(pages)
+    while True:
+        started = time.perf_counter()
+        page_records = next(pages, None)
+        spent[0] += time.perf_counter() - started
+        if page_records is None:
+            return
+        yield page_records
+
+
+def export(total_records, fmt, directory):
+    """返回 (写入耗时, 峰值内存, 文件大小)；耗时扣除了生成合成记录的时间"""
+    exporter = Exporter(directory, fmt)
+    generate_seconds = [0.0]
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in exporter.export_pages(INSTANCE_ID, timed(synthetic_pages(total_records), generate_seconds)):
+        pass
+    elapsed = time.perf_counter() - started - generate_seconds[0]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert exporter.totals["records"] == total_records
+    return elapsed, peak + (arrow_peak() if fmt == "parquet" else 0), directory_size(directory)
+
+
+def read_back(directory):
+    started = time.perf_counter()
+    records = executions = 0
+    for page_records in iter_export_pages(directory, INSTANCE_ID, START, END):
+        records += len(page_records)
+        executions += sum(int(record.QueryTimes) for record in page_records)
+    return time.perf_counter() - started, records, executions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", default="200000,1000000", help="逗号分隔的记录数")
+    args = parser.parse_args()
+
+    formats = ["csv"]
+    if resolve_format("auto") == "parquet":
+        formats.insert(0, "parquet")
+    else:
+        print("未安装 pyarrow，只测试 gzip CSV")
+    print("| 格式 | 记录数 | 写入(记录/秒) | 峰值内存(MB) | 文件大小(MB) | 读回(记录/秒) |")
+    print("|------|--------|--------------|-------------|-------------|--------------|")
+    for fmt in formats:
+        for total_records in (int(value) for value in args.records.split(",")):
+            directory = tempfile.mkdtemp()
+            try:
+                elapsed, peak, size = export(total_records, fmt, directory)
+                read_seconds, records, executions = read_back(directory)
+            finally:
+                shutil.rmtree(directory)
+            assert records == executions == total_records, f"读回 {records} 条记录、{executions} 次执行，写入 {total_records} 条"
+            print(f"| {fmt} | {total_records} | {total_records / elapsed:,.0f} | {peak / 1024 / 1024:.1f} | "
+                  f"{size / 1024 / 1024:.1f} | {records / read_seconds:,.0f} |")
+
+
+if __name__ == "__main__":
+    main()
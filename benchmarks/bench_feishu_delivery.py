@@ -0,0 +1,87 @@
+# bench_feishu_delivery.py
+# 飞书推送：对本地桩服务（feishu_stub.py）并发推送到多个群的耗时，
+# 以及失败重试、限流、卡片被拒绝、Webhook 无响应和发件箱补发时的行为（需要安装 requests）
+# 用法: python benchmarks/bench_feishu_delivery.py
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from feishu_stub import start_stub, stop_stub
+from slow_sql.feishu import FeishuClient
+
+WEBHOOK_COUNT = 20
+LATENCY_MS = 200
+CARD = {"msg_type": "interactive", "card": {"elements": [{"tag": "div", "text": {"tag": "lark_md", "content": "x" * 2000}}]}}
+TEXT = {"msg_type": "text", "content": {"text": "慢SQL周报"}}
+
+
+def sequential_without_session(webhooks):
+    """改造前的做法：逐个 requests.post，每次新建连接，没有超时"""
+    import requests
+
+    for webhook in webhooks:
+        requests.post(webhook, data=json.dumps(CARD), headers={"Content-Type": "application/json"})
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        print("未安装 requests，跳过")
+        return
+
+    server, base_url = start_stub()
+    outbox = tempfile.mkdtemp()
+    try:
+        webhooks = [f"{base_url}/slow/{LATENCY_MS}/group{i}" for i in range(WEBHOOK_COUNT)]
+        client = FeishuClient(max_workers=WEBHOOK_COUNT)
+        legacy, _ = timed(sequential_without_session, webhooks)
+        concurrent, sent = timed(client.send_all, webhooks, [CARD])
+
+        # 重试的退避时间缩短到毫秒级，Webhook 无响应时读取超时 1 秒
+        client = FeishuClient(timeout=(1, 1), max_retries=2, base_delay=0.05, outbox_dir=outbox)
+        scenarios = (
+            ("前2次 HTTP 500", f"{base_url}/flaky/2/a", None),
+            ("前2次飞书限流", f"{base_url}/limited/2/b", None),
+            ("卡片被拒绝，改发文本", f"{base_url}/reject/c", TEXT),
+            ("Webhook 无响应", f"{base_url}/hang/d", None),
+            ("连续失败超过重试次数", f"{base_url}/flaky/5/e", None),
+        )
+        rows = []
+        for name, webhook, fallback in scenarios:
+            elapsed, ok = timed(client.send, webhook, [CARD], fallback)
+            path = webhook[len(base_url):]
+            received = [payload["msg_type"] for payload in server.received[path]]
+            rows.append(f"| {name} | {elapsed:.2f} | {server.attempts[path]} | {'成功' if ok else '失败，写入发件箱'} | {received} |")
+
+        # 补发：/flaky/5/e 已失败 3 次，下次运行时再失败 2 次后成功；/hang/d 仍无响应，继续保留
+        elapsed, _ = timed(client.flush_outbox)
+        print()
+        print("| 场景 | 耗时(s) | 请求次数 | 结果 | 收到的消息 |")
+        print("|------|--------|---------|------|-----------|")
+        print("\n".join(rows))
+        print(f"补发发件箱耗时 {elapsed:.2f}s，/flaky/5/e 收到 {len(server.received['/flaky/5/e'])} 条消息，"
+              f"发件箱剩余 {len(os.listdir(outbox))} 条")
+        print()
+        print(f"推送到 {WEBHOOK_COUNT} 个群（每个请求 {LATENCY_MS}ms）:")
+        print("| 方式 | 耗时(s) |")
+        print("|------|--------|")
+        print(f"| 逐个 requests.post | {legacy:.2f} |")
+        print(f"| 共享 Session 并发推送（成功 {sent} 个） | {concurrent:.2f} |")
+    finally:
+        stop_stub(server)
+        shutil.rmtree(outbox)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench_fingerprint.py
+# SQL 指纹吞吐量：未命中缓存（每条文本都不同）与命中缓存（文本重复出现）两种情况，目标单核 10 万条/秒，
+# 结果与 CPU 型号和 Python 版本有关，一并输出；共享主机上单次测量波动较大，每种情况测 ROUNDS 轮取中位数，
+# 同时输出最慢和最快的一轮。另外检查字符串中的 #、-- 不会被当作注释
+# 用法: python benchmarks/bench_fingerprint.py
+
+import platform
+import random
+import statistics
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.fingerprint import fingerprint, fingerprint_key, normalize
+
+TEMPLATES = [
+    "SELECT * FROM orders WHERE user_id = {n} AND status = '{s}' ORDER BY id DESC LIMIT {m}",
+    "select id, name from users where id in ({inlist}) /* batch load */",
+    "UPDATE account SET balance = balance - {f} WHERE id = {n} AND version = {m}",
+    "INSERT INTO audit_log (uid, action, ts) VALUES ({n}, '{s}', '2024-01-0{d} 12:00:00'), ({m}, '{s}', '2024-01-0{d} 13:00:00')",
+    "SELECT o.id, u.name FROM orders o JOIN users u ON o.uid = u.id WHERE o.created_at > '2024-01-0{d}' AND u.city = \"{s}\"  -- report",
+    "DELETE FROM session WHERE expire_at < {n} LIMIT {m}",
+]
+TARGET_PER_SEC = 100000
+ROUNDS = 5
+# 字符串中的注释符号：(语句, 期望的指纹)
+QUOTED_COMMENT_CASES = [
+    ("select * from t where color = '#fff' and id = 5", "select * from t where color=? and id=?"),
+    ("select * from t where color='#000' and deleted=1", "select * from t where color=? and deleted=?"),
+    ("select * from t where note = 'a -- b' and id in (1,2,3)", "select * from t where note=? and id in(?+)"),
+    ("select a--1 from t", "select a--? from t"),
+    ("select 1 /* x */ from t -- trailing\n where a = 'x' # c", "select ? from t where a=?"),
+]
+
+
+def cpu_model():
+    """CPU 型号：Linux 读取 /proc/cpuinfo，其他系统用 platform 的结果"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def make_statements(count, seed=7):
+    rng = random.Random(seed)
+    statements = []
+    for i in range(count):
+        template = TEMPLATES[i % len(TEMPLATES)]
+        statements.append(template.format(
+            n=rng.randint(1, 10 ** 9), m=rng.randint(1, 1000), f=round(rng.random() * 100, 2),
+            d=rng.randint(1, 9), s=f"v{rng.randint(1, 10 ** 6)}",
+            inlist=", ".join(str(rng.randint(1, 10 ** 6)) for _ in range(rng.randint(1, 30)))))
+    return statements
+
+
+def throughput(statements):
+    """每轮先清空缓存，返回各轮的吞吐量（条/秒）"""
+    rates = []
+    for _ in range(ROUNDS):
+        fingerprint.cache_clear()
+        fingerprint_key.cache_clear()
+        started = time.perf_counter()
+        for sql in statements:
+            fingerprint_key(sql)
+        rates.append(len(statements) / (time.perf_counter() - started))
+    return rates
+
+
+def row(name, count, rates):
+    rate = statistics.median(rates)
+    return (f"| {name} | {count} | {rate:,.0f} | {min(rates):,.0f} ~ {max(rates):,.0f} | "
+            f"{'是' if rate >= TARGET_PER_SEC else '否'} |")
+
+
+def main():
+    for sql, expected in QUOTED_COMMENT_CASES:
+        assert normalize(sql) == expected, f"{sql!r} 的指纹为 {normalize(sql)!r}，应为 {expected!r}"
+
+    unique = make_statements(200000)
+    cold = throughput(unique)
+
+    # 1 万种文本重复出现 20 万次，模拟同一业务 SQL 反复出现的慢日志
+    repeated = [unique[i % 10000] for i in range(200000)]
+    warm = throughput(repeated)
+
+    distinct = len({fingerprint(sql) for sql in unique})
+    print(f"{cpu_model()}，Python {platform.python_version()}，单线程")
+    print(f"| 场景 | 语句数 | 吞吐量(条/秒，{ROUNDS}轮中位数) | 最慢 ~ 最快 | 达标(>= 10万/秒) |")
+    print("|------|--------|------------------------|-------------|-----------------|")
+    print(row("未命中缓存", len(unique), cold))
+    print(row("命中缓存", len(repeated), warm))
+    print(f"\n{len(unique)} 条不同文本归并为 {distinct} 个指纹；字符串中的 #、-- 没有被当作注释")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# bench_heatmap.py
+# 时段分布：聚合时逐条累计到168个小时桶的额外耗时（单独计时同样的分桶循环），每行时段分布只保留总耗时最高的行时的内存，
+# 并检查总体时段分布与逐条记录直接统计一致、Top-200 中时段分布完整的SQL比例，以及分片聚合后合并的结果一致
+# 用法: python benchmarks/bench_heatmap.py [--records 500000] [--templates 20000] [--shards 4]
+
+import argparse
+import datetime
+import sys
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.aggregator import MAX_HEAT_ROWS, aggregate_page, combine_summary, new_stats, new_summary, top_items
+from slow_sql.decoding import to_record
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.fingerprint import fingerprint_key
+from slow_sql.heatmap import new_heat, week_hour
+from slow_sql.rules import Rules
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+RULES = Rules()
+TOP_K = 200
+
+
+def make_pages(total_records, template_count):
+    """生成一周的合成记录（不计入耗时，记录数按一天内的时段起伏）"""
+    start = datetime.datetime(2024, 1, 1)
+    client = SyntheticClient(total_records, start, start + datetime.timedelta(days=7), template_count=template_count)
+    return [[to_record(record) for record in client.records(INSTANCE_ID, 0, 7 * 1440 - 1, offset, PAGE_SIZE)]
+            for offset in range(0, total_records, PAGE_SIZE)]
+
+
+def aggregate(pages):
+    summary, stats = new_summary(), new_stats()
+    for page_records in pages:
+        aggregate_page(summary, page_records, RULES, stats)
+    return summary
+
+
+def bucket_loop(pages):
+    """与 aggregate_page 中相同的分桶步骤（每页缓存小时前缀，累加到总体和每个键的数组），用于估计时段分布的开销"""
+    heat_total, heat = new_heat(), {}
+    for page_records in pages:
+        week_hours = {}
+        for record in page_records:
+            start_time = record.ExecutionStartTime or ""
+            bucket = week_hours.get(start_time[:13])
+            if bucket is None:
+                bucket = week_hours[start_time[:13]] = week_hour(start_time)
+            if bucket >= 0:
+                executions = int(record.QueryTimes)
+                heat_total[bucket] += executions
+                row_heat = heat.get(record.SQLHash)
+                if row_heat is None:
+                    row_heat = heat[record.SQLHash] = new_heat()
+                row_heat[bucket] += executions
+    return heat_total
+
+
+def brute_force(pages):
+    """逐条记录直接统计总体和每个SQL键的时段分布（与 aggregate_page 相同的过滤）"""
+    total, by_key = [0] * 168, {}
+    for page_records in pages:
+        for record in page_records:
+            sql = record.SQLText.strip()
+            if not sql or RULES.excluded(record, sql):
+                continue
+            ts = datetime.datetime.strptime(record.ExecutionStartTime, "%Y-%m-%dT%H:%M:%SZ")
+            bucket = ts.weekday() * 24 + ts.hour
+            total[bucket] += int(record.QueryTimes)
+            heat = by_key.setdefault(record.SQLHash or fingerprint_key(sql), [0] * 168)
+            heat[bucket] += int(record.QueryTimes)
+    return total, by_key
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=500000)
+    parser.add_argument("--templates", type=int, default=20000, help="SQL模板数，远大于 MAX_HEAT_ROWS 时触发淘汰")
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    pages = make_pages(args.records, args.templates)
+    started = time.perf_counter()
+    summary = aggregate(pages)
+    aggregate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bucket_loop(pages)
+    bucket_seconds = time.perf_counter() - started
+
+    total, by_key = brute_force(pages)
+    assert list(summary.heat_total) == total, "总体时段分布与逐条记录直接统计不一致"
+    top = top_items(summary, TOP_K, RULES.score)
+    complete = sum(1 for item in top if item["heat"] is not None and list(item["heat"]) == by_key[item["key"]])
+    coverage = min(sum(item["heat"]) / item["count"] if item["heat"] is not None else 0.0 for item in top)
+
+    merged = new_summary()
+    for shard in range(args.shards):
+        combine_summary(merged, aggregate(pages[shard::args.shards]), RULES.score)
+    assert list(merged.heat_total) == total, "分片合并后的总体时段分布不一致"
+    assert len(merged.heat) <= 2 * MAX_HEAT_ROWS, "合并后保留时段分布的行数超过上限"
+
+    row_bytes = sys.getsizeof(new_heat())
+    print(f"{args.records} 条记录，{len(summary)} 条SQL，保留时段分布的行 {len(summary.heat)}（上限 {2 * MAX_HEAT_ROWS}）")
+    print(f"聚合（含时段分布）: {aggregate_seconds:.3f}s（{args.records / aggregate_seconds:,.0f} 记录/秒）")
+    print(f"其中分桶步骤约 {bucket_seconds:.3f}s（聚合耗时的 {bucket_seconds * 100 / aggregate_seconds:.1f}%）")
+    print(f"每行时段分布的内存: {len(summary.heat) * row_bytes / 1024:,.0f}KB"
+          f"（为全部 {len(summary)} 条SQL保留时为 {len(summary) * row_bytes / 1024:,.0f}KB）")
+    print(f"Top-{len(top)} 中时段分布完整的SQL: {complete} 条，最低覆盖 {coverage:.1%} 的执行")
+    print("总体时段分布与逐条记录直接统计、分片聚合后合并的结果一致")
+
+
+if __name__ == "__main__":
+    main()
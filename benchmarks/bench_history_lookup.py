@@ -0,0 +1,73 @@
+# bench_history_lookup.py
+# 周环比查询耗时：本地历史中累积一年（52周）的每周聚合结果后，对比本周 Top-200 所需的时间
+# 用法: python benchmarks/bench_history_lookup.py
+
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary, top_items
+from slow_sql.decoding import SlowRecord
+from slow_sql.history import compare_weeks, init_history, save_week, week_key
+from slow_sql.rules import Rules
+
+KEY_COUNT = 20000  # 每周不同SQL的数量
+WEEKS = 52
+TOP_K = 200
+
+# 不排除任何记录
+NO_RULES = Rules({})
+
+
+def make_summary(week_index, rng):
+    summary = new_summary()
+    stats = new_stats()
+    records = []
+    for i in range(KEY_COUNT):
+        # 每周约有 5% 的SQL是新出现的
+        key = i if rng.random() > 0.05 else KEY_COUNT * (week_index + 1) + i
+        for _ in range(2):
+            records.append(SlowRecord(
+                SQLHash=f"hash{key}",
+                SQLText=f"SELECT * FROM t{key % 100} WHERE id = ?",
+                QueryTimeMS=rng.uniform(1000, 5000) * (1 + (key % 7 == week_index % 7)),
+                ScanRows=rng.randint(0, 100000),
+                DBName="shop",
+                HostAddress="10.0.0.1",
+                AccountName="app_rw",
+            ))
+    aggregate_page(summary, records, NO_RULES, stats)
+    return summary
+
+
+def main():
+    rng = random.Random(5)
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    conn = init_history(sqlite3.connect(path))
+    first_week = datetime.datetime(2025, 1, 6)
+
+    started = time.perf_counter()
+    for week_index in range(WEEKS):
+        save_week(conn, week_key(first_week + datetime.timedelta(weeks=week_index)), make_summary(week_index, rng))
+    print(f"写入 {WEEKS} 周 × {KEY_COUNT} 条SQL 的历史: {time.perf_counter() - started:.1f}s，"
+          f"数据库 {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+
+    summary = make_summary(WEEKS, rng)
+    top = top_items(summary, TOP_K)
+    week = week_key(first_week + datetime.timedelta(weeks=WEEKS))
+    conn = init_history(sqlite3.connect(path))  # 重新打开，不使用写入时的页缓存
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        changes = compare_weeks(conn, summary, top, week)
+        timings.append(time.perf_counter() - started)
+    print(f"对比本周 Top-{TOP_K} 与前4周: 首次 {timings[0] * 1000:.1f}ms，之后 {min(timings[1:]) * 1000:.1f}ms "
+          f"（新增 {len(changes['new'])}，变慢 {len(changes['regressed'])}，好转 {len(changes['improved'])}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# bench_importtime.py
+# 启动时的导入耗时（python -X importtime）：CLI 启动、离线/演练模式需要的模块，
+# 以及原来脚本那样在启动时就导入阿里云 SDK 和 requests 的情况
+# 用法: python benchmarks/bench_importtime.py
+
+import importlib.util
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+# 原来的脚本在启动时导入的第三方模块（需要安装后才能测量）
+EAGER_MODULES = (
+    "aliyunsdkcore.client",
+    "aliyunsdkrds.request.v20140815.DescribeSlowLogRecordsRequest",
+    "requests",
+)
+
+SCENARIOS = (
+    ("CLI 启动（--help、参数错误）", ["slow_sql.cli"]),
+    ("离线/演练模式（report --offline --dry-run）", ["slow_sql.cli", "slow_sql.report"]),
+    ("启动时导入 SDK 和 requests（改造前）", ["slow_sql.cli", "slow_sql.report"] + list(EAGER_MODULES)),
+)
+
+
+def import_time_us(modules):
+    """在新的解释器中导入 modules，返回 -X importtime 统计的顶层模块累计耗时之和（微秒）"""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        # 格式: "import time: self [us] | cumulative | imported package"，顶层模块没有缩进
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total
+
+
+def main():
+    missing = [module for module in EAGER_MODULES if importlib.util.find_spec(module.split(".")[0]) is None]
+    results = []
+    for name, modules in SCENARIOS:
+        eager = any(module in EAGER_MODULES for module in modules)
+        if eager and missing:
+            results.append((name, None))
+            continue
+        results.append((name, min(import_time_us(modules) for _ in range(RUNS)) / 1000))
+
+    baseline = results[-1][1]
+    print(f"| 场景 | 导入耗时(ms，{RUNS}次最小值) | 占改造前的比例 |")
+    print("|------|------------------------|--------------|")
+    for name, elapsed in results:
+        if elapsed is None:
+            print(f"| {name} | 未安装 {', '.join(missing)}，跳过 | - |")
+        else:
+            print(f"| {name} | {elapsed:.1f} | {f'{elapsed * 100 / baseline:.0f}%' if baseline else '-'} |")
+
+
+if __name__ == "__main__":
+    main()
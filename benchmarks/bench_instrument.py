@@ -0,0 +1,103 @@
+# bench_instrument.py
+# 运行指标的开销：聚合同一批记录时，每页按 report / fetcher 中的方式计时和计数（aggregate、decode 两个阶段和三个计数）
+# 与不计时的耗时对比（交替运行取最小值），以及单次阶段计时、计数的耗时；最后给出开启 --profile（cProfile）时的耗时作为参照
+# 用法: python benchmarks/bench_instrument.py [--records 200000] [--repeat 5]
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql import instrument
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary
+from slow_sql.decoding import to_record
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.rules import Rules
+from slow_sql.synthetic import SyntheticClient
+
+RULES = Rules()
+
+
+def make_pages(total_records):
+    start = datetime.datetime(2024, 1, 1)
+    client = SyntheticClient(total_records, start, start + datetime.timedelta(days=7))
+    return [[to_record(record) for record in client.records("rm-bench", 0, 7 * 1440 - 1, offset, PAGE_SIZE)]
+            for offset in range(0, total_records, PAGE_SIZE)]
+
+
+def plain(pages):
+    summary, stats = new_summary(), new_stats()
+    for page_records in pages:
+        aggregate_page(summary, page_records, RULES, stats)
+
+
+def instrumented(pages):
+    summary, stats = new_summary(), new_stats()
+    for page_records in pages:
+        with instrument.stage("decode"):
+            pass
+        instrument.count("api_pages")
+        instrument.count("api_bytes", 40000)
+        instrument.count("api_records", len(page_records))
+        with instrument.stage("aggregate"):
+            aggregate_page(summary, page_records, RULES, stats)
+
+
+def timed_once(func, pages):
+    started = time.perf_counter()
+    func(pages)
+    return time.perf_counter() - started
+
+
+def per_call(n=200000):
+    """单次阶段计时（进入和退出）与单次计数的耗时（微秒）"""
+    started = time.perf_counter()
+    for _ in range(n):
+        with instrument.stage("bench"):
+            pass
+    stage_us = (time.perf_counter() - started) / n * 1e6
+    started = time.perf_counter()
+    for _ in range(n):
+        instrument.count("bench")
+    return stage_us, (time.perf_counter() - started) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = make_pages(args.records)
+    instrument.start_run("bench")
+    plain_seconds = instrumented_seconds = float("inf")
+    # 交替运行，减少 CPU 频率、缓存等随时间变化的影响
+    for _ in range(args.repeat):
+        plain_seconds = min(plain_seconds, timed_once(plain, pages))
+        instrumented_seconds = min(instrumented_seconds, timed_once(instrumented, pages))
+    stage_us, count_us = per_call()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.pstats")
+    started = time.perf_counter()
+    instrument.run_profiled(lambda: plain(pages), path, limit=0)
+    profiled_seconds = time.perf_counter() - started
+    os.remove(path)
+    os.rmdir(directory)
+
+    overhead = (instrumented_seconds - plain_seconds) / plain_seconds * 100
+    print(f"{args.records} 条记录，{len(pages)} 页")
+    print("| 方式 | 耗时(s) | 吞吐(记录/秒) | 相对不计时 |")
+    print("|------|---------|--------------|-----------|")
+    for name, seconds in (("不计时", plain_seconds), ("每页计时和计数", instrumented_seconds),
+                          ("--profile（cProfile）", profiled_seconds)):
+        print(f"| {name} | {seconds:.3f} | {args.records / seconds:,.0f} | "
+              f"{(seconds - plain_seconds) / plain_seconds * 100:+.1f}% |")
+    print(f"单次阶段计时 {stage_us:.2f}µs，单次计数 {count_us:.2f}µs；每页的计时和计数开销约为聚合耗时的 "
+          f"{(2 * stage_us + 3 * count_us) * len(pages) / 1e6 / plain_seconds * 100:.2f}%（实测差异 {overhead:+.2f}%）")
+
+
+if __name__ == "__main__":
+    main()
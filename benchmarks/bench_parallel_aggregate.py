@@ -0,0 +1,81 @@
+# bench_parallel_aggregate.py
+# 多进程聚合的扩展性：同一批合成记录分别用 1（主进程）、2、4、8 个工作进程聚合，
+# 对比吞吐和加速比，并检查合并后的聚合结果与单进程一致
+# 用法: python benchmarks/bench_parallel_aggregate.py [--records 1000000] [--workers 1,2,4,8]
+
+import argparse
+import datetime
+import math
+import os
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary
+from slow_sql.decoding import to_record
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.parallel import ShardedAggregator
+from slow_sql.rules import Rules
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+
+RULES = Rules()
+
+
+def make_pages(total_records):
+    """生成一周的合成记录（不计入耗时）"""
+    start = datetime.datetime(2024, 1, 1)
+    client = SyntheticClient(total_records, start, start + datetime.timedelta(days=7))
+    return [[to_record(record) for record in client.records(INSTANCE_ID, 0, 7 * 1440 - 1, offset, PAGE_SIZE)]
+            for offset in range(0, total_records, PAGE_SIZE)]
+
+
+def aggregate_in_process(pages):
+    summary, stats = new_summary(), new_stats()
+    for page_records in pages:
+        aggregate_page(summary, page_records, RULES, stats)
+    return summary, stats
+
+
+def aggregate_sharded(pages, processes):
+    """包含启动工作进程、分片发送和合并的全部耗时"""
+    aggregator = ShardedAggregator(processes, RULES)
+    try:
+        aggregator.feed(INSTANCE_ID, pages)
+        return aggregator.finish()[INSTANCE_ID]
+    finally:
+        aggregator.close()
+
+
+def totals(summary, stats):
+    """与行顺序无关的聚合结果，用于检查多进程与单进程是否一致（总耗时是浮点数，单独按相对误差比较）"""
+    return (len(summary), sum(summary.count), max(summary.max_time), sum(summary.total_scanned_rows),
+            sum(summary.total_parse_rows), sum(sketch.count for sketch in summary.time_sketch),
+            stats["records"], stats["excluded"]), sum(summary.total_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--workers", default="1,2,4,8", help="逗号分隔的进程数，1 表示在主进程中聚合")
+    args = parser.parse_args()
+
+    pages = make_pages(args.records)
+    print(f"合成记录 {args.records} 条，CPU 核数 {os.cpu_count()}（进程数超过核数时不会再加速）")
+    print("| 进程数 | 耗时(s) | 记录/秒 | 加速比 |")
+    print("|-------|--------|--------|-------|")
+    baseline = reference = None
+    for processes in (int(value) for value in args.workers.split(",")):
+        started = time.perf_counter()
+        summary, stats = aggregate_in_process(pages) if processes <= 1 else aggregate_sharded(pages, processes)
+        seconds = time.perf_counter() - started
+        result, total_time = totals(summary, stats)
+        assert reference is None or (result == reference[0] and math.isclose(total_time, reference[1])), \
+            f"{processes} 个进程的聚合结果与之前不一致"
+        reference = result, total_time
+        baseline = baseline or seconds
+        print(f"| {processes} | {seconds:.2f} | {args.records / seconds:,.0f} | {baseline / seconds:.2f}x |")
+
+
+if __name__ == "__main__":
+    main()
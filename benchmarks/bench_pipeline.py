@@ -0,0 +1,95 @@
+# bench_pipeline.py
+# 周报各阶段的吞吐：用合成的一周慢日志（slow_sql.synthetic）分别测量
+# JSON 解析、聚合、评分选 Top-200、生成飞书卡片的耗时，换算为每秒处理的记录数
+# 用法: python benchmarks/bench_pipeline.py [--records 1000000] [--decoder auto]
+
+import argparse
+import datetime
+import json
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql import render
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary, top_items
+from slow_sql.aliyun import slow_log_records_request_builder
+from slow_sql.decoding import load_decoder
+from slow_sql.fetcher import PAGE_SIZE, last_days
+from slow_sql.report import API_TIME_FORMAT, TOP_K, build_report
+from slow_sql.rules import Rules
+from slow_sql.settings import DEFAULTS
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+# 每次请求一小时的数据，与分页拉取的窗口大小无关，只影响生成数据时的内存占用
+HOUR = datetime.timedelta(hours=1)
+
+RULES = Rules()
+
+
+class BenchConfig(object):
+    REGRESSION_BASELINE_WEEKS = DEFAULTS["REGRESSION_BASELINE_WEEKS"]
+
+
+def iter_bodies(client, window_start, window_end):
+    """按小时、按页依次生成响应体（不计入耗时）"""
+    build_request = slow_log_records_request_builder(INSTANCE_ID, replay=True)
+    hour = window_start
+    while hour < window_end:
+        # API 的结束时间按分钟包含，请求到下一小时的前一分钟
+        end = hour + HOUR - datetime.timedelta(minutes=1)
+        page_number = 1
+        while True:
+            request = build_request(hour.strftime(API_TIME_FORMAT), end.strftime(API_TIME_FORMAT), page_number)
+            body = client.do_action_with_exception(request)
+            yield body
+            if page_number * PAGE_SIZE >= json.loads(body)["TotalRecordCount"]:
+                break
+            page_number += 1
+        hour += HOUR
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--decoder", default="auto", help="JSON 解析后端：auto / msgspec / orjson / json")
+    args = parser.parse_args()
+
+    now = datetime.datetime(2024, 1, 8, 10, 0)
+    start_time, end_time, window_start, window_end = last_days(7, now)
+    client = SyntheticClient(args.records, window_start, window_end)
+    decoder_name, decode_page = load_decoder(args.decoder)
+
+    summary, stats = new_summary(), new_stats()
+    parse_seconds = aggregate_seconds = 0.0
+    for body in iter_bodies(client, window_start, window_end):
+        started = time.perf_counter()
+        _, records = decode_page(body)
+        parsed = time.perf_counter()
+        aggregate_page(summary, records, RULES, stats)
+        aggregate_seconds += time.perf_counter() - parsed
+        parse_seconds += parsed - started
+
+    started = time.perf_counter()
+    top = top_items(summary, TOP_K)
+    score_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = {"summary": summary, "stats": stats, "total_records": stats["fetched"], "instance_results": {},
+              "failed_instances": []}
+    report = build_report(BenchConfig, 1, start_time, end_time, result, "", None, top)
+    cards = render.build_report_cards(report, DEFAULTS["FEISHU_CARD_MAX_BYTES"])
+    render_seconds = time.perf_counter() - started
+
+    fetched = stats["fetched"]
+    print(f"合成记录 {fetched} 条（{decoder_name} 解析），聚合为 {len(summary)} 条SQL，{len(cards)} 张卡片")
+    print("| 阶段 | 耗时(s) | 记录/秒 |")
+    print("|------|--------|--------|")
+    for name, seconds in ((f"JSON 解析（{decoder_name}）", parse_seconds), ("聚合", aggregate_seconds),
+                          (f"评分选 Top-{TOP_K}", score_seconds), ("生成卡片", render_seconds)):
+        print(f"| {name} | {seconds:.3f} | {fetched / seconds:,.0f} |")
+    total = parse_seconds + aggregate_seconds + score_seconds + render_seconds
+    print(f"| 合计 | {total:.3f} | {fetched / total:,.0f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_rate_limit.py
+# 共享限速器：多个实例并发拉取同一个服务端限流的假客户端（任意1秒内最多接受 --server-rate 个请求，超过时返回 Throttling.User），
+# 对比限速配置等于服务端上限、高于服务端上限（靠流控自适应降速）和不限速（各线程各自指数退避，最多重试5次）时
+# 持续的请求吞吐、被限流的请求数以及是否拉取到全部记录
+# 用法: python benchmarks/bench_rate_limit.py [--server-rate 20] [--instances 3] [--pages 80]
+
+import argparse
+import contextlib
+import datetime
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_aliyun import API_TIME_FORMAT, WEEK_END, WEEK_START, ThrottlingAcsClient, build_fake_request
+from slow_sql.fetcher import PAGE_SIZE, fetch_records
+from slow_sql.ratelimit import RateLimiter
+
+LATENCY = 0.05  # 模拟单次 API 往返 50ms
+WORKERS = 4  # 每个实例拉取分页的线程数
+MAX_CONCURRENT = 8
+
+
+def run(server_rate, instances, pages, rate):
+    """各实例共用一个服务端限流的客户端并发拉取，rate 为 None 时不使用限速器；返回结果字典"""
+    client = ThrottlingAcsClient(pages * PAGE_SIZE, server_rate, latency=LATENCY)
+    limiter = RateLimiter(rate, MAX_CONCURRENT) if rate else None
+
+    def fetch_instance(_):
+        try:
+            fetched, _ = fetch_records(client, build_fake_request, "SQLSlowRecord", WEEK_START, WEEK_END,
+                                       API_TIME_FORMAT, datetime.timedelta(minutes=1), "ExecutionStartTime",
+                                       max_pages=pages, workers=WORKERS, limiter=limiter)
+            return sum(len(page) for page in fetched)
+        except Exception:
+            return None
+
+    # 拉取过程中每页的日志不输出
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=instances) as executor:
+        fetched = list(executor.map(fetch_instance, range(instances)))
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed": elapsed,
+        "throughput": client.accepted / elapsed,
+        "throttled": client.throttled,
+        "failed": sum(1 for count in fetched if count is None),
+        "complete": all(count == pages * PAGE_SIZE for count in fetched),
+        "final_rate": limiter.rate if limiter else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server-rate", type=int, default=20, help="服务端每秒接受的请求数")
+    parser.add_argument("--instances", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=80, help="每个实例的分页数")
+    args = parser.parse_args()
+
+    scenarios = (
+        ("限速 = 服务端上限", args.server_rate),
+        ("限速 = 2 × 服务端上限（自适应降速）", 2 * args.server_rate),
+        ("不限速（各线程指数退避）", None),
+    )
+    print(f"{args.instances} 个实例各 {args.pages} 页，每个实例 {WORKERS} 个线程，服务端每秒最多接受 {args.server_rate} 个请求")
+    print("| 方式 | 耗时(s) | 吞吐(请求/秒) | 占服务端上限 | 被限流 | 失败实例 | 最终速率 |")
+    print("|------|---------|--------------|-------------|--------|---------|---------|")
+    results = {}
+    for name, rate in scenarios:
+        result = results[name] = run(args.server_rate, args.instances, args.pages, rate)
+        final_rate = "-" if result["final_rate"] is None else f"{result['final_rate']:.1f}"
+        print(f"| {name} | {result['elapsed']:.1f} | {result['throughput']:.1f} | "
+              f"{result['throughput'] / args.server_rate:.0%} | {result['throttled']} | {result['failed']} | {final_rate} |")
+    for name, rate in scenarios[:2]:
+        assert results[name]["complete"], f"{name}: 没有拉取到全部记录"
+    print("使用限速器时所有实例都拉取到了全部记录")
+
+
+if __name__ == "__main__":
+    main()
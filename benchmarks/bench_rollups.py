@@ -0,0 +1,102 @@
+# bench_rollups.py
+# 按表、数据库、账号、主机汇总：聚合时逐条累计 (账号, 主机, 数据库) 汇总，报告时解析各行涉及的表、由倒排索引汇总。
+# 对比聚合耗时与生成汇总的耗时，并检查汇总结果与逐条记录直接统计的结果、以及分片聚合后合并的结果一致
+# 用法: python benchmarks/bench_rollups.py [--records 500000] [--shards 4]
+
+import argparse
+import datetime
+import math
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql.aggregator import ROLLUP_DIMENSIONS, aggregate_page, build_rollups, combine_summary, new_stats, new_summary
+from slow_sql.analysis import sql_tables
+from slow_sql.decoding import to_record
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.rules import Rules
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+RULES = Rules()
+LIMIT = 10
+
+
+def make_pages(total_records):
+    """生成一周的合成记录（不计入耗时）"""
+    start = datetime.datetime(2024, 1, 1)
+    client = SyntheticClient(total_records, start, start + datetime.timedelta(days=7))
+    return [[to_record(record) for record in client.records(INSTANCE_ID, 0, 7 * 1440 - 1, offset, PAGE_SIZE)]
+            for offset in range(0, total_records, PAGE_SIZE)]
+
+
+def aggregate(pages):
+    summary, stats = new_summary(), new_stats()
+    for page_records in pages:
+        aggregate_page(summary, page_records, RULES, stats)
+    return summary
+
+
+def brute_force(pages):
+    """逐条记录直接统计每个维度的 {值: [执行次数, 总耗时, 扫描行数]}（与 aggregate_page 相同的过滤和取值）"""
+    totals = {dimension: {} for dimension in ROLLUP_DIMENSIONS}
+    for page_records in pages:
+        for record in page_records:
+            sql = record.SQLText.strip()
+            if not sql or RULES.excluded(record, sql):
+                continue
+            scanned_rows = int(record.ScanRows) or int(record.ReturnRowCounts)
+            values = {"table": sql_tables(sql), "db": (record.DBName,), "account": (record.AccountName,),
+                      "host": (record.HostAddress,)}
+            for dimension, dimension_values in values.items():
+                for value in dimension_values:
+                    total = totals[dimension].setdefault(value, [0, 0.0, 0])
+                    total[0] += int(record.QueryTimes)
+                    total[1] += float(record.QueryTimeMS)
+                    total[2] += scanned_rows
+    return totals
+
+
+def check(rollups, expected, label):
+    """每个维度的 Top 项与直接统计的结果一致（总耗时按相对误差比较）"""
+    for dimension, items in rollups.items():
+        ranked = sorted(expected[dimension].items(), key=lambda x: x[1][1], reverse=True)[:LIMIT]
+        assert [item["value"] for item in items] == [value for value, _ in ranked], f"{label} {dimension} 的排名不一致"
+        for item, (_, (count, total_time, scanned_rows)) in zip(items, ranked):
+            assert item["count"] == count and item["total_scanned_rows"] == scanned_rows, f"{label} {dimension} 的汇总不一致"
+            assert math.isclose(item["total_time"], total_time, rel_tol=1e-9), f"{label} {dimension} 的总耗时不一致"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=500000)
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    pages = make_pages(args.records)
+    started = time.perf_counter()
+    summary = aggregate(pages)
+    aggregate_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rollups = build_rollups(summary, LIMIT)
+    rollup_seconds = time.perf_counter() - started
+
+    expected = brute_force(pages)
+    check(rollups, expected, "单进程")
+
+    # 按页轮流分片聚合后合并，汇总应与整体聚合一致
+    merged = new_summary()
+    for shard in range(args.shards):
+        combine_summary(merged, aggregate(pages[shard::args.shards]))
+    check(build_rollups(merged, LIMIT), expected, "分片合并")
+
+    print(f"{args.records} 条记录，{len(summary)} 条SQL，"
+          + "，".join(f"{dimension} {len(rollups[dimension])} 项" for dimension in ROLLUP_DIMENSIONS))
+    print(f"聚合（含逐条累计账号、主机、数据库汇总）: {aggregate_seconds:.3f}s（{args.records / aggregate_seconds:,.0f} 记录/秒）")
+    print(f"生成四个维度的汇总（含解析表名）: {rollup_seconds * 1000:.1f}ms（聚合耗时的 {rollup_seconds * 100 / aggregate_seconds:.2f}%）")
+    print(f"(账号, 主机, 数据库) 组合数: {len(summary.source_totals)}")
+    print("汇总结果与逐条记录直接统计、分片聚合后合并的结果一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench_rules.py
+# 过滤规则的开销：0/10/100/500 条规则（账号、数据库、主机、SQL正则各占四分之一）时每条记录的判断耗时，
+# 对比逐条规则判断（每条记录对每个正则各 search 一次）与编译后的规则（集合查找 + 合并正则 + 按SQL缓存）；
+# 并检查不同写法的评分公式与默认公式的 Top-200 一致
+# 用法: python benchmarks/bench_rules.py [--records 200000]
+
+import argparse
+import datetime
+import re
+import time
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql import aggregator
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary, score_summary, top_rows
+from slow_sql.decoding import to_record
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.rules import Rules, ScoreFormula
+from slow_sql.synthetic import SyntheticClient
+
+INSTANCE_ID = "rm-bench"
+RULE_COUNTS = (0, 10, 100, 500)
+TOP_K = 200
+# 与默认公式等价的其他写法
+EQUIVALENT_SCORES = (
+    "avg_time * count * max(1, sqrt(total_scanned_rows / max(count, 1)) / 10)",
+    "max(total_time, total_time * avg_scan_rows ** 0.5 / 10)",
+)
+
+
+def make_records(total_records):
+    """生成一周的合成记录（不计入耗时）"""
+    start = datetime.datetime(2024, 1, 1)
+    client = SyntheticClient(total_records, start, start + datetime.timedelta(days=7))
+    records = []
+    for offset in range(0, total_records, PAGE_SIZE):
+        records.extend(to_record(record) for record in client.records(INSTANCE_ID, 0, 7 * 1440 - 1, offset, PAGE_SIZE))
+    return records
+
+
+def make_spec(rule_count):
+    """每类规则各 rule_count / 4 条，大部分不会命中；账号规则保留默认排除的 risk_dw_bin_ro"""
+    per_field = rule_count // 4
+    if not per_field:
+        return {"exclude": {}}
+    return {"exclude": {
+        "users": ["risk_dw_bin_ro"] + [f"user_{i}" for i in range(per_field - 1)],
+        "dbs": [f"db_{i}" for i in range(per_field)],
+        "hosts": [f"192.168.{i // 256}.{i % 256}" for i in range(per_field)],
+        "sql_patterns": [r"^\s*select\s+sleep\("] + [rf"\bnot_a_table_{i}\b" for i in range(per_field - 1)],
+    }}
+
+
+def naive_filter(spec):
+    """逐条规则判断：每个值一次比较，每个正则一次 search"""
+    exclude = spec["exclude"]
+    checks = [("AccountName", value) for value in exclude.get("users", ())]
+    checks += [("DBName", value) for value in exclude.get("dbs", ())]
+    checks += [("HostAddress", value) for value in exclude.get("hosts", ())]
+    patterns = [re.compile(pattern, re.I) for pattern in exclude.get("sql_patterns", ())]
+
+    def excluded(record, sql):
+        for field, value in checks:
+            if getattr(record, field) == value:
+                return True
+        for pattern in patterns:
+            if pattern.search(sql):
+                return True
+        return False
+    return excluded
+
+
+def time_filter(excluded, records):
+    started = time.perf_counter()
+    hits = 0
+    for record in records:
+        if excluded(record, record.SQLText):
+            hits += 1
+    return time.perf_counter() - started, hits
+
+
+def check_scores(records):
+    """同一份聚合结果用不同写法的公式评分，Top-200 的行应与默认公式一致（numpy 和纯 Python 两种方式）"""
+    summary, stats = new_summary(), new_stats()
+    for offset in range(0, len(records), PAGE_SIZE):
+        aggregate_page(summary, records[offset:offset + PAGE_SIZE], Rules({"exclude": {}}), stats)
+    saved = aggregator.load_numpy()
+    try:
+        for use_numpy in (True, False):
+            aggregator.np = saved if use_numpy else None
+            expected = top_rows(score_summary(summary), TOP_K)
+            for expression in EQUIVALENT_SCORES:
+                scores = score_summary(summary, ScoreFormula(expression))
+                assert top_rows(scores, TOP_K) == expected, f"{expression} 的 Top-{TOP_K} 与默认公式不一致"
+    finally:
+        aggregator.np = saved
+    return len(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    print(f"{len(records)} 条合成记录")
+    print("| 规则数 | 逐条判断(ns/条) | 编译后(ns/条) | 加速比 | 排除记录数 |")
+    print("|-------|----------------|--------------|-------|-----------|")
+    for rule_count in RULE_COUNTS:
+        spec = make_spec(rule_count)
+        naive_seconds, naive_hits = time_filter(naive_filter(spec), records)
+        compiled_seconds, compiled_hits = time_filter(Rules(spec).excluded, records)
+        assert naive_hits == compiled_hits, f"{rule_count} 条规则时排除的记录数不一致: {naive_hits} != {compiled_hits}"
+        print(f"| {rule_count} | {naive_seconds * 1e9 / len(records):.0f} | {compiled_seconds * 1e9 / len(records):.0f} | "
+              f"{naive_seconds / compiled_seconds:.1f}x | {compiled_hits} |")
+
+    key_count = check_scores(records)
+    print(f"{len(EQUIVALENT_SCORES)} 个等价的评分公式在 {key_count} 个SQL键上的 Top-{TOP_K} 与默认公式一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_scoring.py
+# 评分与 Top-200 选择：原来的字典逐行评分 + 全量排序，对比列式表整列评分 + 部分选择（numpy / 纯 Python 堆）
+# 用法: python benchmarks/bench_scoring.py
+
+import random
+import time
+from array import array
+
+import fake_aliyun  # noqa: F401  设置导入路径
+from slow_sql import aggregator
+from slow_sql.aggregator import SummaryTable, score_summary, top_rows
+
+TOP_K = 200
+
+
+def make_table(key_count, seed=11):
+    rng = random.Random(seed)
+    table = SummaryTable()
+    table.keys = [f"hash{i}" for i in range(key_count)]
+    table.count = array("q", (rng.randint(1, 5000) for _ in range(key_count)))
+    table.total_time = array("d", (count * rng.uniform(1000, 5000) for count in table.count))
+    table.max_time = array("d", (rng.uniform(1000, 60000) for _ in range(key_count)))
+    table.total_scanned_rows = array("q", (count * rng.randint(0, 10 ** 6) for count in table.count))
+    table.total_parse_rows = array("q", (0 for _ in range(key_count)))
+    table.total_return_rows = array("q", (0 for _ in range(key_count)))
+    return table
+
+
+def legacy_top(table):
+    """改造前的做法：每个键一个字典，逐个计算评分后对全部键排序"""
+    summary = {
+        key: {"count": count, "total_time": total_time, "total_scanned_rows": scanned}
+        for key, count, total_time, scanned in zip(table.keys, table.count, table.total_time, table.total_scanned_rows)
+    }
+    started = time.perf_counter()
+    for data in summary.values():
+        avg_time = data["total_time"] / data["count"]
+        data["score"] = avg_time * data["count"] * max(1, (data["total_scanned_rows"] / data["count"]) ** 0.5 / 10)
+    top = sorted(summary.values(), key=lambda x: x["score"], reverse=True)[:TOP_K]
+    return time.perf_counter() - started, [item["score"] for item in top]
+
+
+def table_top(table, use_numpy):
+    saved = aggregator.load_numpy()
+    if not use_numpy:
+        aggregator.np = None
+    try:
+        started = time.perf_counter()
+        scores = score_summary(table)
+        rows = top_rows(scores, TOP_K)
+        elapsed = time.perf_counter() - started
+    finally:
+        aggregator.np = saved
+    return elapsed, [float(scores[row]) for row in rows]
+
+
+def main():
+    print("| 键数量 | 字典 + 全量排序(ms) | 列式 + 堆选择(ms) | 列式 + numpy argpartition(ms) | numpy 加速比 |")
+    print("|--------|-------------------|------------------|------------------------------|-------------|")
+    for key_count in (10000, 100000, 1000000):
+        table = make_table(key_count)
+        legacy, expected = legacy_top(table)
+        heap, heap_scores = table_top(table, use_numpy=False)
+        if aggregator.load_numpy() is not None:
+            vectorised, numpy_scores = table_top(table, use_numpy=True)
+            assert numpy_scores == expected
+            numpy_cell, speedup = f"{vectorised * 1000:.1f}", f"{legacy / vectorised:.1f}x"
+        else:
+            numpy_cell, speedup = "未安装 numpy", "-"
+        assert heap_scores == expected
+        print(f"| {key_count} | {legacy * 1000:.1f} | {heap * 1000:.1f} | {numpy_cell} | {speedup} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# bench_streaming_memory.py
+# 用 tracemalloc 对比“先收集全部记录再聚合”与“逐页流式聚合”的峰值内存
+# 用法: python benchmarks/bench_streaming_memory.py
+
+import tracemalloc
+
+from fake_aliyun import make_record
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary
+from slow_sql.decoding import to_record
+from slow_sql.rules import Rules
+
+PAGE_SIZE = 100
+DISTINCT_KEYS = 500
+
+# 不排除任何记录
+NO_RULES = Rules({})
+
+
+def synthetic_pages(total_records):
+    """生成 total_records 条记录的分页流，SQLHash 只有 DISTINCT_KEYS 种"""
+    for start in range(0, total_records, PAGE_SIZE):
+        yield [to_record(make_record(i)) for i in range(start, min(start + PAGE_SIZE, total_records))]
+
+
+def materialised(total_records):
+    all_slow_logs = []
+    for page in synthetic_pages(total_records):
+        all_slow_logs.extend(page)
+    summary, stats = new_summary(), new_stats()
+    aggregate_page(summary, all_slow_logs, NO_RULES, stats)
+    return summary
+
+
+def streaming(total_records):
+    summary, stats = new_summary(), new_stats()
+    for page in synthetic_pages(total_records):
+        aggregate_page(summary, page, NO_RULES, stats)
+    return summary
+
+
+def peak_memory(func, total_records):
+    tracemalloc.start()
+    summary = func(total_records)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(summary) == DISTINCT_KEYS
+    return peak
+
+
+def main():
+    print("| 方式 | 记录数 | 峰值内存(MB) |")
+    print("|------|--------|-------------|")
+    for func, name in ((materialised, "全部收集后聚合"), (streaming, "逐页流式聚合")):
+        for total_records in (50000, 500000):
+            peak = peak_memory(func, total_records)
+            print(f"| {name} | {total_records} | {peak / 1024 / 1024:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
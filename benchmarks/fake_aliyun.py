@@ -0,0 +1,119 @@
+# fake_aliyun.py
+# 基准测试用的本地假阿里云客户端，模拟 DescribeSlowLogRecords 的分页返回与网络延迟
+
+import datetime
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# 让 benchmarks 目录下的脚本可以直接导入仓库根目录的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_TIME_FORMAT = "%Y-%m-%dT%H:%MZ"
+WEEK_START = datetime.datetime(2024, 1, 1)
+WEEK_END = WEEK_START + datetime.timedelta(days=7)
+
+
+class FakeRequest(object):
+    def __init__(self, start_str, end_str, page_number, page_size=100):
+        self.start_str = start_str
+        self.end_str = end_str
+        self.page_number = page_number
+        self.page_size = page_size
+
+
+def build_fake_request(start_str, end_str, page_number):
+    return FakeRequest(start_str, end_str, page_number)
+
+
+class FakeAcsClient(object):
+    """
+    total_records 条记录均匀分布在 [WEEK_START, WEEK_END) 内，按请求的时间窗口（结束时间按分钟包含）
+    和页码返回，每次调用 sleep latency 秒模拟网络往返。
+    """
+
+    def __init__(self, total_records, latency=0.05):
+        self.total_records = total_records
+        self.latency = latency
+        self.step = (WEEK_END - WEEK_START) / max(1, total_records)
+        self.calls = 0
+
+    def do_action_with_exception(self, request):
+        self.calls += 1
+        time.sleep(self.latency)
+        window_start = datetime.datetime.strptime(request.start_str, API_TIME_FORMAT)
+        window_end = datetime.datetime.strptime(request.end_str, API_TIME_FORMAT) + datetime.timedelta(minutes=1)
+        first = max(0, int(math.ceil((window_start - WEEK_START) / self.step)))
+        last = min(self.total_records, int(math.ceil((window_end - WEEK_START) / self.step)))
+        total = max(0, last - first)
+        start = first + (request.page_number - 1) * request.page_size
+        end = min(start + request.page_size, last)
+        records = [make_record(i, WEEK_START + i * self.step) for i in range(start, end)]
+        return json.dumps({
+            "TotalRecordCount": total,
+            "PageRecordCount": len(records),
+            "PageNumber": request.page_number,
+            "Items": {"SQLSlowRecord": records},
+        })
+
+
+class FakeThrottlingError(Exception):
+    """与阿里云 SDK 的 ServerException 一样通过 get_error_code() 返回错误码"""
+
+    def __init__(self, code="Throttling.User"):
+        super().__init__(f"{code}: Request was denied due to user flow control.")
+        self.code = code
+
+    def get_error_code(self):
+        return self.code
+
+
+class ThrottlingAcsClient(FakeAcsClient):
+    """
+    服务端限流的假客户端：任意1秒内最多接受 server_rate 个请求（被拒绝的请求不计入），
+    超过时请求在 latency 秒后返回 Throttling.User 错误。accepted / throttled 为接受和被限流的请求数。
+    """
+
+    def __init__(self, total_records, server_rate, latency=0.05):
+        super().__init__(total_records, latency)
+        self.server_rate = server_rate
+        self.accepted_at = deque()
+        self.accepted = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def do_action_with_exception(self, request):
+        with self.lock:
+            now = time.monotonic()
+            while self.accepted_at and now - self.accepted_at[0] >= 1.0:
+                self.accepted_at.popleft()
+            allowed = len(self.accepted_at) < self.server_rate
+            if allowed:
+                self.accepted_at.append(now)
+                self.accepted += 1
+            else:
+                self.throttled += 1
+        if not allowed:
+            time.sleep(self.latency)
+            raise FakeThrottlingError()
+        return super().do_action_with_exception(request)
+
+
+def make_record(i, execution_start_time=WEEK_START):
+    return {
+        "SQLText": f"SELECT * FROM orders WHERE user_id = {i} AND status = 'PAID'",
+        "SQLHash": f"hash{i % 500}",
+        "QueryTimeMS": 1000 + i % 3000,
+        "ScanRows": 10000 + i % 777,
+        "ReturnRowCounts": 10,
+        "ParseRowCounts": 20000,
+        "AccountName": "app_rw",
+        "DBName": "shop",
+        "HostAddress": f"app_rw[app_rw] @  [10.0.0.{i % 16}]",
+        "QueryTimes": 1,
+        "ExecutionStartTime": execution_start_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
@@ -0,0 +1,81 @@
+# feishu_stub.py
+# 本地飞书 Webhook 桩服务，按路径模拟各种返回，用于测试和基准测试推送逻辑（不访问飞书）
+#
+#   /ok/<名称>              立即成功
+#   /slow/<毫秒>/<名称>      延迟后成功
+#   /flaky/<次数>/<名称>     前几次返回 HTTP 500，之后成功
+#   /limited/<次数>/<名称>   前几次返回飞书限流错误码 11232，之后成功
+#   /reject/<名称>          拒绝卡片消息（错误码 19002），文本消息成功
+#   /hang/<名称>            不返回（直到连接关闭）
+#
+# 单独运行时在前台启动: python benchmarks/feishu_stub.py [端口]
+
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+        parts = self.path.strip("/").split("/")
+        with server.lock:
+            server.attempts[self.path] += 1
+            attempt = server.attempts[self.path]
+        kind = parts[0]
+        if kind == "hang":
+            server.release.wait()
+            return
+        if kind == "slow":
+            time.sleep(int(parts[1]) / 1000)
+        if kind == "flaky" and attempt <= int(parts[1]):
+            return self.reply(500, {"code": -1, "msg": "internal error"})
+        if kind == "limited" and attempt <= int(parts[1]):
+            return self.reply(200, {"code": 11232, "msg": "frequency limited"})
+        if kind == "reject" and payload.get("msg_type") == "interactive":
+            return self.reply(200, {"code": 19002, "msg": "card content invalid"})
+        with server.lock:
+            server.received[self.path].append(payload)
+        self.reply(200, {"code": 0, "msg": "success", "data": {}})
+
+
+def start_stub(port=0):
+    """在后台线程启动桩服务，返回 (server, base_url)；server.received 为每个路径收到的消息"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.attempts = defaultdict(int)
+    server.received = defaultdict(list)
+    server.release = threading.Event()  # 设置后 /hang 的请求结束
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def stop_stub(server):
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    stub, url = start_stub(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print(f"飞书桩服务已启动: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stop_stub(stub)
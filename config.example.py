@@ -5,4 +5,44 @@ ACCESS_KEY_ID = "YOUR_ACCESS_KEY_ID"
 ACCESS_KEY_SECRET = "YOUR_ACCESS_KEY_SECRET"
 REGION_ID = "YOUR_REGION_ID"  # 例如: us-west-1, cn-hangzhou
 DB_INSTANCE_ID = "YOUR_DB_INSTANCE_ID"
-FEISHU_WEBHOOK = "YOUR_FEISHU_WEBHOOK_URL" 
\ No newline at end of file
+FEISHU_WEBHOOK = "YOUR_FEISHU_WEBHOOK_URL" 
+
+# === 可选配置 ===
+FETCH_WORKERS = 4  # 并发拉取慢日志分页的线程数，设为1则顺序拉取
+STORE_PATH = "slow_log_store.db"  # 本地慢日志存储（SQLite），配置后每次只增量拉取未同步的时间段，设为None则每次全量拉取
+STORE_RETENTION_DAYS = 30  # 本地存储保留的天数
+# 多实例模式：配置后忽略 DB_INSTANCE_ID，一次运行查询所有实例并合并为一份报告（未配置 region_id 时使用 REGION_ID）
+# DB_INSTANCES = [
+#     {"instance_id": "rm-bp11111111", "region_id": "cn-hangzhou"},
+#     {"instance_id": "rm-uf22222222", "region_id": "cn-shanghai"},
+# ]
+MAX_CONCURRENT_REQUESTS = 8  # 所有实例合计的最大并发 API 请求数
+API_RATE_LIMIT = 20  # 所有实例合计每秒最多发出的 API 请求数（设为None不限速），遇到流控时自动降速、暂停后从当前分页继续
+API_THROTTLE_TIMEOUT = 600  # 同一个请求持续被限流超过该秒数时才放弃该实例
+AGGREGATE_PROCESSES = 0  # 聚合记录的工作进程数（数据量很大的多核主机可以设为CPU核数，先用 bench_parallel_aggregate.py 确认更快），0或1时在主进程中聚合
+REGRESSION_BASELINE_WEEKS = 4  # 周环比对比前几周的聚合结果（保存在 STORE_PATH 中）
+REGRESSION_RATIO = 1.5  # 平均耗时、P99耗时或平均扫描行数达到基线的该倍数视为变慢，降到 1/该倍数 以下视为好转
+FEISHU_WEBHOOKS = []  # 同时推送的多个飞书群 Webhook，与 FEISHU_WEBHOOK 合并
+FEISHU_CONNECT_TIMEOUT = 5  # 推送的连接超时（秒）
+FEISHU_READ_TIMEOUT = 15  # 推送的读取超时（秒）
+FEISHU_MAX_RETRIES = 3  # 网络错误、HTTP 429/5xx 和飞书限流时的最大重试次数
+FEISHU_CARD_MAX_BYTES = 20000  # 每张卡片序列化后的字节数上限，超过时拆分为多张卡片
+FEISHU_SEND_INTERVAL = 0.5  # 向同一个群连续发送多张卡片的间隔（秒）
+DAEMON_POLL_INTERVAL = 300  # 常驻模式（python -m slow_sql daemon）的拉取间隔（秒）
+DAEMON_MAX_KEYS = 50000  # 常驻模式每个滑动窗口最多单独统计的SQL数，超出的计入“其他”
+ALERT_MIN_EXECUTIONS = 30  # 最近1小时执行次数达到该值的SQL才检查告警
+ALERT_RATE_RATIO = 5  # 最近1小时执行次数达到过去7天每小时平均的该倍数时告警
+ALERT_LATENCY_RATIO = 3  # 最近1小时平均耗时达到过去24小时平均耗时的该倍数时告警
+ALERT_MIN_LATENCY_MS = 1000  # 最近1小时平均耗时低于该值（毫秒）时不做耗时告警
+ALERT_COOLDOWN_MINUTES = 60  # 同一条SQL两次告警的最短间隔（分钟）
+OUTBOX_DIR = "outbox"  # 推送失败的消息写入的发件箱，下次运行时补发；设为None则不保存
+METRICS_LOG = None  # 运行指标（各阶段耗时、计数、峰值内存）追加写入的 JSON lines 文件，None 时只输出到控制台
+METRICS_TEXTFILE = None  # Prometheus textfile 路径（如 "/var/lib/node_exporter/textfile/slow_sql_{command}.prom"），None 时不写入
+RULES_FILE = None  # 过滤和评分规则文件（JSON，格式见 README“过滤和评分规则”），None 时排除账号 risk_dw_bin_ro、按默认公式评分
+ANALYSIS_CACHE_PATH = None  # SQL 分析结果的缓存（SQLite），None 时与 STORE_PATH 共用，都未配置时不跨运行缓存
+ANALYSIS_CACHE_SIZE = 20000  # 缓存的SQL指纹数上限，超过时淘汰最近最少使用的
+EXPORT_DIR = None  # 导出原始记录和每日聚合的目录（按实例和日期分区），None 时不导出
+EXPORT_FORMAT = "auto"  # 导出格式：auto（安装了 pyarrow 时为 parquet，否则为 csv）/ parquet / csv
+HEATMAP_UTC_OFFSET = 8  # 时段分布展示的时区（相对 UTC 的小时数）
+HEATMAP_CSV = None  # 时段分布导出的 CSV 路径（总体、各实例和 Top SQL 按星期×小时的执行次数），None 时不导出
+JSON_DECODER = "auto"  # 解析 API 响应的后端：auto（依次选择已安装的 msgspec、orjson、标准库 json）/ msgspec / orjson / json
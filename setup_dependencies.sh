@@ -83,6 +83,7 @@ fi
 if [ -f "slow_sql_report.py" ]; then
     echo "复制脚本文件..." | tee -a $LOG_FILE
     cp slow_sql_report.py $INSTALL_DIR/
+    cp -r slow_sql $INSTALL_DIR/
     chmod 750 $INSTALL_DIR/slow_sql_report.py
     echo "脚本已复制到: $INSTALL_DIR/slow_sql_report.py" | tee -a $LOG_FILE
 else
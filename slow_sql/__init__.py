@@ -0,0 +1,5 @@
+# slow_sql/__init__.py
+# 阿里云 RDS 慢SQL分析：拉取（fetcher）、本地存储（store）、聚合（aggregator）、周环比（history）、
+# 报告渲染（render）以及命令行入口（cli，python -m slow_sql）
+#
+# 子模块按需导入：阿里云 SDK 和 requests 只在真正调用 API、推送飞书时才导入
@@ -0,0 +1,8 @@
+# slow_sql/__main__.py
+# python -m slow_sql report | statistics | combined | daemon
+
+import sys
+
+from slow_sql.cli import main
+
+sys.exit(main())
@@ -0,0 +1,532 @@
+# slow_sql/aggregator.py
+# 慢查询记录的流式聚合：每拉取一页就折叠进 summary，原始记录随即释放
+
+import heapq
+import sys
+from array import array
+
+from slow_sql.analysis import normalized_tables
+from slow_sql.sketch import QuantileSketch
+from slow_sql.fingerprint import fingerprint_key, normalize
+from slow_sql.heatmap import add_heat, new_heat, week_hour
+from slow_sql.rules import DEFAULT_SCORE, ScoreFormula
+
+# numpy 在第一次评分时才导入（导入需要约50ms，命令行启动时用不到）；未安装时用纯 Python 的堆选择 Top-K
+NOT_LOADED = object()
+np = NOT_LOADED
+
+# 未传入评分公式时使用的默认公式
+DEFAULT_FORMULA = ScoreFormula(DEFAULT_SCORE)
+
+# 每个SQL最多单独统计的主机/账号数量，超出的部分计入“其他”
+MAX_DISTINCT_VALUES = 16
+OTHER_VALUE = "其他"
+
+# 最多为多少行保留时段分布（见 heatmap.py），超过两倍时只保留评分最高的这些行
+MAX_HEAT_ROWS = 1000
+
+# 评分公式中的平均值变量 -> 对应的总量列（平均值为总量除以执行次数）
+AVERAGE_COLUMNS = {"avg_time": "total_time", "avg_scan_rows": "total_scanned_rows", "avg_parse_rows": "total_parse_rows",
+                   "avg_return_rows": "total_return_rows"}
+
+# 按维度汇总（见 build_rollups）的维度
+ROLLUP_DIMENSIONS = ("table", "db", "account", "host")
+# 账号、主机、数据库在 SummaryTable.source_totals 键中的位置
+SOURCE_POSITIONS = {"account": 0, "host": 1, "db": 2}
+
+# 数值指标列及其 array 类型码
+METRIC_COLUMNS = (
+    ("count", "q"),
+    ("total_time", "d"),
+    ("max_time", "d"),
+    ("total_scanned_rows", "q"),
+    ("total_parse_rows", "q"),
+    ("total_return_rows", "q"),
+)
+
+
+class SummaryTable(object):
+    """
+    按 SQL 键聚合的列式表，内存占用只与不同 SQL 的数量有关。
+
+    每个 SQL 键占一行，数值指标按列存放在 array 中，评分和 Top-K 可以整列计算；
+    报告只需要 Top-K 的几行，通过 item(row) 还原为字典。
+
+    数据库、主机、账号等重复出现的字符串经过 intern，所有行共享同一个对象。
+    主机和账号按执行次数计数：只出现过一个值时仅保存该值，出现第二个值后才为该行创建计数字典。
+
+    按维度汇总时，表的汇总由各行累加得到（生成汇总时才解析各行涉及的表，聚合期间每行不保存表名）；
+    一条SQL的记录可能来自多个账号、主机和数据库，这三个维度的执行次数、耗时、扫描行数按 (账号, 主机, 数据库) 组合
+    逐条记录累计在 source_totals 中（组合数远少于记录数且与SQL数无关，每条记录只需一次字典查找）。
+
+    时段分布（一周168个小时桶的执行次数）按实例和总体完整统计；每行的时段分布只为评分最高的行保留（见 prune_heat），
+    内存占用与SQL数无关。
+    """
+
+    def __init__(self):
+        self.index = {}  # SQL 键 -> 行号
+        self.keys = []
+        self.sql = []
+        self.db_name = []
+        self.host_address = []  # 第一个出现的主机
+        self.hosts = []  # 出现多个主机时为 {主机: 执行次数}，否则为 None
+        self.username = []  # 第一个出现的账号
+        self.users = []  # 出现多个账号时为 {账号: 执行次数}，否则为 None
+        self.instances = []  # 多实例合并后每行按实例记录执行次数和耗时
+        self.time_sketch = []  # 每行 QueryTimeMS 的分位数草图
+        self.scan_sketch = []  # 每行扫描行数的分位数草图
+        self.source_totals = {}  # (账号, 主机, 数据库) -> [执行次数, 总耗时, 扫描行数]
+        self.heat = {}  # 行号 -> 时段分布，只保留总耗时最高的行
+        self.heat_total = new_heat()  # 所有记录的时段分布
+        self.instance_heat = {}  # 多实例合并后每个实例的时段分布
+        for name, typecode in METRIC_COLUMNS:
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row(self, key, sql, db_name="", host_address="", username=""):
+        """返回 SQL 键所在的行号，不存在时用给定的数据库、主机、账号新增一行"""
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            self.index[key] = row
+            self.keys.append(key)
+            self.sql.append(sql)  # 保存完整SQL，不再截断
+            self.db_name.append(db_name)
+            self.host_address.append(host_address)
+            self.hosts.append(None)
+            self.username.append(username)
+            self.users.append(None)
+            self.instances.append(None)
+            self.time_sketch.append(QuantileSketch())
+            self.scan_sketch.append(QuantileSketch())
+            for name, _ in METRIC_COLUMNS:
+                getattr(self, name).append(0)
+        return row
+
+    def item(self, row, score=None):
+        """
+        将一行还原为报告使用的字典。
+
+        hosts / users 为按执行次数降序的 [(值, 执行次数), ...]，host_address / username 取执行次数最多的值。
+        p50/p95/p99_time 和 p50/p95/p99_scanned_rows 为按记录统计的耗时和扫描行数分位数。
+        """
+        hosts = sorted(value_counts(self.host_address[row], self.hosts[row], self.count[row]).items(),
+                       key=lambda x: x[1], reverse=True)
+        users = sorted(value_counts(self.username[row], self.users[row], self.count[row]).items(),
+                       key=lambda x: x[1], reverse=True)
+        item = {
+            "key": self.keys[row],
+            "sql": self.sql[row],
+            "db_name": self.db_name[row],
+            "host_address": hosts[0][0],
+            "hosts": hosts,
+            "username": users[0][0],
+            "users": users,
+            "instances": self.instances[row] or {},
+            "heat": self.heat.get(row),
+        }
+        for name, _ in METRIC_COLUMNS:
+            item[name] = getattr(self, name)[row]
+        time_sketch, scan_sketch = self.time_sketch[row], self.scan_sketch[row]
+        for q in (50, 95, 99):
+            # 桶的代表值可能略高于实际最大值，以最大耗时为上限
+            item[f"p{q}_time"] = min(time_sketch.quantile(q / 100), item["max_time"])
+            item[f"p{q}_scanned_rows"] = scan_sketch.quantile(q / 100)
+        if score is not None:
+            item["score"] = score
+        return item
+
+
+def value_counts(primary, counter, count):
+    """返回一行中主机或账号的 {值: 执行次数}"""
+    return dict(counter) if counter is not None else {primary: count}
+
+
+def count_value(primaries, counters, row, value, weight, previous_count):
+    """
+    为一行累计主机或账号的执行次数。
+
+    primaries[row] 是该行第一个出现的值；只要没有出现第二个值就不创建计数字典，
+    出现时将之前的 previous_count 次执行全部计给第一个值。
+    """
+    counter = counters[row]
+    if counter is None:
+        if value == primaries[row]:
+            return
+        counter = counters[row] = {primaries[row]: previous_count}
+    if value in counter or len(counter) < MAX_DISTINCT_VALUES:
+        counter[value] = counter.get(value, 0) + weight
+    else:
+        counter[OTHER_VALUE] = counter.get(OTHER_VALUE, 0) + weight
+
+
+def merge_counts(target, source):
+    """合并两个 {值: 执行次数}，超过 MAX_DISTINCT_VALUES 的部分计入“其他”"""
+    for value, weight in source.items():
+        if value in target or len(target) < MAX_DISTINCT_VALUES:
+            target[value] = target.get(value, 0) + weight
+        else:
+            target[OTHER_VALUE] = target.get(OTHER_VALUE, 0) + weight
+    return target
+
+
+def merge_value_counts(primaries, counters, row, count, source_counts):
+    """将另一个表中同一SQL的 {值: 执行次数} 合并进一行"""
+    if counters[row] is None and len(source_counts) == 1 and primaries[row] in source_counts:
+        return
+    counters[row] = merge_counts(value_counts(primaries[row], counters[row], count), source_counts)
+
+
+def load_numpy():
+    """返回 numpy 模块，未安装时返回 None"""
+    global np
+    if np is NOT_LOADED:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def new_summary():
+    return SummaryTable()
+
+
+def new_stats():
+    """聚合过程中的计数：获取的记录数、参与聚合的记录数和被排除的记录数"""
+    return {"fetched": 0, "records": 0, "excluded": 0}
+
+
+def aggregate_page(summary, records, rules, stats, debug=False):
+    """将一页 SlowRecord（见 decoding）折叠进 summary，被 rules（见 rules.Rules）过滤的记录计入 stats["excluded"]"""
+    intern = sys.intern
+    excluded = rules.excluded
+    stats["fetched"] += len(records)
+    counts, total_times, max_times = summary.count, summary.total_time, summary.max_time
+    scanned, parsed, returned = summary.total_scanned_rows, summary.total_parse_rows, summary.total_return_rows
+    time_sketches, scan_sketches = summary.time_sketch, summary.scan_sketch
+    source_totals = summary.source_totals
+    heat, heat_total = summary.heat, summary.heat_total
+    week_hours = {}  # ExecutionStartTime 精确到小时的前缀 -> 小时桶编号
+    for record in records:
+        sql = record.SQLText.strip()
+        if not sql:
+            continue
+
+        # 按过滤规则排除（账号、数据库、主机、SQL正则、耗时阈值）
+        if excluded(record, sql):
+            stats["excluded"] += 1
+            continue
+        username = record.AccountName
+
+        stats["records"] += 1
+
+        # 使用SQLHash作为键，这样更准确；没有SQLHash时使用归一化后的SQL指纹，字面量不同的同类语句归为一条
+        key = record.SQLHash or fingerprint_key(sql)
+
+        # 查询时间，单位毫秒
+        query_time = float(record.QueryTimeMS)
+
+        # 扫描行数 - 从ScanRows字段或新的字段获取
+        scanned_rows = int(record.ScanRows)
+        if scanned_rows == 0:  # 如果ScanRows为0，尝试使用ReturnRowCounts
+            scanned_rows = int(record.ReturnRowCounts)
+
+        # 解析行数 - 添加ParseRowCounts字段
+        parse_rows = int(record.ParseRowCounts)
+
+        # 返回行数，与扫描行数对比判断全表扫描风险（见 analysis.full_scan_risk）
+        return_rows = int(record.ReturnRowCounts)
+
+        # 输出调试信息，帮助查看原始数据
+        if debug:
+            print(f"[DEBUG] SQL: {sql[:50]}...")
+            print(f"[DEBUG] ScanRows: {record.ScanRows}, ReturnRowCounts: {record.ReturnRowCounts}, ParseRowCounts: {record.ParseRowCounts}")
+
+        # 更新或初始化记录；重复出现的字符串 intern 后各行共享（API 可能返回 null，按空字符串处理）
+        host_address = intern(record.HostAddress or "")
+        username = intern(username or "")
+        db_name = intern(record.DBName or "")
+        row = summary.row(key, sql, db_name, host_address, username)
+        executions = int(record.QueryTimes)
+        previous_count = counts[row]
+        count_value(summary.host_address, summary.hosts, row, host_address, executions, previous_count)
+        count_value(summary.username, summary.users, row, username, executions, previous_count)
+        counts[row] = previous_count + executions
+        total_times[row] += query_time
+        if query_time > max_times[row]:
+            max_times[row] = query_time
+        scanned[row] += scanned_rows
+        parsed[row] += parse_rows
+        returned[row] += return_rows
+        time_sketches[row].add(query_time)
+        scan_sketches[row].add(scanned_rows)
+
+        # 账号、主机和数据库的汇总按记录累计，(账号, 主机, 数据库) 组合一次查找（表的汇总在 build_rollups 中由各行累加）
+        source = (username, host_address, db_name)
+        totals = source_totals.get(source)
+        if totals is None:
+            totals = source_totals[source] = [0, 0.0, 0]
+        totals[0] += executions
+        totals[1] += query_time
+        totals[2] += scanned_rows
+
+        # 时段分布：同一小时的记录时间前缀相同，每页只解析一次
+        start_time = record.ExecutionStartTime or ""
+        bucket = week_hours.get(start_time[:13])
+        if bucket is None:
+            bucket = week_hours[start_time[:13]] = week_hour(start_time)
+        if bucket >= 0:
+            heat_total[bucket] += executions
+            row_heat = heat.get(row)
+            if row_heat is None:
+                row_heat = heat[row] = new_heat()
+            row_heat[bucket] += executions
+
+    if len(heat) > 2 * MAX_HEAT_ROWS:
+        prune_heat(summary, rules.score)
+
+
+def prune_heat(summary, formula=None, keep=MAX_HEAT_ROWS):
+    """
+    只保留按评分公式（与报告排名相同）评分最高的 keep 行的时段分布，只为保留了时段分布的行计算评分。
+
+    被淘汰的行再次出现时重新统计，时段分布只覆盖之后的执行次数（见 heatmap.heat_coverage）；
+    评分高的行很快稳定在保留的行中，Top SQL 的时段分布通常是完整的。
+    """
+    if len(summary.heat) <= keep:
+        return
+    rows = list(summary.heat)
+    scores = row_scores(summary, rows, formula)
+    summary.heat = {rows[index]: summary.heat[rows[index]]
+                    for index in heapq.nlargest(keep, range(len(rows)), key=scores.__getitem__)}
+
+
+def merge_rows(target, source):
+    """
+    将 source 的每一行合并进 target 中 SQL 键相同的行（不存在时新增），依次 yield (source 行号, target 行号)。
+
+    执行次数、耗时、扫描行数求和，最大耗时取最大值，分位数草图合并桶计数，主机和账号合并计数；
+    这些合并都满足结合律，分片聚合后按任意顺序合并的指标与整体聚合一致（超过 MAX_DISTINCT_VALUES 的主机/账号计入“其他”的部分除外）。
+    各行的时段分布逐桶相加，调用方合并完所有行后用 prune_heat 控制保留的行数。
+    """
+    for row, key in enumerate(source.keys):
+        merged = target.row(key, source.sql[row], source.db_name[row], source.host_address[row], source.username[row])
+        source_heat = source.heat.get(row)
+        if source_heat is not None:
+            if merged in target.heat:
+                add_heat(target.heat[merged], source_heat)
+            else:
+                target.heat[merged] = array("q", source_heat)
+        merge_value_counts(target.host_address, target.hosts, merged, target.count[merged],
+                           value_counts(source.host_address[row], source.hosts[row], source.count[row]))
+        merge_value_counts(target.username, target.users, merged, target.count[merged],
+                           value_counts(source.username[row], source.users[row], source.count[row]))
+        target.count[merged] += source.count[row]
+        target.total_time[merged] += source.total_time[row]
+        target.max_time[merged] = max(target.max_time[merged], source.max_time[row])
+        target.total_scanned_rows[merged] += source.total_scanned_rows[row]
+        target.total_parse_rows[merged] += source.total_parse_rows[row]
+        target.total_return_rows[merged] += source.total_return_rows[row]
+        target.time_sketch[merged].merge(source.time_sketch[row])
+        target.scan_sketch[merged].merge(source.scan_sketch[row])
+        yield row, merged
+
+
+def merge_totals(target, source):
+    """合并两个 {(账号, 主机, 数据库): [执行次数, 总耗时, 扫描行数]}"""
+    for value, (count, total_time, scanned_rows) in source.items():
+        totals = target.get(value)
+        if totals is None:
+            target[value] = [count, total_time, scanned_rows]
+        else:
+            totals[0] += count
+            totals[1] += total_time
+            totals[2] += scanned_rows
+
+
+def combine_summary(target, source, formula=None):
+    """
+    合并同一数据来源的两个 summary（如多进程聚合的各个分片），各行的实例统计、按账号、主机的汇总和时段分布一并合并；
+    formula 为淘汰时段分布时使用的评分公式（见 prune_heat）
+    """
+    merge_totals(target.source_totals, source.source_totals)
+    add_heat(target.heat_total, source.heat_total)
+    for instance_id, heat in source.instance_heat.items():
+        add_heat(target.instance_heat.setdefault(instance_id, new_heat()), heat)
+    for row, merged in merge_rows(target, source):
+        if source.instances[row] is None:
+            continue
+        if target.instances[merged] is None:
+            target.instances[merged] = {}
+        for instance_id, metrics in source.instances[row].items():
+            instance = target.instances[merged].setdefault(instance_id, {"count": 0, "total_time": 0.0})
+            instance["count"] += metrics["count"]
+            instance["total_time"] += metrics["total_time"]
+    if len(target.heat) > 2 * MAX_HEAT_ROWS:
+        prune_heat(target, formula)
+    return target
+
+
+def merge_summary(target, source, instance_id, formula=None):
+    """将单个实例的 summary 合并进全局 summary，并按实例记录执行次数、耗时和时段分布（formula 见 combine_summary）"""
+    merge_totals(target.source_totals, source.source_totals)
+    add_heat(target.heat_total, source.heat_total)
+    add_heat(target.instance_heat.setdefault(instance_id, new_heat()), source.heat_total)
+    for row, merged in merge_rows(target, source):
+        if target.instances[merged] is None:
+            target.instances[merged] = {}
+        target.instances[merged][instance_id] = {"count": source.count[row], "total_time": source.total_time[row]}
+    if len(target.heat) > 2 * MAX_HEAT_ROWS:
+        prune_heat(target, formula)
+
+
+def merge_stats(target, source):
+    for field in target:
+        target[field] += source[field]
+
+
+def score_columns(summary, names, np):
+    """
+    评分公式用到的列：总量直接取 summary 的列，平均值为总量除以执行次数（至少为1）。
+
+    np 不为 None 时返回 array 缓冲区上的 numpy 数组（总量列不复制数据），否则返回逐行的列表。
+    """
+    if np is not None:
+        column = {name: np.frombuffer(getattr(summary, name), dtype=np.float64 if typecode == "d" else np.int64)
+                  for name, typecode in METRIC_COLUMNS}
+        divisor = np.maximum(column["count"], 1)
+    else:
+        column = {name: getattr(summary, name) for name, _ in METRIC_COLUMNS}
+        divisor = [max(count, 1) for count in summary.count]
+    columns = []
+    for name in names:
+        if name not in AVERAGE_COLUMNS:
+            columns.append(column[name])
+        elif np is not None:
+            columns.append(column[AVERAGE_COLUMNS[name]] / divisor)
+        else:
+            columns.append([total / count for total, count in zip(column[AVERAGE_COLUMNS[name]], divisor)])
+    return columns
+
+
+def row_scores(summary, rows, formula=None):
+    """逐行计算给定行的评分（只在少量行之间比较时使用，不必计算整列）"""
+    formula = formula or DEFAULT_FORMULA
+    if not formula.names:
+        return [float(formula.scalar())] * len(rows)
+    counts = summary.count
+    columns = []
+    for name in formula.names:
+        if name in AVERAGE_COLUMNS:
+            totals = getattr(summary, AVERAGE_COLUMNS[name])
+            columns.append([totals[row] / max(counts[row], 1) for row in rows])
+        else:
+            values = getattr(summary, name)
+            columns.append([values[row] for row in rows])
+    return list(map(formula.scalar, *columns))
+
+
+def score_summary(summary, formula=None):
+    """
+    按评分公式（rules.ScoreFormula，默认为 rules.DEFAULT_SCORE）计算每行的评分。
+    安装了 numpy 时直接在 array 的缓冲区上整列计算，返回 numpy 数组；否则逐行计算，返回列表。
+    """
+    formula = formula or DEFAULT_FORMULA
+    np = load_numpy()
+    columns = score_columns(summary, formula.names, np)
+    if np is not None:
+        # 公式可能不依赖任何列（常数），加上全零数组统一为每行一个评分
+        return np.zeros(len(summary)) + formula.vectorized(np)(*columns)
+    if not formula.names:
+        return [float(formula.scalar())] * len(summary)
+    return list(map(formula.scalar, *columns))
+
+
+def top_rows(scores, k):
+    """返回评分最高的 k 行的行号（按评分降序），只做部分选择而不对全部行排序"""
+    n = len(scores)
+    np = load_numpy()
+    if np is not None:
+        if n > k:
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(n)
+        # 评分相同时按行号（首次出现的顺序）排列，与稳定排序的结果一致
+        return rows[np.lexsort((rows, -scores[rows]))].tolist()
+    # heapq.nlargest 与 sorted(..., reverse=True)[:k] 等价，评分相同时同样保持行号顺序
+    return heapq.nlargest(k, range(n), key=scores.__getitem__)
+
+
+def top_items(summary, k, formula=None):
+    """按评分公式计算评分并返回 Top-K 的报告字典列表"""
+    if not len(summary):
+        return []
+    scores = score_summary(summary, formula)
+    return [summary.item(row, float(scores[row])) for row in top_rows(scores, k)]
+
+
+def rollup_keys(summary, dimension):
+    """倒排索引：维度的值 -> 行号列表（一条SQL涉及多个表或来自多个账号、主机时出现在每个值下）"""
+    index = {}
+    if dimension == "table":
+        # 只在生成汇总时解析一次；不经过 fingerprint 的缓存，避免所有SQL的指纹常驻在缓存中
+        for row, sql in enumerate(summary.sql):
+            for table in normalized_tables(normalize(sql)):
+                index.setdefault(table, []).append(row)
+    elif dimension == "db":
+        for row, db_name in enumerate(summary.db_name):
+            index.setdefault(db_name, []).append(row)
+    else:
+        primaries, counters = ((summary.username, summary.users) if dimension == "account"
+                               else (summary.host_address, summary.hosts))
+        for row, primary in enumerate(primaries):
+            for value in (counters[row] or (primary,)):
+                index.setdefault(value, []).append(row)
+    return index
+
+
+def source_rollup(source_totals, position):
+    """从 {(账号, 主机, 数据库): 汇总} 中按其中一个维度（position 见 SOURCE_POSITIONS）汇总"""
+    totals = {}
+    for source, (count, total_time, scanned_rows) in source_totals.items():
+        value = source[position]
+        total = totals.get(value)
+        if total is None:
+            totals[value] = [count, total_time, scanned_rows]
+        else:
+            total[0] += count
+            total[1] += total_time
+            total[2] += scanned_rows
+    return totals
+
+
+def build_rollups(summary, limit=10):
+    """
+    按表、数据库、账号、主机汇总，返回 {维度: 按总耗时降序的前 limit 项}。
+
+    每一项为 {"value", "count", "total_time", "total_scanned_rows", "sql_count", "top_sql"}，top_sql 为该值下总耗时最高的SQL。
+    表的指标由倒排索引中各行的指标相加（一条SQL涉及多个表时计入每个表）；数据库、账号和主机的指标取按记录累计的汇总。
+    倒排索引中每行只按第一个出现的数据库归类，超过 MAX_DISTINCT_VALUES 而计入“其他”的账号和主机没有单独的SQL列表。
+    """
+    rollups = {}
+    total_times, counts, scanned = summary.total_time, summary.count, summary.total_scanned_rows
+    for dimension in ROLLUP_DIMENSIONS:
+        index = rollup_keys(summary, dimension)
+        if dimension == "table":
+            totals = {value: [sum(counts[row] for row in rows), sum(total_times[row] for row in rows),
+                              sum(scanned[row] for row in rows)]
+                      for value, rows in index.items()}
+        else:
+            totals = source_rollup(summary.source_totals, SOURCE_POSITIONS[dimension])
+        items = []
+        for value, (count, total_time, scanned_rows) in heapq.nlargest(limit, totals.items(), key=lambda x: x[1][1]):
+            rows = index.get(value, [])
+            top_row = max(rows, key=total_times.__getitem__) if rows else None
+            items.append({"value": value, "count": count, "total_time": total_time, "total_scanned_rows": scanned_rows,
+                          "sql_count": len(rows), "top_sql": summary.sql[top_row] if top_row is not None else ""})
+        rollups[dimension] = items
+    return rollups
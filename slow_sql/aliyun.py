@@ -0,0 +1,72 @@
+# slow_sql/aliyun.py
+# 阿里云 SDK 的客户端与请求构建；SDK 在第一次创建客户端时才导入，离线模式、演练模式和回放模式不需要安装 SDK
+
+from slow_sql.fetcher import PAGE_SIZE
+from slow_sql.replay import RecordingClient, ReplayClient, replay_request_class
+
+INSTALL_HINT = "pip install aliyun-python-sdk-core aliyun-python-sdk-rds"
+
+
+def create_clients(config, instances, record_dir=None, replay_dir=None):
+    """
+    为每个区域创建一个 AcsClient，返回 {region_id: client}。
+
+    record_dir：同时将每个响应录制到该目录；replay_dir：不创建 AcsClient，从该目录回放录制的响应。
+    """
+    regions = list(dict.fromkeys(instance["region_id"] for instance in instances))
+    if replay_dir:
+        return {region_id: ReplayClient(replay_dir) for region_id in regions}
+
+    from aliyunsdkcore.client import AcsClient
+
+    clients = {}
+    for region_id in regions:
+        clients[region_id] = AcsClient(config.ACCESS_KEY_ID, config.ACCESS_KEY_SECRET, region_id)
+        if record_dir:
+            clients[region_id] = RecordingClient(clients[region_id], record_dir)
+    return clients
+
+
+def slow_log_records_request_builder(instance_id, replay=False):
+    """DescribeSlowLogRecords：慢日志明细；replay 时使用不依赖 SDK 的请求对象"""
+    if replay:
+        DescribeSlowLogRecordsRequest = replay_request_class("DescribeSlowLogRecords")
+    else:
+        from aliyunsdkrds.request.v20140815.DescribeSlowLogRecordsRequest import DescribeSlowLogRecordsRequest
+
+    def build_request(window_start_str, window_end_str, page_number):
+        # 每页使用独立的请求对象，便于并发发送
+        request = DescribeSlowLogRecordsRequest()
+        request.set_DBInstanceId(instance_id)
+        request.set_StartTime(window_start_str)
+        request.set_EndTime(window_end_str)
+        request.set_accept_format('json')
+        # 设置每页记录数量
+        request.set_PageSize(PAGE_SIZE)
+        request.set_PageNumber(page_number)
+        return request
+    return build_request
+
+
+def slow_logs_request_builder(instance_id, replay=False):
+    """DescribeSlowLogs：按SQL模板汇总的慢日志统计；replay 时使用不依赖 SDK 的请求对象"""
+    if replay:
+        DescribeSlowLogsRequest = replay_request_class("DescribeSlowLogs")
+    else:
+        from aliyunsdkrds.request.v20140815.DescribeSlowLogsRequest import DescribeSlowLogsRequest
+
+    def build_request(window_start_str, window_end_str, page_number):
+        # 每页使用独立的请求对象，便于并发发送
+        request = DescribeSlowLogsRequest()
+        request.set_DBInstanceId(instance_id)
+        request.set_StartTime(window_start_str)
+        request.set_EndTime(window_end_str)
+        # 可选参数：设置排序键
+        request.set_SortKey("TotalExecutionCounts")  # 按总执行次数排序
+        # 可选参数：设置数据库名
+        # request.set_DBName("your_db_name")
+        request.set_PageSize(PAGE_SIZE)  # 每页返回的记录数
+        request.set_PageNumber(page_number)
+        request.set_accept_format('json')
+        return request
+    return build_request
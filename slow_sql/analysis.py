@@ -0,0 +1,361 @@
+# slow_sql/analysis.py
+# SQL 分析：从 Top SQL 中提取表、WHERE / JOIN 列、ORDER BY 和 LIMIT 模式，给出候选索引和常见的写法问题。
+# 解析按 SQL 指纹缓存在 SQLite 中（最近最少使用的条目超出上限时淘汰），每周重复出现的 SQL 不再重新解析；
+# 全表扫描风险与本周的扫描行数和返回行数有关，LIKE 前导通配符和深分页取决于样例 SQL 中的字面量，都在每次运行时重新计算，不缓存
+#
+# 解析基于正则，只覆盖慢日志中常见的 SELECT / UPDATE / DELETE / INSERT ... SELECT 写法，子查询中的条件一并计入
+
+import datetime
+import json
+import re
+import sqlite3
+import sys
+
+from slow_sql.fingerprint import fingerprint, fingerprint_key
+
+# 解析规则变化时递增，缓存中旧版本的结果视为未命中（2：与字面量有关的提示不再缓存）
+ANALYSIS_VERSION = 2
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sql_analysis (
+    fingerprint TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    analysis TEXT NOT NULL,
+    last_used TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sql_analysis_last_used ON sql_analysis (last_used);
+"""
+
+# 单条 SQL 语句中 IN (...) 的参数个数上限以内分批查询（与 history.LOOKUP_BATCH 相同）
+LOOKUP_BATCH = 500
+
+# 平均扫描行数达到 FULL_SCAN_MIN_ROWS、且是平均返回行数的 FULL_SCAN_RATIO 倍以上时提示全表扫描风险
+FULL_SCAN_MIN_ROWS = 10000
+FULL_SCAN_RATIO = 100
+# LIMIT 的偏移量达到该值时提示深分页
+LARGE_OFFSET = 10000
+# 候选索引最多包含的列数
+MAX_INDEX_COLUMNS = 5
+
+# 归一化后的 SQL（见 fingerprint.normalize）：小写、字面量为 ?、运算符两侧没有空格
+CLAUSE_END = r"(?=\b(?:where|group by|order by|limit|having|union|for update|lock in|on duplicate key)\b|\)|$)"
+FROM_RE = re.compile(r"\bfrom\s?(?!\()(.+?)" + CLAUSE_END)
+UPDATE_RE = re.compile(r"^update\s(?:low_priority\s)?(?:ignore\s)?(.+?)\sset\s")
+INTO_RE = re.compile(r"^(?:insert|replace)\s(?:.*?\s)?into\s?`?(\w+)`?(?:\.`?(\w+)`?)?")
+SET_RE = re.compile(r"\sset\s.*?(?=\swhere\s|$)")
+JOIN_SPLIT_RE = re.compile(r"\b(?:(?:inner|cross|natural|(?:left|right)(?:\souter)?)\s)?(?:straight_)?join\b|,")
+INDEX_HINT_RE = re.compile(r"\b(?:force|use|ignore)\s(?:index|key)(?:\sfor\s\w+(?:\s\w+)?)?\([^)]*\)")
+TABLE_REF_RE = re.compile(r"^\s*`?(\w+)`?(?:\.`?(\w+)`?)?(?:\s(?:as\s)?`?(\w+)`?)?")
+# 列 运算符 右侧：右侧为另一个表的列时是连接条件，否则是过滤条件
+PREDICATE_RE = re.compile(
+    r"(?<![\w.`])(?:`?(\w+)`?\.)?`?([a-z_]\w*)`?"
+    r"(<=>|!=|<>|>=|<=|=|>|<|\s(?:not\s)?in\(|\s(?:not\s)?like\s|\s(?:not\s)?between\s|\sis\s(?:not\s)?)"
+    r"(?:`?(\w+)`?\.`?(\w+)`?|`?([a-z_]\w*)`?(?![\w(]))?")
+FUNCTION_PREDICATE_RE = re.compile(
+    r"\b([a-z_]\w*)\(([^()]*\b[a-z_]\w*[^()]*)\)(?:<=>|!=|<>|>=|<=|=|>|<|\s(?:not\s)?in\(|\s(?:not\s)?like\s|\sbetween\s)")
+ORDER_BY_RE = re.compile(r"\border by\s(.+?)(?=\blimit\b|\bfor update\b|\)|$)")
+GROUP_BY_RE = re.compile(r"\bgroup by\s(.+?)(?=\bhaving\b|\border by\b|\blimit\b|\)|$)")
+COLUMN_REF_RE = re.compile(r"^`?(?:(\w+)`?\.`?)?([a-z_]\w*)`?(?:\s(asc|desc))?$")
+LIMIT_RE = re.compile(r"\blimit\s?\?(,\?|\soffset\s\?)?")
+# 样例 SQL 中的字面量（指纹中已替换为 ?）
+RAW_OFFSET_RE = re.compile(r"\blimit\s+(\d+)\s*,\s*\d+|\blimit\s+\d+\s+offset\s+(\d+)", re.I)
+RAW_LEADING_WILDCARD_RE = re.compile(r"\blike\s+'%", re.I)
+
+KEYWORDS = frozenset((
+    "and", "or", "not", "where", "on", "using", "set", "select", "from", "join", "as", "is", "null", "in", "like",
+    "between", "exists", "case", "when", "then", "else", "end", "interval", "binary", "distinct", "inner", "left",
+    "right", "outer", "cross", "natural", "straight_join", "order", "group", "by", "limit", "having", "union", "all",
+    "asc", "desc", "for", "update", "delete", "insert", "into", "values", "true", "false", "force", "use", "ignore",
+    "index", "key"))
+# 条件中不会导致索引失效的函数（包住的是 ? 或子查询）
+NON_COLUMN_FUNCTIONS = frozenset(("in", "values", "exists", "coalesce", "if"))
+EQUALITY_OPERATORS = frozenset(("=", "<=>", "in(", "is"))
+RANGE_OPERATORS = frozenset((">", "<", ">=", "<=", "between", "like"))
+
+
+def table_refs(sql):
+    """返回 FROM / JOIN / UPDATE 中的 (表名列表, {别名或表名: 表名})，表名去掉了库名前缀"""
+    clauses = [match.group(1) for match in FROM_RE.finditer(sql)]
+    match = UPDATE_RE.match(sql)
+    if match:
+        clauses.append(match.group(1))
+    tables, aliases = [], {}
+    for clause in clauses:
+        clause = INDEX_HINT_RE.sub("", clause)
+        for piece in JOIN_SPLIT_RE.split(clause):
+            piece = re.split(r"\s(?:on|using)\b", piece, 1)[0]
+            match = TABLE_REF_RE.match(piece)
+            if not match or match.group(1) in KEYWORDS:
+                continue
+            table = match.group(2) or match.group(1)
+            alias = match.group(3)
+            if table not in tables:
+                tables.append(table)
+            aliases[table] = table
+            if alias and alias not in KEYWORDS:
+                aliases[alias] = table
+    return tables, aliases
+
+
+def sql_tables(sql):
+    """SQL 涉及的表（INSERT 的目标表在前）"""
+    return normalized_tables(fingerprint(sql))
+
+
+def normalized_tables(normalized):
+    """归一化后的 SQL（见 fingerprint.normalize）涉及的表，表名经过 intern，同一个表只保存一个对象"""
+    match = INTO_RE.match(normalized)
+    tables = [match.group(2) or match.group(1)] if match else []
+    tables += [table for table in table_refs(normalized)[0] if table not in tables]
+    return tuple(sys.intern(table) for table in tables)
+
+
+def resolve(qualifier, column, tables, aliases):
+    """列所属的表：有限定符时按别名查找，只有一个表时为该表，否则为 None"""
+    if qualifier:
+        return aliases.get(qualifier)
+    return tables[0] if len(tables) == 1 else None
+
+
+def column_list(text, tables, aliases):
+    """解析 ORDER BY / GROUP BY 的列，返回 [(表, 列, 方向)]；遇到表达式时返回 None"""
+    columns = []
+    for part in text.split(","):
+        match = COLUMN_REF_RE.match(part.strip())
+        if not match or match.group(2) in KEYWORDS:
+            return None
+        qualifier, column, direction = match.groups()
+        columns.append((resolve(qualifier, column, tables, aliases), column, direction or "asc"))
+    return columns
+
+
+def where_text(sql):
+    """去掉 UPDATE 的 SET 子句和 INSERT 的列名、VALUES 部分，只保留带条件的部分"""
+    if sql.startswith(("insert", "replace")):
+        position = sql.find("select")
+        return sql[position:] if position >= 0 else ""
+    if sql.startswith("update"):
+        return SET_RE.sub(" ", sql, 1)
+    return sql
+
+
+def suggest_indexes(tables, filters, joins, order_by):
+    """
+    为每个表给出一个候选索引。
+
+    有过滤条件的表（或单表查询）按 等值列、第一个范围列 的顺序，没有范围列且 ORDER BY 的列都在该表时再追加排序列；
+    其余的表是连接中被驱动的表，索引为第一个连接列。只有主键 id 一列的索引不作为建议。
+    """
+    indexes = []
+    for table in tables:
+        equal = [column for filter_table, column, kind in filters if filter_table == table and kind == "eq"]
+        ranges = [column for filter_table, column, kind in filters if filter_table == table and kind == "range"]
+        if equal or ranges or not joins:
+            columns = list(dict.fromkeys(equal))
+            if ranges:
+                if ranges[0] not in columns:
+                    columns.append(ranges[0])
+            elif order_by and all(order_table == table for order_table, _, _ in order_by):
+                columns += [column for _, column, _ in order_by if column not in columns]
+        else:
+            columns = [column for pair in joins for join_table, column in pair if join_table == table][:1]
+        columns = columns[:MAX_INDEX_COLUMNS]
+        if columns and columns != ["id"]:
+            indexes.append(f"{table}({', '.join(columns)})")
+    return indexes
+
+
+def analyze(sql):
+    """
+    解析一条 SQL（样例文本），返回可以 JSON 序列化的字典:
+
+    statement：语句类型；tables：表名；filters：[[表, 列, eq | range | neq], ...]（表未知时为 None）；
+    joins：[[表.列, 表.列], ...]；order_by / group_by：[[表, 列, 方向], ...]；limit：LIMIT 模式（limit ? / limit ?,?）；
+    warnings：写法问题；indexes：候选索引。
+    结果只取决于 SQL 指纹，可以按指纹缓存；与字面量有关的提示见 sample_warnings。
+    """
+    normalized = fingerprint(sql)
+    statement = normalized.split(" ", 1)[0].lstrip("(")
+    tables, aliases = table_refs(normalized)
+    # INSERT ... SELECT 的目标表不参与列的归属判断，也不给出索引建议
+    match = INTO_RE.match(normalized)
+    target = [match.group(2) or match.group(1)] if match else []
+    conditions = where_text(normalized)
+
+    filters, joins, neq_only = [], [], True
+    for qualifier, column, operator, right_qualifier, right_column, _ in PREDICATE_RE.findall(conditions):
+        if column in KEYWORDS or qualifier in KEYWORDS:
+            continue
+        table = resolve(qualifier, column, tables, aliases)
+        if right_column:
+            right_table = aliases.get(right_qualifier)
+            if right_table is not None and right_table != table and operator in ("=", "<=>"):
+                pair = sorted(([table, column], [right_table, right_column]), key=lambda x: (x[0] or "", x[1]))
+                if pair not in joins:
+                    joins.append(pair)
+                continue
+        operator = operator.strip()
+        if operator.startswith("not") or operator.startswith("is not") or operator in ("!=", "<>"):
+            kind = "neq"
+        elif operator.split(" ")[0] in EQUALITY_OPERATORS:
+            kind = "eq"
+        elif operator in RANGE_OPERATORS:
+            kind = "range"
+        else:
+            kind = "neq"
+        if kind != "neq":
+            neq_only = False
+        if [table, column, kind] not in filters:
+            filters.append([table, column, kind])
+
+    order_by, group_by = [], []
+    match = ORDER_BY_RE.search(normalized)
+    if match:
+        order_by = column_list(match.group(1), tables, aliases)
+    match = GROUP_BY_RE.search(normalized)
+    if match:
+        group_by = column_list(match.group(1), tables, aliases) or []
+    match = LIMIT_RE.search(normalized)
+    limit = None
+    if match:
+        limit = "limit ?,?" if match.group(1) else "limit ?"
+
+    warnings = []
+    if re.search(r"^select\s(?:distinct\s)?(?:\w+\.)?\*", normalized):
+        warnings.append("SELECT *")
+    if statement in ("select", "update", "delete") and tables and " where " not in f" {conditions} ":
+        if statement != "select" or limit is None:
+            warnings.append("没有 WHERE 条件")
+    elif filters and neq_only and not joins:
+        warnings.append("只有 != / NOT IN / NOT LIKE 条件，无法使用索引")
+    for function, argument in FUNCTION_PREDICATE_RE.findall(conditions):
+        if function not in NON_COLUMN_FUNCTIONS and function not in KEYWORDS and "?" not in argument:
+            warnings.append(f"条件中的列被函数包裹: {function}({argument})")
+    if " or " in f" {conditions} ":
+        warnings.append("OR 条件可能无法使用索引")
+    if order_by is None:
+        order_by = []
+        if "order by rand()" in normalized:
+            warnings.append("ORDER BY RAND()")
+    elif len({direction for _, _, direction in order_by}) > 1:
+        warnings.append("ORDER BY 混合升降序")
+
+    return {
+        "statement": statement,
+        "tables": target + [table for table in tables if table not in target],
+        "filters": filters,
+        "joins": [[f"{table}.{column}" for table, column in pair] for pair in joins],
+        "order_by": [list(column) for column in order_by],
+        "group_by": [list(column) for column in group_by],
+        "limit": limit,
+        "warnings": list(dict.fromkeys(warnings)),
+        "indexes": suggest_indexes(tables, filters, joins, order_by),
+    }
+
+
+def sample_warnings(sql):
+    """
+    取决于样例 SQL 中字面量的提示：LIKE 的前导通配符和 LIMIT 的偏移量（指纹中已替换为 ?）。
+    同一指纹的样例每周可能不同，每次运行按本周的样例判断，不缓存。
+    """
+    warnings = []
+    if RAW_LEADING_WILDCARD_RE.search(sql):
+        warnings.append("LIKE 以 % 开头，无法使用索引")
+    match = RAW_OFFSET_RE.search(sql)
+    if match and int(match.group(1) or match.group(2)) >= LARGE_OFFSET:
+        warnings.append(f"深分页（偏移 {int(match.group(1) or match.group(2))}）")
+    return warnings
+
+
+def full_scan_risk(item):
+    """按本周的平均扫描行数与平均返回行数判断全表扫描风险，返回 (平均扫描行数, 平均返回行数) 或 None"""
+    count = max(item["count"], 1)
+    scanned = item["total_scanned_rows"] / count
+    returned = item.get("total_return_rows", 0) / count
+    if scanned >= FULL_SCAN_MIN_ROWS and scanned >= FULL_SCAN_RATIO * max(returned, 1):
+        return round(scanned), round(returned)
+    return None
+
+
+def open_analysis_cache(path):
+    """打开（或创建）保存解析结果的 SQLite 数据库，可以与本地慢日志存储共用一个文件"""
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(CACHE_SCHEMA)
+    return conn
+
+
+class AnalysisCache(object):
+    """
+    按 SQL 指纹（fingerprint_key）缓存 analyze 的结果。
+
+    每次运行批量读取 Top SQL 的缓存，只解析未命中的 SQL；命中和新解析的条目都把最近使用时间更新为本次运行的时间，
+    条目数超过 max_entries 时删除最近使用时间最早的条目。conn 为 None 时只在内存中缓存。
+    """
+
+    def __init__(self, conn=None, max_entries=20000, now=None):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.run_time = (now or datetime.datetime.now()).isoformat(timespec="seconds")
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, keys):
+        found = {}
+        if self.conn is None:
+            return found
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[i:i + LOOKUP_BATCH]
+            cursor = self.conn.execute(
+                f"SELECT fingerprint, analysis FROM sql_analysis "
+                f"WHERE fingerprint IN ({', '.join('?' for _ in batch)}) AND version = ?",
+                batch + [ANALYSIS_VERSION])
+            found.update((key, json.loads(analysis)) for key, analysis in cursor)
+        return found
+
+    def save(self, used, parsed):
+        """更新命中条目的最近使用时间，写入新解析的结果，再淘汰超出上限的条目"""
+        if self.conn is None:
+            return
+        for i in range(0, len(used), LOOKUP_BATCH):
+            batch = used[i:i + LOOKUP_BATCH]
+            self.conn.execute(
+                f"UPDATE sql_analysis SET last_used = ? WHERE fingerprint IN ({', '.join('?' for _ in batch)})",
+                [self.run_time] + batch)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO sql_analysis (fingerprint, version, analysis, last_used) VALUES (?, ?, ?, ?)",
+            ((key, ANALYSIS_VERSION, json.dumps(analysis, ensure_ascii=False), self.run_time)
+             for key, analysis in parsed.items()))
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM sql_analysis").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM sql_analysis WHERE fingerprint IN "
+                "(SELECT fingerprint FROM sql_analysis ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+        self.conn.commit()
+
+    def analyze_all(self, sqls):
+        """返回与 sqls 一一对应的解析结果，同一指纹只解析一次"""
+        keys = [fingerprint_key(sql) for sql in sqls]
+        found = self.load([key for key in dict.fromkeys(keys) if key not in self.memory])
+        self.memory.update(found)
+        parsed = {}
+        for key, sql in zip(keys, sqls):
+            if key in self.memory:
+                self.hits += 1
+            else:
+                self.misses += 1
+                parsed[key] = self.memory[key] = analyze(sql)
+        self.save(list(found), parsed)
+        return [self.memory[key] for key in keys]
+
+    def annotate(self, items):
+        """
+        为报告的每一项加上 analysis（缓存的解析结果）、full_scan（本周的全表扫描风险）
+        和 sample_warnings（按本周样例判断的、与字面量有关的提示）
+        """
+        for item, analysis in zip(items, self.analyze_all([item["sql"] for item in items])):
+            item["analysis"] = analysis
+            item["full_scan"] = full_scan_risk(item)
+            item["sample_warnings"] = sample_warnings(item["sql"])
+        return items
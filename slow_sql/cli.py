@@ -0,0 +1,86 @@
+# slow_sql/cli.py
+# 命令行入口：python -m slow_sql [--profile [--profile-output PATH]]
+#                            report [--sync-only | --offline | --from-export DIR | --record DIR | --replay DIR] [--dry-run]
+#                            | statistics [--record DIR | --replay DIR] [--dry-run]
+#                            | combined [--record DIR | --replay DIR] [--dry-run]
+#                            | daemon [--interval SECONDS] [--once]
+# 子命令的模块在解析参数后才导入，--help 等不需要加载聚合、存储等模块
+
+import argparse
+
+from slow_sql.settings import load_config
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m slow_sql", description="阿里云 RDS 慢SQL报告")
+    parser.add_argument("--config", default="config", help="配置模块名（默认为当前目录下的 config.py）")
+    parser.add_argument("--profile", action="store_true",
+                        help="在 cProfile 下运行（Python 3.12 以下包括拉取和聚合的工作线程，不包括聚合进程），"
+                             "结束时输出耗时最高的函数")
+    parser.add_argument("--profile-output", default="slow_sql.pstats", metavar="PATH",
+                        help="--profile 的结果文件（pstats 格式，默认 slow_sql.pstats）")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    report = commands.add_parser("report", help="慢SQL周报（DescribeSlowLogRecords）")
+    mode = report.add_mutually_exclusive_group()
+    mode.add_argument("--sync-only", action="store_true", help="只同步到本地存储，不生成报告（用于每日同步的定时任务）")
+    mode.add_argument("--offline", action="store_true", help="不调用阿里云 API，只基于本地存储生成报告（需要配置 STORE_PATH）")
+    mode.add_argument("--from-export", metavar="DIR", help="不调用阿里云 API，基于 EXPORT_DIR 导出的记录生成报告")
+    add_replay_arguments(mode)
+    report.add_argument("--dry-run", action="store_true", help="生成报告但不推送到飞书")
+
+    statistics = commands.add_parser("statistics", help="慢日志统计报告（DescribeSlowLogs）")
+    add_replay_arguments(statistics.add_mutually_exclusive_group())
+    statistics.add_argument("--dry-run", action="store_true", help="生成报告但不推送到飞书")
+
+    combined = commands.add_parser("combined", help="综合报告：模板统计的执行总量关联明细的样例SQL、账号和主机分布")
+    add_replay_arguments(combined.add_mutually_exclusive_group())
+    combined.add_argument("--dry-run", action="store_true", help="生成报告但不推送到飞书")
+
+    daemon = commands.add_parser("daemon", help="常驻模式：定期拉取新增的慢日志，执行频率或耗时突增时实时告警")
+    daemon.add_argument("--interval", type=int, metavar="SECONDS", help="拉取间隔（秒），默认为配置中的 DAEMON_POLL_INTERVAL")
+    daemon.add_argument("--once", action="store_true", help="只拉取和检查一次后退出（用于测试配置）")
+    return parser
+
+
+def add_replay_arguments(group):
+    group.add_argument("--record", metavar="DIR", help="将每一页API响应压缩保存到 DIR，之后可以用 --replay 离线重放")
+    group.add_argument("--replay", metavar="DIR", help="从 --record 录制的目录回放API响应，不访问网络")
+
+
+def main(argv=None):
+    """解析命令行参数并运行子命令，返回进程退出码；运行结束时输出各阶段耗时等运行指标（见 instrument.py）"""
+    args = build_parser().parse_args(argv)
+    try:
+        config = load_config(args.config)
+    except ImportError as e:
+        print(f"[ERROR] 导入配置失败: {e}")
+        print("[INFO] 请参考 config.example.py 创建 config.py")
+        return 1
+
+    from slow_sql import instrument
+    run_metrics = instrument.start_run(args.command)
+    if args.profile:
+        code = instrument.run_profiled(lambda: run_command(args, config), args.profile_output)
+    else:
+        code = run_command(args, config)
+    # 常驻模式每轮结束时单独输出（见 daemon.run）
+    if args.command != "daemon":
+        instrument.finish_run(config, run_metrics)
+    return code
+
+
+def run_command(args, config):
+    if args.command == "report":
+        from slow_sql import report
+        return report.run(config, sync_only=args.sync_only, offline=args.offline, dry_run=args.dry_run,
+                          record_dir=args.record, replay_dir=args.replay, export_source=args.from_export)
+    if args.command == "combined":
+        from slow_sql import combined
+        return combined.run(config, dry_run=args.dry_run, record_dir=args.record, replay_dir=args.replay)
+    if args.command == "daemon":
+        from slow_sql import daemon
+        return daemon.run(config, interval=args.interval, once=args.once)
+    from slow_sql import statistics
+    return statistics.run(config, dry_run=args.dry_run, record_dir=args.record, replay_dir=args.replay)
@@ -0,0 +1,246 @@
+# slow_sql/combined.py
+# 综合报告：同时拉取 DescribeSlowLogs 的SQL模板统计和 DescribeSlowLogRecords 的明细，按SQL指纹关联。
+# 执行次数和耗时以模板统计为准（不受明细分页上限和过滤规则的影响），样例SQL、账号和主机分布、耗时分位数取自明细
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from slow_sql import aliyun, feishu, instrument, render, report, statistics
+from slow_sql.aggregator import merge_counts, value_counts
+from slow_sql.fetcher import describe_coverage, last_days, utc_now
+from slow_sql.fingerprint import fingerprint_key
+from slow_sql.replay import read_manifest_time, write_manifest
+from slow_sql.rules import RulesError, load_rules
+from slow_sql.settings import get_instances, get_webhooks, option, print_config
+from slow_sql.sketch import QuantileSketch
+
+
+def collect(config, instances, window_start, window_end, store_path=None, record_dir=None, replay_dir=None,
+            clients=None, rules=None):
+    """
+    并发拉取模板统计和明细，两者共用客户端，总耗时接近较慢的一个而不是两者之和。
+
+    阿里云按API分别限流，两个API各自使用 API_RATE_LIMIT 的请求速率和 MAX_CONCURRENT_REQUESTS 的并发请求上限；
+    共用一个上限时明细拉取就会占满，模板统计只能排在后面，总耗时又变回两者之和。
+
+    store_path / record_dir / replay_dir / rules 见 report.collect；clients 为已创建的客户端，未传入时新建。
+    返回 (templates, template_coverage, template_failed, records_result, timings)：
+    templates / template_coverage / template_failed 见 statistics.collect，records_result 见 report.collect，
+    timings 为两者各自的耗时（秒）{"statistics": ..., "records": ...}。
+    """
+    if clients is None:
+        clients = aliyun.create_clients(config, instances, record_dir=record_dir, replay_dir=replay_dir)
+        if replay_dir:
+            print(f"[INFO] 回放模式，从 {replay_dir} 读取录制的API响应")
+        else:
+            print(f"[INFO] 成功初始化阿里云客户端，共 {len(clients)} 个区域")
+    timings = {}
+
+    def timed(name, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[name] = time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        templates_future = executor.submit(timed, "statistics", statistics.collect, config, instances, window_start,
+                                           window_end, replay_dir=replay_dir, clients=clients)
+        records_future = executor.submit(timed, "records", report.collect, config, instances, window_start, window_end,
+                                         store_path=store_path, replay_dir=replay_dir, clients=clients,
+                                         rules=rules)
+        templates, template_coverage, template_failed = templates_future.result()
+        records_result = records_future.result()
+    return templates, template_coverage, template_failed, records_result, timings
+
+
+def group_templates(templates):
+    """
+    按SQL指纹合并模板统计，返回 {指纹: 汇总}。
+
+    DescribeSlowLogs 每个实例每天返回一行，同一SQL在各实例、各天的执行次数、耗时和解析行数相加，最大值取最大；
+    SQL模板、数据库取执行次数最多的一行。
+    """
+    groups = {}
+    for template in templates:
+        text = (template.get("SQLText") or "").strip()
+        if not text:
+            continue
+        count = int(template.get("MySQLTotalExecutionCounts") or 0)
+        total_time = float(template.get("MySQLTotalExecutionTimes") or 0)
+        key = fingerprint_key(text)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "key": key,
+                "sql_template": text,
+                "db_name": template.get("DBName", ""),
+                "top_count": -1,
+                "count": 0,
+                "total_time": 0.0,
+                "max_time": 0.0,
+                "parse_rows": 0,
+                "max_scan_rows": 0,
+                "instances": {},
+            }
+        if count > group["top_count"]:
+            group["sql_template"], group["db_name"], group["top_count"] = text, template.get("DBName", ""), count
+        group["count"] += count
+        group["total_time"] += total_time
+        group["max_time"] = max(group["max_time"], float(template.get("MaxExecutionTimeMS") or 0))
+        group["parse_rows"] += int(template.get("ParseTotalRowCounts") or 0)
+        group["max_scan_rows"] = max(group["max_scan_rows"], int(template.get("ParseMaxRowCount") or 0))
+        instance = group["instances"].setdefault(template.get("DBInstanceId", ""), {"count": 0, "total_time": 0.0})
+        instance["count"] += count
+        instance["total_time"] += total_time
+    return groups
+
+
+def index_summary(summary):
+    """为明细的聚合结果建立 指纹 -> [行号] 的哈希索引（同一SQL可能分别有按 SQLHash 和按指纹聚合的行）"""
+    index = {}
+    for row, sql in enumerate(summary.sql):
+        index.setdefault(fingerprint_key(sql), []).append(row)
+    return index
+
+
+def join(groups, summary):
+    """
+    将明细关联到模板：每个模板在明细的指纹索引中查找对应的行，汇总样本执行次数、账号和主机分布、耗时分位数。
+
+    样例SQL取执行次数最多的一行；没有对应明细的模板 sample 为空。
+    返回 (按模板执行次数降序的条目列表, {"matched": 关联到明细的模板数, "sample_count": 关联到的明细执行次数,
+    "unmatched_sql": 没有对应模板的明细SQL数, "unmatched_count": 其执行次数})。
+    """
+    index = index_summary(summary)
+    counts = summary.count
+    items = []
+    matched = sample_total = 0
+    for key, group in groups.items():
+        item = dict(group)
+        del item["top_count"]
+        rows = index.get(key, ())
+        item["sample"], item["sample_count"], item["hosts"], item["users"] = "", 0, [], []
+        if rows:
+            matched += 1
+            hosts, users = {}, {}
+            time_sketch = QuantileSketch()
+            max_time = 0.0
+            for row in rows:
+                merge_counts(hosts, value_counts(summary.host_address[row], summary.hosts[row], counts[row]))
+                merge_counts(users, value_counts(summary.username[row], summary.users[row], counts[row]))
+                time_sketch.merge(summary.time_sketch[row])
+                max_time = max(max_time, summary.max_time[row])
+            sample_row = max(rows, key=counts.__getitem__)
+            item["sample"] = summary.sql[sample_row]
+            item["sample_count"] = sum(counts[row] for row in rows)
+            item["hosts"] = sorted(hosts.items(), key=lambda x: x[1], reverse=True)
+            item["users"] = sorted(users.items(), key=lambda x: x[1], reverse=True)
+            for q in (95, 99):
+                item[f"p{q}_time"] = min(time_sketch.quantile(q / 100), max_time)
+            sample_total += item["sample_count"]
+        items.append(item)
+    items.sort(key=lambda x: x["count"], reverse=True)
+    unmatched = [rows for key, rows in index.items() if key not in groups]
+    return items, {
+        "matched": matched,
+        "sample_count": sample_total,
+        "unmatched_sql": len(unmatched),
+        "unmatched_count": sum(counts[row] for rows in unmatched for row in rows),
+    }
+
+
+def push_combined(client, webhooks, combined, max_bytes):
+    cards = render.build_combined_cards(combined, max_bytes)
+    sent = client.send_all(webhooks, cards, fallback=render.build_combined_text(combined))
+    print(f"[INFO] 已推送综合报告到 {sent}/{len(webhooks)} 个群")
+
+
+def run(config, dry_run=False, record_dir=None, replay_dir=None, now=None):
+    """
+    生成并推送综合报告，返回进程退出码。
+
+    dry_run 时不推送到飞书；record_dir / replay_dir 录制或回放两个API的响应，回放时时间范围与录制时一致。
+    配置了 STORE_PATH 时明细与周报一样先增量同步到本地存储（录制和回放时不使用本地存储）。
+    """
+    instances = get_instances(config)
+    print_config(config, instances)
+    try:
+        rules = load_rules(config)
+    except RulesError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    webhooks = get_webhooks(config)
+    client = feishu.client_from_config(config)
+    if webhooks and not dry_run:
+        client.flush_outbox()
+    store_path = None if replay_dir or record_dir else option(config, "STORE_PATH")
+    if replay_dir:
+        now = read_manifest_time(replay_dir)
+    else:
+        # 与周报一样按 UTC 对齐查询窗口，与本地存储的同步高水位一致（见 report.run）
+        now = now or utc_now()
+        if record_dir:
+            write_manifest(record_dir, now)
+
+    start_time, end_time, window_start, window_end = last_days(7, now)
+    print(f"[INFO] 查询时间范围: {window_start} ~ {window_end}")
+
+    started = time.perf_counter()
+    try:
+        templates, template_coverage, template_failed, records_result, timings = collect(
+            config, instances, window_start, window_end, store_path=store_path, record_dir=record_dir,
+            replay_dir=replay_dir, rules=rules)
+    except ImportError as e:
+        print(f"[ERROR] 导入依赖失败: {e}")
+        print(f"[INFO] 请安装必要的依赖: {aliyun.INSTALL_HINT}")
+        return 1
+    print(f"[INFO] 拉取完成：模板统计 {timings['statistics']:.1f}秒，明细 {timings['records']:.1f}秒，"
+          f"并发拉取共 {time.perf_counter() - started:.1f}秒")
+
+    if len(template_failed) == len(instances):
+        print("[ERROR] 所有实例的模板统计均拉取失败")
+        return 1
+    failed_instances = sorted(set(template_failed) | set(records_result["failed_instances"]))
+    if failed_instances:
+        print(f"[WARN] 以下实例拉取失败: {', '.join(failed_instances)}")
+
+    groups = group_templates(templates)
+    if not groups:
+        print("[WARN] 没有找到满足条件的慢查询统计记录")
+        return 0
+    started = time.perf_counter()
+    with instrument.stage("join"):
+        items, matching = join(groups, records_result["summary"])
+    print(f"[INFO] {len(templates)} 条模板统计合并为 {len(groups)} 条SQL，{matching['matched']} 条关联到明细，"
+          f"关联耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+    if matching["unmatched_sql"]:
+        print(f"[INFO] 明细中有 {matching['unmatched_sql']} 条SQL（{matching['unmatched_count']} 次执行）没有对应的模板统计")
+
+    total_count = sum(item["count"] for item in items)
+    combined = {
+        "start_time": start_time,
+        "end_time": end_time,
+        "instance_count": len(instances),
+        "multi_instance": len(instances) > 1,
+        "failed_instances": failed_instances,
+        "coverage_text": f"模板统计{describe_coverage(template_coverage)}，明细{describe_coverage(records_result['coverage'])}",
+        "excluded_text": rules.describe(),
+        "template_count": len(groups),
+        "total_count": total_count,
+        # 明细中排除了被过滤规则过滤的记录，并且可能受分页上限截断，样本覆盖率通常低于 100%
+        "sample_ratio": matching["sample_count"] / total_count if total_count else 0,
+        "items": items,
+    }
+    combined.update(matching)
+    print(render.build_combined_markdown(combined))
+
+    if dry_run:
+        print("[INFO] 演练模式，跳过推送")
+    elif webhooks:
+        push_combined(client, webhooks, combined, option(config, "FEISHU_CARD_MAX_BYTES"))
+    else:
+        print("[INFO] 没有配置飞书 Webhook，跳过发送")
+
+    print("[INFO] 综合报告生成完成")
+    return 0
@@ -0,0 +1,331 @@
+# slow_sql/daemon.py
+# 常驻模式：每隔几分钟只拉取上次之后新增的慢日志，维护最近1小时/24小时/7天的滑动窗口聚合，
+# 某条SQL的执行频率或耗时突然升高时推送告警到飞书，不必等到周一的周报
+
+import datetime
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from slow_sql import aliyun, feishu, instrument, render
+from slow_sql.decoding import load_decoder
+from slow_sql.fetcher import PAGE_SIZE, iter_pages, new_coverage, parse_api_time, utc_now
+from slow_sql.fingerprint import fingerprint_key
+from slow_sql.ratelimit import limiter_from_config
+from slow_sql.report import API_TIME_FORMAT, MAX_PAGES
+from slow_sql.rules import Rules, RulesError, load_rules
+from slow_sql.settings import get_instances, get_webhooks, option, print_config
+from slow_sql.store import (STORE_TIME_FORMAT, get_synced_until, iter_store_pages, open_store, prune_records,
+                            record_key, save_page, set_synced_until)
+from slow_sql.window import OTHER_KEY, SlidingWindow
+
+MINUTE = datetime.timedelta(minutes=1)
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+WEEK = datetime.timedelta(days=7)
+# 慢日志写入有延迟：每次从上次拉取的结束时间往前回退这么久再拉取，重叠部分按记录摘要去重
+POLL_OVERLAP = datetime.timedelta(minutes=10)
+# 没有本地存储时，启动后先拉取最近这么长时间的记录
+INITIAL_LOOKBACK = DAY
+# 窗口中的数据不足这么长时间时不检查执行频率（没有基线，所有SQL都会被当成突增）
+MIN_BASELINE = DAY
+
+
+class LiveAggregates(object):
+    """
+    所有实例的慢查询记录在三个滑动窗口中的聚合：最近1小时（1分钟一个桶）、24小时（15分钟）、7天（1小时）。
+
+    键为 (实例ID, SQLHash 或SQL指纹)；samples 保存每个键的SQL、数据库和账号，键滑出7天窗口后删除。
+    桶的数量固定，每个窗口的键数不超过 max_keys，运行多久内存占用都有上限。
+    """
+
+    def __init__(self, max_keys):
+        self.hour = SlidingWindow(HOUR, MINUTE, max_keys)
+        self.day = SlidingWindow(DAY, 15 * MINUTE, max_keys)
+        self.week = SlidingWindow(WEEK, HOUR, max_keys)
+        self.samples = {}
+        self.since = None  # 窗口中最早一条记录的时间，用于判断基线是否足够
+
+    def add_page(self, instance_id, records, rules):
+        """加入一页 SlowRecord，返回加入的记录数（被 rules 过滤的记录、早于7天窗口的记录不计入）"""
+        hour, day, week, samples = self.hour, self.day, self.week, self.samples
+        earliest = self.since
+        added = 0
+        for record in records:
+            sql = record.SQLText.strip()
+            if not sql or rules.excluded(record, sql):
+                continue
+            ts = parse_api_time(record.ExecutionStartTime)
+            if ts is None:
+                continue
+            key = (instance_id, record.SQLHash or fingerprint_key(sql))
+            executions, query_time = int(record.QueryTimes), float(record.QueryTimeMS)
+            if not week.add(key, ts, executions, query_time):
+                continue
+            day.add(key, ts, executions, query_time)
+            hour.add(key, ts, executions, query_time)
+            if key not in samples:
+                samples[key] = (sql, record.DBName, record.AccountName)
+            if earliest is None or ts < earliest:
+                earliest = ts
+            added += 1
+        self.since = earliest
+        return added
+
+    def advance(self, now):
+        """三个窗口都滑动到 now（没有新记录时也要淘汰过期的桶），并删除已滑出7天窗口的键的 samples"""
+        for window in (self.hour, self.day, self.week):
+            window.advance(now)
+        totals = self.week.totals
+        for key in [key for key in self.samples if key not in totals]:
+            del self.samples[key]
+
+
+def detect_alerts(live, now, config):
+    """
+    检查最近1小时执行次数不少于 ALERT_MIN_EXECUTIONS 的SQL，返回告警列表（按最近1小时执行次数降序）：
+
+    - 执行频率：达到过去7天（不含最近1小时）每小时平均的 ALERT_RATE_RATIO 倍，或过去7天没有出现过；
+      窗口中的数据不足 MIN_BASELINE 时不检查
+    - 耗时：平均耗时不低于 ALERT_MIN_LATENCY_MS，且达到过去24小时（不含最近1小时）平均耗时的 ALERT_LATENCY_RATIO 倍
+    """
+    min_executions = option(config, "ALERT_MIN_EXECUTIONS")
+    rate_ratio = option(config, "ALERT_RATE_RATIO")
+    latency_ratio = option(config, "ALERT_LATENCY_RATIO")
+    min_latency = option(config, "ALERT_MIN_LATENCY_MS")
+    if live.since is None:
+        return []
+    baseline_span = min(now - live.since, WEEK) - HOUR
+    baseline_hours = baseline_span / HOUR if baseline_span >= MIN_BASELINE else None
+
+    alerts = []
+    for key, (count, total_time) in live.hour.totals.items():
+        if key == OTHER_KEY or count < min_executions or key not in live.samples:
+            continue
+        reasons = []
+        baseline_rate = None
+        if baseline_hours is not None:
+            week_count, _ = live.week.get(key)
+            baseline_rate = max(week_count - count, 0) / baseline_hours
+            if baseline_rate == 0:
+                reasons.append(f"过去{round(baseline_hours / 24)}天未出现")
+            elif count >= rate_ratio * baseline_rate:
+                reasons.append(f"执行次数为过去7天每小时平均的 {count / baseline_rate:.1f} 倍")
+        avg_time = total_time / count
+        day_count, day_time = live.day.get(key)
+        baseline_avg_time = None
+        if day_count > count:
+            baseline_avg_time = max(day_time - total_time, 0.0) / (day_count - count)
+            if avg_time >= min_latency and avg_time >= latency_ratio * baseline_avg_time:
+                reasons.append(f"平均耗时为过去24小时的 {avg_time / max(baseline_avg_time, 1):.1f} 倍")
+        if not reasons:
+            continue
+        instance_id, _ = key
+        sql, db_name, username = live.samples[key]
+        alerts.append({
+            "key": key,
+            "instance_id": instance_id,
+            "sql": sql,
+            "db_name": db_name,
+            "username": username,
+            "count": count,
+            "baseline_rate": baseline_rate,
+            "avg_time": avg_time,
+            "baseline_avg_time": baseline_avg_time,
+            "max_time": live.hour.max_time(key),
+            "reasons": reasons,
+        })
+    alerts.sort(key=lambda alert: alert["count"], reverse=True)
+    return alerts
+
+
+class Monitor(object):
+    """
+    常驻模式的状态：滑动窗口、每个实例下次拉取的开始时间、重叠区间内已加入的记录摘要和每条SQL上次告警的时间。
+
+    配置了 store_path 时启动后先从本地存储读取最近7天的记录，拉取到的记录同时写入本地存储（周报可以直接使用）。
+    decode_page 见 decoding.load_decoder，未传入时按 JSON_DECODER 选择；rules 为过滤规则（见 rules.Rules），未传入时使用默认规则；
+    replay 为 True 时使用不依赖 SDK 的请求对象（见 aliyun.slow_log_records_request_builder）。
+    """
+
+    def __init__(self, config, instances, clients, decode_page=None, store_path=None, replay=False, rules=None):
+        self.config = config
+        self.instances = instances
+        self.clients = clients
+        self.decode_page = decode_page or load_decoder(option(config, "JSON_DECODER"))[1]
+        self.store_path = store_path
+        self.replay = replay
+        self.rules = rules or Rules()
+        self.live = LiveAggregates(option(config, "DAEMON_MAX_KEYS"))
+        self.since = {}  # 实例ID -> 下次拉取的开始时间
+        self.recent = {}  # 实例ID -> {重叠区间内已加入的记录摘要: 记录时间}
+        self.alerted = {}  # 键 -> 上次告警的时间
+        self.pruned_on = None  # 上次清理本地存储的日期
+        self.lock = threading.Lock()
+        self.limiter = limiter_from_config(config, replay=replay)  # 各轮共用，被限流后降低的速率在下一轮继续生效
+
+    def label(self, instance_id):
+        return f"[{instance_id}] " if len(self.instances) > 1 else ""
+
+    def warm_up(self, now):
+        """
+        确定每个实例第一次拉取的开始时间；有本地存储时先把其中最近7天的记录加入窗口。
+
+        warm_up、poll 的 now 都是 UTC 时间（见 fetcher.utc_now）：它作为以 Z 结尾的时间参数发给 API，
+        并与 UTC 的 ExecutionStartTime 比较，用本地时间时窗口会错开时区的小时数。
+        """
+        for instance in self.instances:
+            instance_id = instance["instance_id"]
+            self.since[instance_id] = now - INITIAL_LOOKBACK
+            self.recent[instance_id] = {}
+            if not self.store_path:
+                continue
+            store = open_store(self.store_path)
+            synced_until = get_synced_until(store, instance_id)
+            if synced_until is None:
+                store.close()
+                continue
+            # 本地存储中的记录读到重叠区间之前为止，之后的部分重新拉取
+            since = max(now - WEEK, synced_until - POLL_OVERLAP)
+            added = 0
+            for page_records in iter_store_pages(store, instance_id, now - WEEK, since):
+                added += self.live.add_page(instance_id, page_records, self.rules)
+            store.close()
+            self.since[instance_id] = since
+            print(f"[INFO] {self.label(instance_id)}从本地存储加载 {added} 条记录，从 {since} 开始拉取")
+
+    def poll_instance(self, instance, end):
+        """拉取一个实例 [since, end] 的记录并加入窗口，返回新加入的记录数"""
+        instance_id = instance["instance_id"]
+        start = max(self.since[instance_id], end - WEEK)
+        recent = self.recent[instance_id]
+        store = open_store(self.store_path) if self.store_path else None
+        pages = iter_pages(self.clients[instance["region_id"]],
+                           aliyun.slow_log_records_request_builder(instance_id, replay=self.replay),
+                           "SQLSlowRecord", start, end, API_TIME_FORMAT, MINUTE, "ExecutionStartTime", new_coverage(),
+                           page_size=PAGE_SIZE, max_pages=MAX_PAGES, workers=option(self.config, "FETCH_WORKERS"),
+                           limiter=self.limiter, label=self.label(instance_id), decode_page=self.decode_page)
+        added = 0
+        try:
+            for _, page_records in pages:
+                if store is not None:
+                    with instrument.stage("store_write"):
+                        save_page(store, instance_id, page_records)
+                fresh = []
+                for record in page_records:
+                    digest = record_key(record)
+                    if digest not in recent:
+                        recent[digest] = record.ExecutionStartTime
+                        fresh.append(record)
+                with self.lock, instrument.stage("window"):
+                    added += self.live.add_page(instance_id, fresh, self.rules)
+            if store is not None:
+                set_synced_until(store, instance_id, end)
+        finally:
+            # 出错时在当前线程关闭生成器（结束其中的线程池），不留给垃圾回收
+            pages.close()
+            if store is not None:
+                store.close()
+        # 下次从 end 往前回退 POLL_OVERLAP 开始拉取，只需要记住这之后的记录摘要
+        since = end - POLL_OVERLAP
+        cutoff = since.strftime(STORE_TIME_FORMAT)
+        self.recent[instance_id] = {digest: ts for digest, ts in recent.items() if ts and ts >= cutoff}
+        self.since[instance_id] = since
+        return added
+
+    def poll(self, now):
+        """拉取所有实例的新增记录并检查告警，返回 (本次加入的记录数, 需要推送的告警)"""
+        end = now.replace(second=0, microsecond=0)
+        added = 0
+        with ThreadPoolExecutor(max_workers=min(len(self.instances), option(self.config, "MAX_CONCURRENT_REQUESTS"))) as executor:
+            futures = {executor.submit(self.poll_instance, instance, end): instance["instance_id"]
+                       for instance in self.instances}
+            for future in as_completed(futures):
+                try:
+                    added += future.result()
+                except Exception as e:
+                    # 下次拉取时从同一个开始时间重试
+                    print(f"[ERROR] {self.label(futures[future])}拉取慢日志失败: {e}")
+        self.live.advance(end)
+        if self.store_path and self.pruned_on != end.date():
+            store = open_store(self.store_path)
+            prune_records(store, end - datetime.timedelta(days=option(self.config, "STORE_RETENTION_DAYS")))
+            store.close()
+            self.pruned_on = end.date()
+        return added, self.throttle(detect_alerts(self.live, end, self.config), end)
+
+    def throttle(self, alerts, now):
+        """同一条SQL在 ALERT_COOLDOWN_MINUTES 内只告警一次"""
+        cooldown = datetime.timedelta(minutes=option(self.config, "ALERT_COOLDOWN_MINUTES"))
+        self.alerted = {key: ts for key, ts in self.alerted.items() if now - ts < cooldown}
+        alerts = [alert for alert in alerts if alert["key"] not in self.alerted]
+        for alert in alerts:
+            self.alerted[alert["key"]] = now
+        return alerts
+
+
+def push_alerts(client, webhooks, alerts, now, max_bytes):
+    # 告警标题显示本地时间
+    now = now.replace(tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None)
+    cards = render.build_alert_cards(alerts, now, max_bytes)
+    sent = client.send_all(webhooks, cards, fallback=render.build_alert_text(alerts, now))
+    print(f"[INFO] 已推送告警到 {sent}/{len(webhooks)} 个群")
+
+
+def run(config, interval=None, once=False):
+    """
+    常驻运行，收到 SIGTERM 或 Ctrl+C 后在本轮结束时退出，返回进程退出码。
+
+    interval：拉取间隔（秒），默认为 DAEMON_POLL_INTERVAL；once：只拉取一次（用于测试配置）
+    """
+    instances = get_instances(config)
+    print_config(config, instances)
+    try:
+        rules = load_rules(config)
+    except RulesError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    webhooks = get_webhooks(config)
+    client = feishu.client_from_config(config)
+    interval = interval or option(config, "DAEMON_POLL_INTERVAL")
+    try:
+        clients = aliyun.create_clients(config, instances)
+    except ImportError as e:
+        print(f"[ERROR] 导入依赖失败: {e}")
+        print(f"[INFO] 请安装必要的依赖: {aliyun.INSTALL_HINT}")
+        return 1
+    decoder_name, decode_page = load_decoder(option(config, "JSON_DECODER"))
+    print(f"[INFO] 常驻模式，每 {interval} 秒拉取一次，使用 {decoder_name} 解析API响应")
+
+    monitor = Monitor(config, instances, clients, decode_page, store_path=option(config, "STORE_PATH"), rules=rules)
+    monitor.warm_up(utc_now())
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while True:
+            started = time.monotonic()
+            now = utc_now()
+            # 每轮单独记录运行指标，本轮结束时输出
+            round_metrics = instrument.start_run("daemon")
+            try:
+                if webhooks:
+                    client.flush_outbox()
+                added, alerts = monitor.poll(now)
+                print(f"[INFO] 本轮新增 {added} 条记录，最近1小时 {len(monitor.live.hour.totals)} 条SQL，"
+                      f"最近7天 {len(monitor.live.week.totals)} 条SQL，耗时 {time.monotonic() - started:.1f}秒")
+                if alerts:
+                    render.print_alerts(alerts)
+                    if webhooks:
+                        push_alerts(client, webhooks, alerts, now, option(config, "FEISHU_CARD_MAX_BYTES"))
+            except Exception as e:
+                # 常驻进程不因单轮的错误退出，下一轮重试
+                print(f"[ERROR] 本轮处理失败: {type(e).__name__}: {e}")
+            instrument.finish_run(config, round_metrics)
+            if once or stop.wait(max(0, interval - (time.monotonic() - started))):
+                break
+    except KeyboardInterrupt:
+        pass
+    client.close()
+    print("[INFO] 常驻模式已退出")
+    return 0
@@ -0,0 +1,101 @@
+# slow_sql/decoding.py
+# 解析 DescribeSlowLogRecords 的响应：优先使用 msgspec / orjson，都未安装时使用标准库 json；
+# 每条记录解析为只包含聚合和本地存储用到的字段的 SlowRecord，其余字段直接丢弃
+
+import json
+from collections import namedtuple
+from operator import attrgetter
+from typing import List, Union
+
+# SQLSlowRecord 中用到的字段（与 API 字段同名）及缺省值
+SLOW_RECORD_FIELDS = (
+    ("ExecutionStartTime", ""),
+    ("SQLHash", ""),
+    ("SQLText", ""),
+    ("QueryTimeMS", 0),
+    ("ScanRows", 0),
+    ("ReturnRowCounts", 0),
+    ("ParseRowCounts", 0),
+    ("AccountName", ""),
+    ("DBName", ""),
+    ("HostAddress", ""),
+    ("QueryTimes", 1),
+)
+FIELD_NAMES = tuple(name for name, _ in SLOW_RECORD_FIELDS)
+FIELD_DEFAULTS = tuple(default for _, default in SLOW_RECORD_FIELDS)
+
+# 自动选择时按此顺序尝试
+BACKENDS = ("msgspec", "orjson", "json")
+
+# 标准库 json / orjson 先解析为字典，再转换为 SlowRecord；msgspec 直接解析为字段相同的结构体
+SlowRecord = namedtuple("SlowRecord", FIELD_NAMES)
+# namedtuple 的 defaults 参数需要 Python 3.7，直接设置构造函数的缺省值
+SlowRecord.__new__.__defaults__ = FIELD_DEFAULTS
+
+
+# 按 FIELD_NAMES 的顺序取出 SlowRecord 或 msgspec 结构体的字段值，得到可以 pickle 的普通元组（传给其他进程）
+record_tuple = attrgetter(*FIELD_NAMES)
+
+
+def to_record(record):
+    """将 SQLSlowRecord 字典转换为 SlowRecord，缺少的字段取缺省值"""
+    return SlowRecord._make(map(record.get, FIELD_NAMES, FIELD_DEFAULTS))
+
+
+def dict_page_decoder(loads):
+    def decode_page(body):
+        result = loads(body)
+        records = result.get("Items", {}).get("SQLSlowRecord", [])
+        return result.get("TotalRecordCount", 0), [to_record(record) for record in records]
+    return decode_page
+
+
+def msgspec_page_decoder():
+    import msgspec
+
+    # 字段类型与标准库解析出的值保持一致（允许 null，数值字段也可能是字符串），
+    # 本地存储按字段值去重，切换后端不会改变同一条记录的摘要；未声明的字段在解析时直接跳过
+    record_type = msgspec.defstruct(
+        "SlowRecord",
+        [(name, Union[str, None] if isinstance(default, str) else Union[int, float, str, None], default)
+         for name, default in SLOW_RECORD_FIELDS],
+        gc=False)
+    items_type = msgspec.defstruct("Items", [("SQLSlowRecord", List[record_type], msgspec.field(default_factory=list))])
+    page_type = msgspec.defstruct("Page", [("TotalRecordCount", int, 0),
+                                           ("Items", items_type, msgspec.field(default_factory=items_type))])
+    decoder = msgspec.json.Decoder(page_type)
+
+    def decode_page(body):
+        page = decoder.decode(body)
+        return page.TotalRecordCount, page.Items.SQLSlowRecord
+    return decode_page
+
+
+def page_decoder(backend):
+    """返回指定后端的 decode_page(body) -> (TotalRecordCount, [SlowRecord, ...])，后端未安装时抛出 ImportError"""
+    if backend == "msgspec":
+        return msgspec_page_decoder()
+    if backend == "orjson":
+        import orjson
+        return dict_page_decoder(orjson.loads)
+    if backend == "json":
+        return dict_page_decoder(json.loads)
+    raise ValueError(f"不支持的 JSON 解析后端: {backend}，可选: auto, {', '.join(BACKENDS)}")
+
+
+def load_decoder(backend="auto"):
+    """
+    返回 (后端名称, decode_page)。
+
+    backend 为 auto 时按 BACKENDS 的顺序选择第一个已安装的后端；指定的后端未安装时退回自动选择。
+    """
+    if backend != "auto":
+        try:
+            return backend, page_decoder(backend)
+        except ImportError:
+            print(f"[WARN] JSON 解析后端 {backend} 未安装，自动选择其他后端")
+    for name in BACKENDS:
+        try:
+            return name, page_decoder(name)
+        except ImportError:
+            continue
@@ -0,0 +1,328 @@
+# slow_sql/export.py
+# 导出原始记录和每日聚合，供 pandas / DuckDB 分析：安装了 pyarrow 时写 Parquet，否则写分块的 gzip CSV。
+# 边拉取边写入，每个分区只缓冲一个行组，内存占用与记录总数无关；导出的记录也可以作为缓存，report --from-export 直接基于导出文件生成报告
+#
+# 目录结构（Hive 风格分区，DuckDB: read_parquet('导出目录/records/**/*.parquet', hive_partitioning = true)）:
+#   records/instance_id=<实例ID>/day=<YYYY-MM-DD>/part-<运行时间>-<序号>.parquet | .csv.gz     原始记录
+#   aggregates/instance_id=<实例ID>/day=<YYYY-MM-DD>/part-<运行时间>-<序号>.parquet | .csv.gz  按SQL键的每日聚合
+#
+# 每次运行整体替换本次导出的分区（先写临时文件，实例的所有分页处理完后改名，再删除旧文件），重复运行不会产生重复记录；
+# 导出不应用过滤规则，修改规则后可以直接基于导出文件重新生成报告
+
+import csv
+import datetime
+import gzip
+import os
+import threading
+
+from slow_sql import instrument
+from slow_sql.decoding import SlowRecord
+from slow_sql.fingerprint import fingerprint_key
+from slow_sql.store import RECORD_FIELDS, STORE_TIME_FORMAT, record_values
+
+FORMATS = ("parquet", "csv")
+EXTENSIONS = {"parquet": ".parquet", "csv": ".csv.gz"}
+# Parquet 每个行组的行数（写入前在内存中缓冲的行数）
+ROW_GROUP_ROWS = 65536
+# 每个文件最多的行数，超过时在同一分区中新建文件
+FILE_ROWS = 1000000
+# 读取导出文件时每页的记录数
+READ_PAGE_SIZE = 1000
+
+RECORD_COLUMNS = tuple(column for column, _ in RECORD_FIELDS)
+# 原始记录中的数值列，其余为字符串（API 返回的数值也可能是字符串，写 Parquet 时统一转换）
+RECORD_TYPES = {"query_time_ms": "float64", "scan_rows": "int64", "return_row_counts": "int64",
+                "parse_row_counts": "int64", "query_times": "int64"}
+AGGREGATE_COLUMNS = ("sql_key", "sql_text", "db_name", "count", "total_time", "max_time", "total_scanned_rows",
+                     "total_parse_rows", "total_return_rows")
+AGGREGATE_TYPES = {"count": "int64", "total_time": "float64", "max_time": "float64", "total_scanned_rows": "int64",
+                   "total_parse_rows": "int64", "total_return_rows": "int64"}
+CONVERTERS = {"float64": lambda value: float(value or 0), "int64": lambda value: int(value or 0)}
+
+
+def resolve_format(name="auto"):
+    """auto 时安装了 pyarrow 则用 parquet，否则用 csv；指定 parquet 但未安装 pyarrow 时退回 csv"""
+    if name not in ("auto",) + FORMATS:
+        raise ValueError(f"不支持的导出格式: {name}，可选: auto, {', '.join(FORMATS)}")
+    if name == "csv":
+        return name
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        if name == "parquet":
+            print("[WARN] 未安装 pyarrow，改为导出 gzip CSV")
+        return "csv"
+
+
+class CsvPart(object):
+    """
+    gzip 压缩的 CSV 文件，第一行为列名；行直接写入压缩流，不在内存中缓冲。
+
+    数值列与 Parquet 一样先用 CONVERTERS 转换，API 返回的 null 和空字符串写为 0，读回后可以直接聚合。
+    """
+
+    def __init__(self, path, columns, types):
+        self.file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+        self.converters = [(index, CONVERTERS[types[column]]) for index, column in enumerate(columns)
+                           if types.get(column) in CONVERTERS]
+
+    def convert(self, row):
+        row = list(row)
+        for index, converter in self.converters:
+            row[index] = converter(row[index])
+        return row
+
+    def write(self, rows):
+        self.writer.writerows(map(self.convert, rows))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetPart(object):
+    """Parquet 文件，每攒够 ROW_GROUP_ROWS 行按列转换类型后写入一个行组"""
+
+    def __init__(self, path, columns, types):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.types = [types.get(column, "string") for column in columns]
+        self.schema = pyarrow.schema([(column, type_name) for column, type_name in zip(columns, self.types)])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= ROW_GROUP_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        arrays = []
+        for values, type_name in zip(zip(*self.rows), self.types):
+            if type_name in CONVERTERS:
+                values = map(CONVERTERS[type_name], values)
+            arrays.append(self.pa.array(values, type=type_name))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+PART_TYPES = {"parquet": ParquetPart, "csv": CsvPart}
+
+
+class PartitionWriter(object):
+    """
+    一个分区（表、实例、日期）本次运行写入的文件。
+
+    写入隐藏的临时文件，超过 FILE_ROWS 行时新建下一个文件；commit 时改名为 part-*，再删除分区中之前运行写入的文件，
+    abort 时删除临时文件，分区保持原样。
+    """
+
+    def __init__(self, directory, fmt, run_id, columns, types):
+        self.directory = directory
+        self.fmt = fmt
+        self.run_id = run_id
+        self.columns = columns
+        self.types = types
+        self.paths = []
+        self.part = None
+        self.part_rows = 0
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def temp_path(self, index):
+        return os.path.join(self.directory, f".part-{self.run_id}-{index:04d}{EXTENSIONS[self.fmt]}.tmp")
+
+    def write(self, rows):
+        if self.part is None or self.part_rows >= FILE_ROWS:
+            self.close_part()
+            self.paths.append(self.temp_path(len(self.paths)))
+            self.part = PART_TYPES[self.fmt](self.paths[-1], self.columns, self.types)
+            self.part_rows = 0
+        self.part.write(rows)
+        self.part_rows += len(rows)
+        self.rows += len(rows)
+
+    def close_part(self):
+        if self.part is not None:
+            self.part.close()
+            self.part = None
+
+    def commit(self):
+        self.close_part()
+        committed = set()
+        for path in self.paths:
+            name = os.path.basename(path)[1:-len(".tmp")]
+            os.replace(path, os.path.join(self.directory, name))
+            committed.add(name)
+        for name in os.listdir(self.directory):
+            if name.startswith("part-") and name not in committed:
+                os.remove(os.path.join(self.directory, name))
+        return len(self.paths)
+
+    def abort(self):
+        try:
+            self.close_part()
+        finally:
+            for path in self.paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def partition_dir(directory, table, instance_id, day):
+    return os.path.join(directory, table, f"instance_id={instance_id}", f"day={day}")
+
+
+class InstanceExport(object):
+    """一个实例本次运行的导出：原始记录按日期写入各自的分区，同时按 (日期, SQL键) 累计每日聚合"""
+
+    def __init__(self, exporter, instance_id):
+        self.exporter = exporter
+        self.instance_id = instance_id
+        self.records = {}  # 日期 -> PartitionWriter
+        self.daily = {}  # 日期 -> {SQL键: [SQL, 数据库, 执行次数, 总耗时, 最大耗时, 扫描行数, 解析行数, 返回行数]}
+
+    def writer(self, table, day, columns, types):
+        exporter = self.exporter
+        return PartitionWriter(partition_dir(exporter.directory, table, self.instance_id, day), exporter.fmt,
+                               exporter.run_id, columns, types)
+
+    def add_page(self, records):
+        by_day = {}
+        for record in records:
+            values = record_values(record)
+            day = values[0][:10]
+            rows = by_day.get(day)
+            if rows is None:
+                rows = by_day[day] = []
+            rows.append(values)
+
+            # 与 aggregate_page 相同的键和指标，但不应用过滤规则
+            sql = (record.SQLText or "").strip()
+            if not sql:
+                continue
+            key = record.SQLHash or fingerprint_key(sql)
+            totals = self.daily.setdefault(day, {})
+            row = totals.get(key)
+            if row is None:
+                row = totals[key] = [sql, record.DBName or "", 0, 0.0, 0.0, 0, 0, 0]
+            # 数值字段可能为 null，与写入导出文件时一样按 0 计算
+            query_time = float(record.QueryTimeMS or 0)
+            return_rows = int(record.ReturnRowCounts or 0)
+            row[2] += int(record.QueryTimes or 0)
+            row[3] += query_time
+            if query_time > row[4]:
+                row[4] = query_time
+            row[5] += int(record.ScanRows or 0) or return_rows
+            row[6] += int(record.ParseRowCounts or 0)
+            row[7] += return_rows
+        for day, rows in by_day.items():
+            writer = self.records.get(day)
+            if writer is None:
+                writer = self.records[day] = self.writer("records", day, RECORD_COLUMNS, RECORD_TYPES)
+            writer.write(rows)
+
+    def commit(self):
+        """写入每日聚合，再提交所有分区；返回 (记录数, 聚合行数, 文件数)"""
+        writers = list(self.records.values())
+        aggregate_rows = 0
+        try:
+            for day, totals in self.daily.items():
+                writer = self.writer("aggregates", day, AGGREGATE_COLUMNS, AGGREGATE_TYPES)
+                writers.append(writer)
+                writer.write([(key,) + tuple(row) for key, row in totals.items()])
+                aggregate_rows += len(totals)
+        except BaseException:
+            self.abort(writers)
+            raise
+        files = sum(writer.commit() for writer in writers)
+        return sum(writer.rows for writer in self.records.values()), aggregate_rows, files
+
+    def abort(self, writers=None):
+        for writer in writers or self.records.values():
+            writer.abort()
+
+
+class Exporter(object):
+    """
+    导出到 directory：export_pages 包装一个实例的分页迭代器，每页先写入导出文件再交给聚合。
+
+    多个实例的拉取线程可以同时使用（每个实例写入各自的分区）；某个实例拉取失败时丢弃该实例本次写入的文件。
+    """
+
+    def __init__(self, directory, fmt="auto", now=None):
+        self.directory = directory
+        self.fmt = resolve_format(fmt)
+        self.run_id = (now or datetime.datetime.now()).strftime("%Y%m%d%H%M%S")
+        self.lock = threading.Lock()
+        self.totals = {"records": 0, "aggregates": 0, "files": 0, "instances": 0}
+
+    def export_pages(self, instance_id, pages):
+        instance = InstanceExport(self, instance_id)
+        try:
+            for page_records in pages:
+                with instrument.stage("export_write"):
+                    instance.add_page(page_records)
+                yield page_records
+        except BaseException:
+            instance.abort()
+            raise
+        with instrument.stage("export_write"):
+            records, aggregates, files = instance.commit()
+        with self.lock:
+            self.totals["records"] += records
+            self.totals["aggregates"] += aggregates
+            self.totals["files"] += files
+            self.totals["instances"] += 1
+
+    def describe(self):
+        totals = self.totals
+        return (f"导出 {totals['instances']} 个实例的 {totals['records']} 条记录、{totals['aggregates']} 行每日聚合"
+                f"到 {self.directory}（{self.fmt}，{totals['files']} 个文件）")
+
+
+def iter_part_rows(path):
+    """按块读取一个导出文件，yield 行元组的列表（列顺序为 RECORD_COLUMNS）"""
+    if path.endswith(EXTENSIONS["parquet"]):
+        import pyarrow.parquet
+
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=READ_PAGE_SIZE, columns=list(RECORD_COLUMNS)):
+            yield list(zip(*(column.to_pylist() for column in batch.columns)))
+        return
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        if tuple(next(reader, ())) != RECORD_COLUMNS:
+            raise ValueError(f"导出文件 {path} 的列与当前版本不一致")
+        while True:
+            rows = [row for _, row in zip(range(READ_PAGE_SIZE), reader)]
+            if not rows:
+                break
+            yield rows
+
+
+def iter_export_pages(directory, instance_id, start_time, end_time):
+    """按页读取导出的 [start_time, end_time) 内的原始记录，还原为 SlowRecord（CSV 中的数值为字符串，聚合时再转换；null 写入时已转换为 0）"""
+    root = os.path.join(directory, "records", f"instance_id={instance_id}")
+    if not os.path.isdir(root):
+        return
+    start, end = start_time.strftime(STORE_TIME_FORMAT), end_time.strftime(STORE_TIME_FORMAT)
+    for partition in sorted(os.listdir(root)):
+        day = partition[len("day="):]
+        if not partition.startswith("day=") or day < start[:10] or day > end[:10]:
+            continue
+        for name in sorted(os.listdir(os.path.join(root, partition))):
+            if not name.startswith("part-"):
+                continue
+            for rows in iter_part_rows(os.path.join(root, partition, name)):
+                records = [SlowRecord._make(row) for row in rows if start <= row[0] < end]
+                if records:
+                    yield records
@@ -0,0 +1,221 @@
+# slow_sql/feishu.py
+# 飞书群机器人推送：复用连接的 requests.Session、连接/读取超时、带随机抖动的重试，
+# 发送失败的消息写入本地发件箱，下次运行时补发；requests 在第一次推送时才导入
+
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from slow_sql import instrument
+from slow_sql.settings import option
+
+# 飞书返回的限流错误码（请求过于频繁），与 HTTP 429 / 5xx 一样可以重试
+RATE_LIMIT_CODES = (11232,)
+# 发件箱中超过这个时间的消息不再补发（下一份周报已经生成）
+OUTBOX_MAX_AGE = datetime.timedelta(days=7)
+OUTBOX_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def encode_payload(payload):
+    """序列化为发送的请求体：中文不转义、不加空格，同样的内容字节数更少（render 按同样的方式计算卡片大小）"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class DeliveryError(Exception):
+    """
+    推送失败。
+
+    retryable 为 False 表示飞书明确拒绝了这条消息（如消息格式或大小不符合要求），重发同样会失败。
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def mask_webhook(webhook):
+    """日志中只显示 Webhook 的最后几位"""
+    return f"...{webhook[-8:]}" if len(webhook) > 8 else webhook
+
+
+def check_response(response):
+    """飞书返回 HTTP 200 且 code（旧版为 StatusCode）为 0 才算成功，否则抛出 DeliveryError"""
+    status = response.status_code
+    if status == 429 or status >= 500:
+        raise DeliveryError(f"状态码: {status}")
+    if status != 200:
+        raise DeliveryError(f"状态码: {status}, 返回: {response.text[:200]}", retryable=False)
+    try:
+        result = response.json()
+    except ValueError:
+        raise DeliveryError(f"返回内容不是 JSON: {response.text[:200]}")
+    code = result.get("code", result.get("StatusCode", 0))
+    if code != 0:
+        raise DeliveryError(f"错误码: {code}, 消息: {result.get('msg', result.get('StatusMessage'))}",
+                            retryable=code in RATE_LIMIT_CODES)
+
+
+class FeishuClient(object):
+    """
+    向一个或多个飞书 Webhook 推送消息。
+
+    每条消息是按顺序发送的一组 payload（如拆分后的多张卡片），同一 Webhook 的相邻 payload 至少间隔 send_interval 秒，
+    避免触发飞书机器人的频率限制；单次请求受 timeout=(连接, 读取) 秒限制，
+    网络错误、HTTP 429/5xx 和飞书限流最多重试 max_retries 次，单个 Webhook 的推送耗时因此有上限。
+    配置了 outbox_dir 时，重试后仍未发送的 payload 写入发件箱，由下次运行的 flush_outbox 补发。
+    """
+
+    def __init__(self, timeout=(5, 15), max_retries=3, base_delay=1.0, outbox_dir=None, max_workers=8,
+                 send_interval=0.5):
+        self.timeout = timeout
+        self.send_interval = send_interval
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.outbox_dir = outbox_dir
+        self.max_workers = max_workers
+        self.session = None
+        self.lock = threading.Lock()
+
+    def get_session(self):
+        """所有 Webhook 共用一个连接池，连接数足够并发推送"""
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self.session = requests.Session()
+                self.session.mount("https://", HTTPAdapter(pool_maxsize=self.max_workers))
+                self.session.mount("http://", HTTPAdapter(pool_maxsize=self.max_workers))
+                self.session.headers["Content-Type"] = "application/json; charset=utf-8"
+            return self.session
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+    def post(self, webhook, payload):
+        """发送一个 payload，网络错误、HTTP 429/5xx 和限流时按指数退避（带随机抖动）重试"""
+        body = encode_payload(payload)
+        session = self.get_session()
+        attempt = 0
+        while True:
+            try:
+                with instrument.stage("push"):
+                    check_response(session.post(webhook, data=body, timeout=self.timeout))
+                instrument.count("push_messages")
+                instrument.count("push_bytes", len(body))
+                return
+            except DeliveryError as e:
+                error = e
+            except Exception as e:  # 连接失败、超时等网络错误
+                error = DeliveryError(f"{type(e).__name__}: {e}")
+            if not error.retryable or attempt >= self.max_retries:
+                raise error
+            instrument.count("push_retries")
+            delay = self.base_delay * (2 ** attempt) * (0.5 + random.random())
+            print(f"[WARN] 推送到 {mask_webhook(webhook)} 失败（{error}），{delay:.2f}秒后进行第{attempt + 1}次重试")
+            time.sleep(delay)
+            attempt += 1
+
+    def deliver(self, webhook, payloads, fallback=None):
+        """
+        按顺序发送 payloads，返回 (是否全部发送成功, 重试后仍未发送、可以稍后补发的部分)。
+
+        某个 payload 被飞书明确拒绝时改为发送 fallback（如简单文本消息），被拒绝的内容不再补发。
+        """
+        for index, payload in enumerate(payloads):
+            if index:
+                time.sleep(self.send_interval)
+            try:
+                self.post(webhook, payload)
+            except ImportError as e:
+                print(f"[ERROR] 导入 requests 失败: {e}，请安装: pip install requests")
+                return False, payloads[index:]
+            except DeliveryError as e:
+                if not e.retryable and fallback is not None:
+                    print(f"[WARN] 消息被飞书拒绝（{e}），改为发送简单文本消息")
+                    return self.deliver(webhook, [fallback])
+                print(f"[ERROR] 推送到 {mask_webhook(webhook)} 失败: {e}")
+                return False, payloads[index:] if e.retryable else []
+        print(f"[INFO] 成功推送 {len(payloads)} 条消息到 {mask_webhook(webhook)}")
+        return True, []
+
+    def send(self, webhook, payloads, fallback=None):
+        """发送一组 payload，返回是否全部发送成功；重试后仍未发送的部分写入发件箱"""
+        ok, remaining = self.deliver(webhook, payloads, fallback)
+        if remaining and self.outbox_dir:
+            self.spool(webhook, remaining, fallback)
+        return ok
+
+    def send_all(self, webhooks, payloads, fallback=None):
+        """并发推送到多个 Webhook，返回发送成功的 Webhook 数量"""
+        if len(webhooks) == 1:
+            return int(self.send(webhooks[0], payloads, fallback))
+        with ThreadPoolExecutor(max_workers=min(len(webhooks), self.max_workers)) as executor:
+            return sum(executor.map(lambda webhook: self.send(webhook, payloads, fallback), webhooks))
+
+    def write_message(self, path, webhook, created, payloads, fallback):
+        """先写临时文件再重命名；文件包含 Webhook 地址，只允许当前用户读写"""
+        with os.fdopen(os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump({"webhook": webhook, "created": created.strftime(OUTBOX_TIME_FORMAT),
+                       "payloads": payloads, "fallback": fallback}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def spool(self, webhook, payloads, fallback=None):
+        """将未发送的消息写入发件箱，文件名以写入时间（精确到微秒，同一秒内写入的消息也按顺序）开头，补发时按写入顺序发送"""
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        now = datetime.datetime.now()
+        name = f"{now.strftime(OUTBOX_TIME_FORMAT)}{now.microsecond:06d}-{hashlib.sha1(webhook.encode()).hexdigest()[:8]}-{os.urandom(4).hex()}.json"
+        path = os.path.join(self.outbox_dir, name)
+        self.write_message(path, webhook, now, payloads, fallback)
+        print(f"[INFO] 已将 {len(payloads)} 条未发送的消息写入发件箱 {path}，下次运行时补发")
+
+    def flush_outbox(self):
+        """
+        按写入顺序补发发件箱中的消息：发送成功或过期的消息从发件箱删除，部分发送的只保留未发送的部分。
+
+        某个 Webhook 补发失败后，它在发件箱中后面的消息本次不再尝试，保持消息顺序。
+        无法解析的文件（写到一半、被手工改坏）重命名为 .bad 移出发件箱，不影响其他消息的补发。
+        """
+        if not self.outbox_dir or not os.path.isdir(self.outbox_dir):
+            return
+        names = sorted(name for name in os.listdir(self.outbox_dir) if name.endswith(".json"))
+        if names:
+            print(f"[INFO] 发件箱中有 {len(names)} 条待补发的消息")
+        failed_webhooks = set()
+        for name in names:
+            path = os.path.join(self.outbox_dir, name)
+            try:
+                with open(path) as f:
+                    message = json.load(f)
+                webhook = message["webhook"]
+                created = datetime.datetime.strptime(message["created"], OUTBOX_TIME_FORMAT)
+                payloads, fallback = message["payloads"], message["fallback"]
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[WARN] 发件箱中的消息 {name} 无法解析（{type(e).__name__}: {e}），已移到 {name}.bad")
+                os.replace(path, path + ".bad")
+                continue
+            if webhook in failed_webhooks:
+                continue
+            if datetime.datetime.now() - created > OUTBOX_MAX_AGE:
+                print(f"[WARN] 发件箱中的消息 {name} 已超过 {OUTBOX_MAX_AGE.days} 天，不再补发")
+                os.remove(path)
+                continue
+            _, remaining = self.deliver(webhook, payloads, fallback)
+            if remaining:
+                print(f"[WARN] 补发 {name} 失败，{len(remaining)} 条消息保留在发件箱中")
+                self.write_message(path, webhook, created, remaining, fallback)
+                failed_webhooks.add(webhook)
+            else:
+                os.remove(path)
+
+
+def client_from_config(config):
+    return FeishuClient(timeout=(option(config, "FEISHU_CONNECT_TIMEOUT"), option(config, "FEISHU_READ_TIMEOUT")),
+                        max_retries=option(config, "FEISHU_MAX_RETRIES"), outbox_dir=option(config, "OUTBOX_DIR"),
+                        send_interval=option(config, "FEISHU_SEND_INTERVAL"))
@@ -0,0 +1,225 @@
+# slow_sql/fetcher.py
+# 并发分页拉取阿里云 RDS 慢日志（DescribeSlowLogRecords / DescribeSlowLogs）
+
+import datetime
+import json
+import math
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from slow_sql import instrument
+
+PAGE_SIZE = 100  # 每页记录数，阿里云 API 上限为 100
+
+# API 返回的时间字段可能出现的格式
+API_TIME_FORMATS = ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%dT%H:%MZ", "%Y-%m-%dZ", "%Y-%m-%d")
+
+
+def is_throttling_error(e):
+    """判断异常是否为阿里云 OpenAPI 流控错误"""
+    code = e.get_error_code() if hasattr(e, "get_error_code") else ""
+    return bool(code) and (code.startswith("Throttling") or code == "ServiceUnavailable")
+
+
+def call_with_retry(client, request, max_retries=5, base_delay=0.5, limiter=None):
+    """
+    发送请求，遇到流控时重试。
+
+    limiter 为多个拉取任务共享的 ratelimit.RateLimiter，只在请求期间占用并发名额，等待时释放。
+    传入 limiter 时流控由它统一处理：降低共享的请求速率，所有线程一起暂停后从这一页继续，
+    不限重试次数，持续被限流超过 limiter.timeout 秒才抛出异常；未传入时按指数退避（带随机抖动）最多重试 max_retries 次。
+    请求耗时（不含等待 limiter 和退避的时间）计入阶段 api，重试次数计入 api_retries（见 instrument.py）。
+    """
+    attempt = 0
+    throttled_since = None
+    while True:
+        try:
+            if limiter is None:
+                with instrument.stage("api"):
+                    return client.do_action_with_exception(request)
+            with limiter:
+                with instrument.stage("api"):
+                    response = client.do_action_with_exception(request)
+            limiter.succeeded()
+            return response
+        except Exception as e:
+            if not is_throttling_error(e):
+                raise
+            instrument.count("api_retries")
+            if limiter is not None:
+                now = time.monotonic()
+                throttled_since = throttled_since or now
+                if now - throttled_since > limiter.timeout:
+                    raise
+                pause = limiter.throttled()
+                if pause is not None:
+                    print(f"[WARN] 请求被限流({e.get_error_code()})，{limiter.describe()}，暂停{pause:.1f}秒后从当前分页继续")
+                continue
+            if attempt >= max_retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            print(f"[WARN] 请求被限流({e.get_error_code()})，{delay:.2f}秒后进行第{attempt + 1}次重试")
+            time.sleep(delay)
+            attempt += 1
+
+
+def utc_now():
+    """当前的 UTC 时间（不带时区），与 API 的时间参数（以 Z 结尾）和 ExecutionStartTime 一致"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def parse_api_time(value):
+    """解析 API 返回的时间字符串，无法解析时返回 None"""
+    # 常见的 ISO 格式先用 fromisoformat 解析（比逐个尝试 strptime 快一个数量级），带时区偏移的仍按原格式处理
+    try:
+        ts = datetime.datetime.fromisoformat(value[:-1] if value.endswith("Z") else value)
+        if ts.tzinfo is None:
+            return ts
+    except (AttributeError, TypeError, ValueError):
+        pass
+    for fmt in API_TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def field_value(record, name):
+    """读取记录的字段：记录可能是 API 返回的字典，也可能是 decoding 解析出的 SlowRecord"""
+    return record.get(name) if isinstance(record, dict) else getattr(record, name, None)
+
+
+def split_window(start, end, min_window):
+    """按 min_window 粒度返回时间窗口的中点，窗口已无法再拆分时返回 None"""
+    units = (end - start) // min_window
+    if units < 2:
+        return None
+    return start + (units // 2) * min_window
+
+
+def last_days(days=7, now=None):
+    """
+    返回最近 days 天的 (start_time, end_time, window_start, window_end)。
+
+    start_time / end_time 用于报告标题；window_start / window_end 按天对齐，作为实际查询的时间窗口。
+    """
+    end_time = now or datetime.datetime.now()
+    start_time = end_time - datetime.timedelta(days=days)
+    window_start = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    window_end = end_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start_time, end_time, window_start, window_end
+
+
+def new_coverage():
+    """记录拉取过程中的数据覆盖情况：API 报告的总记录数、最终时间窗口数以及仍被截断的窗口"""
+    return {"total_records": 0, "windows": 0, "truncated": []}
+
+
+def iter_pages(client, build_request, items_key, start_time, end_time, time_format,
+               min_window, time_field, coverage, page_size=PAGE_SIZE, max_pages=50, workers=4,
+               limiter=None, label="", decode_page=None):
+    """
+    按时间窗口拉取全部记录，每拉取完一页就 yield ((窗口开始时间, 页码), 记录列表)。
+
+    build_request(start_str, end_str, page_number) 需返回一个新的请求对象（请求对象不是线程安全的）。
+    每个窗口先请求第1页拿到 TotalRecordCount：超过 max_pages 页能返回的上限时将窗口二分，
+    否则并发请求剩余分页。所有窗口和分页共用一个线程池，同时在途的请求不超过 workers 的两倍，
+    避免消费方处理较慢时已完成的分页在内存中堆积。
+    相邻窗口在边界上可能返回同一条记录，按 time_field 将记录只归属到一个窗口以去重。
+    拉取结束后 coverage 中记录总数、窗口数以及仍被截断的窗口。
+    多个实例同时拉取时传入共享的 limiter 限制全局请求速率和并发请求数，label 用于日志中区分实例。
+    decode_page(body) 返回 (TotalRecordCount, 记录列表)，见 decoding.load_decoder；未传入时用标准库 json 解析为字典。
+    """
+    capacity = page_size * max_pages
+    max_in_flight = max(1, workers) * 2
+
+    def owned(record, window):
+        # 边界上的记录只保留在时间较晚的窗口中；首尾窗口不做限制
+        ts = parse_api_time(field_value(record, time_field))
+        if ts is None:
+            return True
+        window_start, window_end = window
+        if ts < window_start and window_start != start_time:
+            return False
+        if ts >= window_end and window_end != end_time:
+            return False
+        return True
+
+    def fetch_page(window, page_number):
+        window_start, window_end = window
+        request = build_request(window_start.strftime(time_format), window_end.strftime(time_format), page_number)
+        body = call_with_retry(client, request, limiter=limiter)
+        with instrument.stage("decode"):
+            if decode_page is None:
+                result = json.loads(body)
+                total, records = result.get("TotalRecordCount", 0), result.get("Items", {}).get(items_key, [])
+            else:
+                total, records = decode_page(body)
+        instrument.count("api_pages")
+        instrument.count("api_bytes", len(body))
+        instrument.count("api_records", len(records))
+        print(f"[INFO] {label}成功获取 {window_start} ~ {window_end} 第{page_number}页，当前页记录数: {len(records)}")
+        return window, page_number, total, records
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        queued = deque([((start_time, end_time), 1)])
+        pending = set()
+        while queued or pending:
+            while queued and len(pending) < max_in_flight:
+                pending.add(executor.submit(fetch_page, *queued.popleft()))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window, page_number, total, records = future.result()
+                if page_number == 1:
+                    window_start, window_end = window
+                    mid = split_window(window_start, window_end, min_window)
+                    if total > capacity and mid is not None:
+                        print(f"[INFO] {label}时间窗口 {window_start} ~ {window_end} 共 {total} 条记录，超过单次分页上限 {capacity} 条，拆分为两个子窗口")
+                        queued.append(((window_start, mid), 1))
+                        queued.append(((mid, window_end), 1))
+                        continue
+
+                    coverage["windows"] += 1
+                    coverage["total_records"] += total
+                    if total > capacity:
+                        coverage["truncated"].append(window)
+                        print(f"[WARN] {label}时间窗口 {window_start} ~ {window_end} 已无法再拆分，仅能获取 {capacity}/{total} 条记录")
+                    page_count = min(int(math.ceil(total / float(page_size))), max_pages)
+                    queued.extend((window, n) for n in range(2, page_count + 1))
+
+                page_records = [record for record in records if owned(record, window)]
+                if page_records:
+                    yield (window[0], page_number), page_records
+
+
+def fetch_records(client, build_request, items_key, start_time, end_time, time_format,
+                  min_window, time_field, page_size=PAGE_SIZE, max_pages=50, workers=4,
+                  limiter=None, label=""):
+    """
+    拉取全部记录并按 (窗口, 页码) 顺序拼接，参数同 iter_pages。
+
+    返回 (pages, coverage)，pages 为每页记录列表。
+    """
+    coverage = new_coverage()
+    results = dict(iter_pages(client, build_request, items_key, start_time, end_time, time_format,
+                              min_window, time_field, coverage, page_size=page_size,
+                              max_pages=max_pages, workers=workers, limiter=limiter, label=label))
+    pages = [results[key] for key in sorted(results)]
+    return pages, coverage
+
+
+def merge_coverage(target, source):
+    target["total_records"] += source["total_records"]
+    target["windows"] += source["windows"]
+    target["truncated"].extend(source["truncated"])
+
+
+def describe_coverage(coverage):
+    """生成数据覆盖情况的说明文字"""
+    if not coverage["truncated"]:
+        return f"数据覆盖完整（共 {coverage['windows']} 个时间窗口）"
+    return (f"数据不完整：{len(coverage['truncated'])} 个时间窗口超过分页上限且无法再拆分，"
+            f"部分记录未获取")
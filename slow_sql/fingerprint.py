@@ -0,0 +1,64 @@
+# slow_sql/fingerprint.py
+# SQL 指纹：参考 pt-query-digest，将只在字面量、IN 列表长度、注释或空白上不同的语句归为同一类
+
+import hashlib
+import re
+from functools import lru_cache
+
+# 字符串、十六进制、数字（含小数和科学计数法）字面量。正则以一个字符集开头（[0-9'"] 这样的显式字符集，
+# 而不是先行断言或 \d），不可能是字面量的位置扫描最快；各分支再用后行断言按已匹配的第一个字符区分，
+# 数字分支的 (?<!\w[0-9]) 相当于开头的 \b。只识别 ASCII 数字，与 MySQL 的数字字面量一致
+SINGLE_QUOTED_REST = r"(?<=')[^'\\]*(?:(?:\\.|'')[^'\\]*)*'"
+DOUBLE_QUOTED_REST = r'(?<=")[^"\\]*(?:(?:\\.|"")[^"\\]*)*"'
+NUMBER_REST = r"(?<=[0-9])(?<!\w[0-9])(?:(?<=0)x[0-9a-fA-F]+|[0-9]*(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)\b"
+LITERAL_PATTERN = f"{SINGLE_QUOTED_REST}|{DOUBLE_QUOTED_REST}|{NUMBER_REST}"
+# 一次扫描把字面量全部替换为 ?
+LITERAL_RE = re.compile(rf"""[0-9'"](?:{LITERAL_PATTERN})""")
+# 含注释符号的语句：字面量和注释在同一次扫描中匹配，字符串中的 #、-- 随字符串一起替换为 ?，不会被当作注释。
+# 与 MySQL 一样，-- 后面必须是空白或行尾才是注释（a--1 是减去负数）
+LITERAL_OR_COMMENT_RE = re.compile(
+    rf"""['"/#0-9-](?:{LITERAL_PATTERN}|((?<=/)\*.*?\*/|(?<=-)-(?=\s|$)[^\n]*|(?<=#)[^\n]*))""", re.S)
+# 运算符和括号两侧的空白不影响语义；空白已压缩为单个空格，用 str.replace 比正则快得多
+PUNCTUATION_SPACES = tuple((" " + char, char) for char in "=<>!,()") + tuple((char + " ", char) for char in "=<>!,(")
+# 替换字面量后的 IN 列表和 INSERT 的多行 VALUES。VALUES 列表前面是空格（表名或列名列表之后），
+# 只匹配逗号分隔的各行（允许一层括号，如 now()），后面的 ON DUPLICATE KEY UPDATE 保留；
+# 更新子句中的 values(列) 函数前面是 = 或 ,，不会被替换
+ROW_PATTERN = r"\((?:[^()]|\([^()]*\))*\)"
+IN_LIST_RE = re.compile(r"\bin\(\?(?:,\?)*\)")
+VALUES_RE = re.compile(rf"(?<= )values{ROW_PATTERN}(?:,{ROW_PATTERN})*")
+
+FINGERPRINT_CACHE_SIZE = 100000
+
+
+def replace_token(match):
+    """LITERAL_OR_COMMENT_RE 的替换：注释替换为空格，字面量替换为 ?"""
+    return " " if match.group(1) is not None else "?"
+
+
+def normalize(sql):
+    """返回归一化后的 SQL（不缓存）"""
+    if "/*" in sql or "--" in sql or "#" in sql:
+        sql = LITERAL_OR_COMMENT_RE.sub(replace_token, sql)
+    else:
+        sql = LITERAL_RE.sub("?", sql)
+    sql = " ".join(sql.lower().split())
+    for old, new in PUNCTUATION_SPACES:
+        if old in sql:
+            sql = sql.replace(old, new)
+    if "in(" in sql:
+        sql = IN_LIST_RE.sub("in(?+)", sql)
+    if "values" in sql:
+        sql = VALUES_RE.sub("values(?+)", sql)
+    return sql
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def fingerprint(sql):
+    """返回归一化后的 SQL，相同文本直接命中缓存"""
+    return normalize(sql)
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def fingerprint_key(sql):
+    """指纹的短摘要，用作没有 SQLHash 的记录的聚合键；单独缓存，不经过 fingerprint 的缓存"""
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:10]
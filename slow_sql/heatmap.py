@@ -0,0 +1,76 @@
+# slow_sql/heatmap.py
+# 慢查询的时段分布：按 ExecutionStartTime 把执行次数累计到一周 168 个小时桶（星期 × 小时）的整数数组中，
+# 用于发现集中在批处理任务或业务高峰时段的慢查询
+
+import csv
+from array import array
+
+from slow_sql.fetcher import parse_api_time
+
+HOURS_PER_WEEK = 7 * 24
+WEEKDAYS = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+# 热力图单元格的深浅：没有执行为第一个字符，其余按占最大单元格的比例取后四级
+SHADES = "·░▒▓█"
+# 导出 CSV 的列：每个对象7行（星期一到星期日），每行24个小时
+CSV_COLUMNS = ("scope", "name", "sql", "weekday") + tuple(f"h{hour:02d}" for hour in range(24))
+
+
+def new_heat():
+    """168 个小时桶的执行次数，桶编号 = 星期（星期一为0） * 24 + 小时（UTC）"""
+    return array("q", [0]) * HOURS_PER_WEEK
+
+
+def week_hour(start_time):
+    """ExecutionStartTime（UTC）所在的小时桶编号，无法解析时返回 -1"""
+    ts = parse_api_time(start_time)
+    return -1 if ts is None else ts.weekday() * 24 + ts.hour
+
+
+def add_heat(target, source):
+    """将 source 的各桶累加到 target"""
+    for bucket, count in enumerate(source):
+        if count:
+            target[bucket] += count
+
+
+def local_heat(heat, utc_offset):
+    """把 UTC 的小时桶换算到 UTC+utc_offset（整小时），返回列表；跨过周日24时的部分回到周一"""
+    shift = utc_offset % HOURS_PER_WEEK
+    heat = list(heat)
+    return heat[HOURS_PER_WEEK - shift:] + heat[:HOURS_PER_WEEK - shift]
+
+
+def peak_hour(heat):
+    """执行次数最多的桶，返回 (星期名称, 小时, 执行次数)"""
+    bucket = max(range(HOURS_PER_WEEK), key=heat.__getitem__)
+    return WEEKDAYS[bucket // 24], bucket % 24, heat[bucket]
+
+
+def hour_totals(heat):
+    """按小时合计一周7天的执行次数，返回24个值"""
+    return [sum(heat[hour::24]) for hour in range(24)]
+
+
+def shade_line(values, maximum):
+    """一行单元格：每个值按占 maximum 的比例取 SHADES 中的字符"""
+    levels = len(SHADES) - 1
+    return "".join(SHADES[-(-value * levels // maximum)] if value > 0 else SHADES[0] for value in values)
+
+
+def heat_coverage(heat, count):
+    """时段分布覆盖的执行次数占总执行次数的比例（只为部分SQL保留时段分布，淘汰后重新统计的行小于1）"""
+    return sum(heat) / count if count else 0.0
+
+
+def write_heatmap_csv(path, heatmaps, utc_offset):
+    """
+    将时段分布写入 CSV：heatmaps 为 [(scope, name, sql, heat), ...]，heat 为 UTC 的小时桶，
+    按 UTC+utc_offset 换算后每个对象写7行（weekday 1-7 为星期一到星期日），h00-h23 为各小时的执行次数
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for scope, name, sql, heat in heatmaps:
+            heat = local_heat(heat, utc_offset)
+            for day in range(7):
+                writer.writerow([scope, name, sql, day + 1] + heat[day * 24:(day + 1) * 24])
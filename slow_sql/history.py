@@ -0,0 +1,199 @@
+# slow_sql/history.py
+# 按周保存每条SQL的聚合结果，并与前几周对比找出新增、变慢和好转的SQL
+
+import datetime
+
+from slow_sql.aggregator import score_summary
+
+# 每周每条SQL一行，主键 (sql_key, week) 使按SQL查询历史只需一次索引查找；
+# SQL文本每个键只存一份
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weekly_aggregates (
+    sql_key TEXT NOT NULL,
+    week TEXT NOT NULL,
+    count INTEGER,
+    total_time REAL,
+    max_time REAL,
+    total_scanned_rows INTEGER,
+    p99_time REAL,
+    p99_scanned_rows REAL,
+    score REAL,
+    PRIMARY KEY (sql_key, week)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_weekly_aggregates_score ON weekly_aggregates (week, score);
+CREATE TABLE IF NOT EXISTS sql_texts (
+    sql_key TEXT PRIMARY KEY,
+    sql_text TEXT,
+    db_name TEXT
+) WITHOUT ROWID;
+"""
+
+HISTORY_COLUMNS = ("count", "total_time", "max_time", "total_scanned_rows", "p99_time", "p99_scanned_rows", "score")
+
+# 单条 SQL 语句中 IN (...) 的参数个数上限以内分批查询
+LOOKUP_BATCH = 500
+
+
+def init_history(conn):
+    conn.executescript(HISTORY_SCHEMA)
+    return conn
+
+
+def week_key(week_start):
+    """周的标识为报告时间范围的起始日期，字符串比较即时间比较"""
+    return week_start.strftime("%Y-%m-%d")
+
+
+def save_week(conn, week, summary, formula=None):
+    """保存本周全部SQL的聚合结果（评分按 formula 计算，见 aggregator.score_summary）；同一周重复运行时覆盖之前的结果"""
+    scores = score_summary(summary, formula)
+
+    def rows():
+        for row, key in enumerate(summary.keys):
+            yield (key, week, summary.count[row], summary.total_time[row], summary.max_time[row],
+                   summary.total_scanned_rows[row],
+                   min(summary.time_sketch[row].quantile(0.99), summary.max_time[row]),
+                   summary.scan_sketch[row].quantile(0.99), float(scores[row]))
+
+    conn.execute("DELETE FROM weekly_aggregates WHERE week = ?", (week,))
+    conn.executemany(f"INSERT INTO weekly_aggregates (sql_key, week, {', '.join(HISTORY_COLUMNS)}) "
+                     f"VALUES ({', '.join('?' for _ in range(len(HISTORY_COLUMNS) + 2))})", rows())
+    conn.executemany("INSERT OR IGNORE INTO sql_texts (sql_key, sql_text, db_name) VALUES (?, ?, ?)",
+                     zip(summary.keys, summary.sql, summary.db_name))
+    conn.commit()
+
+
+def baseline_range(week, weeks):
+    """返回对比基线的周范围 [first_week, week)"""
+    first = datetime.datetime.strptime(week, "%Y-%m-%d") - datetime.timedelta(weeks=weeks)
+    return week_key(first), week
+
+
+def load_baselines(conn, keys, week, weeks=4):
+    """
+    读取 keys 在本周之前 weeks 周内的历史，返回 {sql_key: 基线}。
+
+    基线中执行次数和 P99 取各周的平均值，平均耗时和平均扫描行数按执行次数加权。
+    """
+    first_week, last_week = baseline_range(week, weeks)
+    keys = list(keys)
+    totals = {}
+    for i in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[i:i + LOOKUP_BATCH]
+        cursor = conn.execute(
+            f"SELECT sql_key, {', '.join(HISTORY_COLUMNS)} FROM weekly_aggregates "
+            f"WHERE sql_key IN ({', '.join('?' for _ in batch)}) AND week >= ? AND week < ?",
+            batch + [first_week, last_week])
+        for key, count, total_time, max_time, scanned, p99_time, p99_scanned, _ in cursor:
+            total = totals.setdefault(key, {"weeks": 0, "count": 0, "total_time": 0.0, "max_time": 0.0,
+                                            "total_scanned_rows": 0, "p99_time": 0.0, "p99_scanned_rows": 0.0})
+            total["weeks"] += 1
+            total["count"] += count
+            total["total_time"] += total_time
+            total["max_time"] = max(total["max_time"], max_time)
+            total["total_scanned_rows"] += scanned
+            total["p99_time"] += p99_time
+            total["p99_scanned_rows"] += p99_scanned
+    return {key: {
+        "weeks": total["weeks"],
+        "count": total["count"] / total["weeks"],
+        "avg_time": total["total_time"] / max(total["count"], 1),
+        "p99_time": total["p99_time"] / total["weeks"],
+        "avg_scanned_rows": total["total_scanned_rows"] / max(total["count"], 1),
+        "p99_scanned_rows": total["p99_scanned_rows"] / total["weeks"],
+    } for key, total in totals.items()}
+
+
+def previous_top_keys(conn, week, weeks=4, limit=200):
+    """前几周中评分最高的SQL键（按周和评分的索引读取，不扫描全表）"""
+    first_week, last_week = baseline_range(week, weeks)
+    weeks_present = [row[0] for row in conn.execute(
+        "SELECT DISTINCT week FROM weekly_aggregates WHERE week >= ? AND week < ?", (first_week, last_week))]
+    keys = []
+    for previous_week in weeks_present:
+        keys.extend(row[0] for row in conn.execute(
+            "SELECT sql_key FROM weekly_aggregates WHERE week = ? ORDER BY score DESC LIMIT ?",
+            (previous_week, limit)))
+    return list(dict.fromkeys(keys))
+
+
+def load_sql_texts(conn, keys):
+    """返回 {sql_key: (sql_text, db_name)}"""
+    keys = list(keys)
+    texts = {}
+    for i in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[i:i + LOOKUP_BATCH]
+        texts.update((key, (sql_text, db_name)) for key, sql_text, db_name in conn.execute(
+            f"SELECT sql_key, sql_text, db_name FROM sql_texts WHERE sql_key IN ({', '.join('?' for _ in batch)})",
+            batch))
+    return texts
+
+
+def current_metrics(item):
+    count = max(item["count"], 1)
+    return {
+        "count": item["count"],
+        "avg_time": item["total_time"] / count,
+        "p99_time": item["p99_time"],
+        "avg_scanned_rows": item["total_scanned_rows"] / count,
+        "p99_scanned_rows": item["p99_scanned_rows"],
+    }
+
+
+def change_ratio(current, baseline, field):
+    """当前值相对基线的倍数，基线为 0 时当前值为正则视为无穷大"""
+    if baseline[field] > 0:
+        return current[field] / baseline[field]
+    return float("inf") if current[field] > 0 else 1.0
+
+
+def is_improved(current, baseline, ratio):
+    return all(change_ratio(current, baseline, field) <= 1 / ratio for field in ("avg_time", "p99_time"))
+
+
+def compare_weeks(conn, summary, top_items, week, weeks=4, ratio=1.5):
+    """
+    将本周 Top SQL 与前 weeks 周的基线对比，返回 {"new": [...], "regressed": [...], "improved": [...]}。
+
+    - new：Top SQL 中基线期内没有出现过的
+    - regressed：平均耗时或 P99 耗时或平均扫描行数达到基线的 ratio 倍
+    - improved：本周或基线期内排名靠前、平均耗时和 P99 耗时都降到基线的 1/ratio 以下（或本周未出现）的
+    每一项为 {"key", "sql", "db_name", "current", "baseline"}，current / baseline 为 current_metrics 的结构，
+    本周未出现时 current 为 None。
+    """
+    top_keys = [item["key"] for item in top_items]
+    previous_keys = previous_top_keys(conn, week, weeks)
+    baselines = load_baselines(conn, set(top_keys) | set(previous_keys), week, weeks)
+    result = {"new": [], "regressed": [], "improved": []}
+
+    top_set = set()
+    for key, item in zip(top_keys, top_items):
+        top_set.add(key)
+        current = current_metrics(item)
+        entry = {"key": key, "sql": item["sql"], "db_name": item["db_name"],
+                 "current": current, "baseline": baselines.get(key)}
+        if key not in baselines:
+            result["new"].append(entry)
+        elif any(change_ratio(current, baselines[key], field) >= ratio
+                 for field in ("avg_time", "p99_time", "avg_scanned_rows")):
+            result["regressed"].append(entry)
+        elif is_improved(current, baselines[key], ratio):
+            result["improved"].append(entry)
+
+    texts = load_sql_texts(conn, [key for key in previous_keys if key not in summary.index])
+    for key in previous_keys:
+        if key in top_set or key not in baselines:
+            continue
+        row = summary.index.get(key)
+        if row is None:
+            sql, db_name = texts.get(key, ("", ""))
+            current = None
+        else:
+            item = summary.item(row)
+            sql, db_name = item["sql"], item["db_name"]
+            current = current_metrics(item)
+            if not is_improved(current, baselines[key], ratio):
+                continue
+        result["improved"].append({"key": key, "sql": sql, "db_name": db_name,
+                                   "current": current, "baseline": baselines[key]})
+    return result
@@ -0,0 +1,241 @@
+# slow_sql/instrument.py
+# 运行指标：各阶段的累计耗时、计数（分页、记录、重试、下载字节数）和峰值内存。
+# 运行结束时在控制台输出摘要，并按配置追加到 JSON lines 日志、写入 Prometheus textfile（node_exporter 的 textfile collector）
+
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+from slow_sql.settings import option
+
+
+def peak_rss():
+    """进程的峰值常驻内存（字节，一次 getrusage 系统调用），无法获取时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的单位为 KB，macOS 为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage(object):
+    """阶段计时的上下文管理器，退出时将耗时累计到 metrics（比 contextlib.contextmanager 的生成器开销小）"""
+
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+
+
+class RunMetrics(object):
+    """
+    一次运行（常驻模式为一轮）的指标。
+
+    stages 为 {阶段: [累计秒数, 次数, 阶段结束时的峰值内存]}：拉取线程中的阶段（api、decode）在多个线程中同时进行，
+    累计耗时可能超过运行时间。counters 为 {名称: 累计值}。
+    只在分页、批次等粒度计时和计数，不在逐条记录的循环中调用，关闭性能分析时的开销可以忽略。
+    """
+
+    def __init__(self, command=""):
+        self.command = command
+        self.started_at = datetime.datetime.now()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def add_time(self, name, seconds):
+        peak = peak_rss()
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = [seconds, 1, peak]
+            else:
+                stage[0] += seconds
+                stage[1] += 1
+                if peak is not None and (stage[2] is None or peak > stage[2]):
+                    stage[2] = peak
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def events(self):
+        """JSON lines 的各行：每个阶段一行，最后一行为整次运行的耗时、峰值内存和计数"""
+        common = {"time": self.started_at.isoformat(timespec="seconds"), "command": self.command}
+        lines = [dict(common, event="stage", stage=name, seconds=round(seconds, 6), calls=calls, peak_rss_bytes=peak)
+                 for name, (seconds, calls, peak) in self.stages.items()]
+        lines.append(dict(common, event="run", seconds=round(self.elapsed(), 6), peak_rss_bytes=peak_rss(),
+                          counters=dict(self.counters)))
+        return lines
+
+    def describe(self):
+        """控制台输出的摘要"""
+        stages = "，".join(f"{name} {seconds:.2f}s/{calls}次" for name, (seconds, calls, _) in self.stages.items())
+        counters = "，".join(f"{name} {value}" for name, value in self.counters.items())
+        text = f"总耗时 {self.elapsed():.1f}s"
+        peak = peak_rss()
+        if peak is not None:
+            text += f"，峰值内存 {peak / 1024 / 1024:.0f}MB"
+        if stages:
+            text += f"；各阶段累计: {stages}"
+        if counters:
+            text += f"；计数: {counters}"
+        return text
+
+    def prometheus_text(self):
+        """Prometheus 文本格式（node_exporter textfile collector），所有指标带 command 标签"""
+        command = self.command.replace("\\", "\\\\").replace('"', '\\"')
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP slow_sql_{name} {help_text}")
+            lines.append(f"# TYPE slow_sql_{name} gauge")
+            for labels, value in samples:
+                label_text = "".join(f',{key}="{label}"' for key, label in labels)
+                lines.append(f'slow_sql_{name}{{command="{command}"{label_text}}} {value}')
+
+        metric("run_seconds", "Wall time of the last run.", [((), round(self.elapsed(), 6))])
+        metric("last_run_timestamp_seconds", "Start time of the last run.", [((), int(self.started_at.timestamp()))])
+        peak = peak_rss()
+        if peak is not None:
+            metric("peak_rss_bytes", "Peak resident memory of the last run.", [((), peak)])
+        metric("stage_seconds", "Cumulative time spent in each stage.",
+               [((("stage", name),), round(seconds, 6)) for name, (seconds, _, _) in self.stages.items()])
+        metric("stage_calls", "Number of times each stage ran.",
+               [((("stage", name),), calls) for name, (_, calls, _) in self.stages.items()])
+        metric("count", "Counters of the last run (pages, records, retries, bytes).",
+               [((("name", name),), value) for name, value in self.counters.items()])
+        return "\n".join(lines) + "\n"
+
+
+# Python 3.12 起 cProfile 基于 sys.monitoring，同一时间只能启用一个 Profile，--profile 只统计主线程
+PROFILE_THREADS = sys.version_info < (3, 12)
+
+# 当前运行的指标，由 start_run 替换；未调用 start_run 时（如在基准测试中直接调用各模块）指标累计到这个默认对象
+metrics = RunMetrics()
+
+
+def start_run(command):
+    """开始记录一次运行的指标"""
+    global metrics
+    metrics = RunMetrics(command)
+    return metrics
+
+
+def stage(name):
+    """当前运行中阶段 name 的计时器：with stage("aggregate"): ..."""
+    return Stage(metrics, name)
+
+
+def count(name, value=1):
+    metrics.count(name, value)
+
+
+def timed(name, iterable):
+    """迭代 iterable，把取得每一项的耗时累计到阶段 name（用于读取本地存储、导出文件等生成器）"""
+    iterator = iter(iterable)
+    while True:
+        with Stage(metrics, name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def write_json_lines(path, run_metrics):
+    """将各阶段和整次运行的指标追加到 JSON lines 文件"""
+    with open(path, "a", encoding="utf-8") as f:
+        for event in run_metrics.events():
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def write_prometheus(path, run_metrics):
+    """先写临时文件再重命名，node_exporter 不会读到写了一半的文件"""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(run_metrics.prometheus_text())
+    os.replace(path + ".tmp", path)
+
+
+def finish_run(config, run_metrics=None):
+    """输出当前运行的指标摘要，并按 METRICS_LOG / METRICS_TEXTFILE 写入文件；没有记录任何阶段时不输出"""
+    run_metrics = run_metrics or metrics
+    if not run_metrics.stages:
+        return
+    print(f"[INFO] 运行指标: {run_metrics.describe()}")
+    log_path = option(config, "METRICS_LOG")
+    textfile = option(config, "METRICS_TEXTFILE")
+    try:
+        if log_path:
+            write_json_lines(log_path, run_metrics)
+        if textfile:
+            write_prometheus(textfile.format(command=run_metrics.command), run_metrics)
+    except OSError as e:
+        print(f"[WARN] 写入运行指标失败: {e}")
+
+
+def run_profiled(func, path, limit=25):
+    """
+    在 cProfile 下运行 func()，将结果写入 path（pstats 格式）并输出累计耗时最高的 limit 个函数。
+
+    拉取和聚合在线程池中进行：PROFILE_THREADS 为 True 时运行期间新启动的线程各自创建一个 Profile，结束时与主线程的合并；
+    某个线程的 Profile 无法启用时该线程不统计，照常运行。聚合工作进程不在统计范围内。
+    """
+    import cProfile
+    import pstats
+
+    profilers = []
+
+    def profile_thread(frame, event, arg):
+        # 线程启动后第一次调用时换成这个线程自己的 Profile
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            print(f"[WARN] 无法统计线程 {threading.current_thread().name}: {e}")
+            return
+        with lock:
+            profilers.append(profiler)
+
+    lock = threading.Lock()
+    profiler = cProfile.Profile()
+    if PROFILE_THREADS:
+        threading.setprofile(profile_thread)
+    try:
+        return profiler.runcall(func)
+    finally:
+        threading.setprofile(None)
+        stats = pstats.Stats(profiler)
+        for thread_profiler in profilers:
+            try:
+                stats.add(thread_profiler)
+            except TypeError:  # 没有记录到任何调用的 Profile 不能转换为 Stats
+                pass
+        stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(limit)
+        scope = f"主线程和 {len(profilers)} 个工作线程" if PROFILE_THREADS else "只统计主线程"
+        print(f"[INFO] 性能分析结果已写入 {path}（{scope}），可用 python -m pstats {path} 查看")
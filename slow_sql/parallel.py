@@ -0,0 +1,130 @@
+# slow_sql/parallel.py
+# 多进程聚合：按 SQL 键将记录分片到多个工作进程，每个进程独立聚合自己的分片，结束时合并各分片的 summary
+
+import multiprocessing
+import queue
+import zlib
+
+from slow_sql import instrument
+from slow_sql.aggregator import aggregate_page, combine_summary, merge_stats, new_stats, new_summary
+from slow_sql.decoding import SlowRecord, record_tuple
+from slow_sql.fingerprint import fingerprint_key
+
+# 每个分片攒够这么多条记录再发送给工作进程，减少进程间通信的次数
+BATCH_SIZE = 2000
+# 每个工作进程最多排队的批次数：聚合跟不上拉取时发送方阻塞等待，内存占用有上限
+QUEUE_BATCHES = 4
+# 等待工作进程时检查它是否已异常退出的间隔（秒）
+POLL_INTERVAL = 1
+
+
+def shard_of(record, shards):
+    """
+    记录所在的分片：按聚合键（SQLHash，没有时为 SQL 指纹的摘要，与 aggregate_page 一致）的 crc32 取模。
+    str 的 hash() 在每个进程中加盐，不同运行的分片不同，这里用与进程无关的 crc32
+    """
+    sql = record.SQLText.strip()
+    key = record.SQLHash or (fingerprint_key(sql) if sql else "")
+    return zlib.crc32(key.encode()) % shards
+
+
+def shard_worker(tasks, results, rules):
+    """工作进程：按实例聚合收到的每批记录，收到 None 后返回 {实例ID: (summary, stats)}"""
+    partials = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        instance_id, rows = task
+        if instance_id not in partials:
+            partials[instance_id] = (new_summary(), new_stats())
+        summary, stats = partials[instance_id]
+        aggregate_page(summary, [SlowRecord._make(row) for row in rows], rules, stats)
+    results.put(partials)
+
+
+class ShardedAggregator(object):
+    """
+    在 processes 个工作进程中聚合慢查询记录，结果与单进程的 aggregate_page 一致。
+
+    记录按聚合键（SQLHash，没有时按 SQL 指纹，见 shard_of）分片：同一个键总是由同一个进程聚合，
+    各进程的 summary 中没有重复的 SQL 键，合并时只是拼接各分片的行。没有 SQLHash 的记录在分片时要在主进程中
+    计算一次指纹（有缓存，同一文本只算一次），工作进程中再计算一次。
+    结束时用满足结合律的 combine_summary 合并，结果与单进程一致。
+
+    多个实例的拉取线程可以同时调用 feed，共用同一组工作进程；finish 按实例返回聚合结果。
+    rules（见 rules.Rules）按原始规则传给工作进程，在每个进程中重新编译。
+    """
+
+    def __init__(self, processes, rules, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.score = rules.score
+        self.results = multiprocessing.Queue()
+        self.queues = [multiprocessing.Queue(QUEUE_BATCHES) for _ in range(processes)]
+        self.workers = [multiprocessing.Process(target=shard_worker, args=(tasks, self.results, rules),
+                                                daemon=True)
+                        for tasks in self.queues]
+        for worker in self.workers:
+            worker.start()
+
+    def check_workers(self):
+        for worker in self.workers:
+            if worker.exitcode not in (None, 0):
+                raise RuntimeError(f"聚合进程 {worker.pid} 异常退出（退出码 {worker.exitcode}）")
+
+    def put(self, shard, task):
+        """发送给工作进程，队列已满时等待；工作进程异常退出时抛出 RuntimeError，而不是一直阻塞"""
+        while True:
+            try:
+                self.queues[shard].put(task, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                self.check_workers()
+
+    def feed(self, instance_id, pages):
+        """将一个实例的所有分页（SlowRecord 列表）按 SQL 分片发送给工作进程"""
+        shards = len(self.queues)
+        buffers = [[] for _ in range(shards)]
+        for page_records in pages:
+            # 发送给工作进程的耗时包括队列已满时等待聚合的时间
+            with instrument.stage("shard_dispatch"):
+                for record in page_records:
+                    buffers[shard_of(record, shards)].append(record_tuple(record))
+                for shard, rows in enumerate(buffers):
+                    if len(rows) >= self.batch_size:
+                        self.put(shard, (instance_id, rows))
+                        buffers[shard] = []
+        for shard, rows in enumerate(buffers):
+            if rows:
+                self.put(shard, (instance_id, rows))
+
+    def finish(self):
+        """通知工作进程结束并合并各分片，返回 {实例ID: (summary, stats)}"""
+        for shard in range(len(self.queues)):
+            self.put(shard, None)
+        merged = {}
+        for _ in self.workers:
+            while True:
+                try:
+                    partials = self.results.get(timeout=POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    self.check_workers()
+            with instrument.stage("shard_merge"):
+                for instance_id, (summary, stats) in partials.items():
+                    if instance_id not in merged:
+                        merged[instance_id] = (summary, stats)
+                        continue
+                    combine_summary(merged[instance_id][0], summary, self.score)
+                    merge_stats(merged[instance_id][1], stats)
+        for worker in self.workers:
+            worker.join()
+        return merged
+
+    def close(self):
+        """结束仍在运行的工作进程；出错时丢弃队列中还未发出的批次，退出时不再等待已退出的工作进程读取"""
+        for tasks in self.queues:
+            tasks.cancel_join_thread()
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
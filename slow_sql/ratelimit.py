@@ -0,0 +1,112 @@
+# slow_sql/ratelimit.py
+# 阿里云 OpenAPI 请求限速：所有拉取线程和实例共享一个令牌桶，遇到流控时自动降速并统一暂停，之后逐步恢复
+
+import threading
+import time
+
+from slow_sql.settings import option
+
+# 遇到流控时速率乘以这个系数（乘性减），每次成功请求增加上限的 1/RECOVERY_STEPS（加性增）
+DECREASE_FACTOR = 0.7
+RECOVERY_STEPS = 50
+# 速率下限（每秒请求数）
+MIN_RATE = 0.5
+# 遇到流控后所有线程暂停的时间（秒），连续流控（中间没有成功的请求）时加倍，最多 MAX_PAUSE
+BASE_PAUSE = 0.5
+MAX_PAUSE = 30.0
+
+
+class RateLimiter(object):
+    """
+    多个拉取线程（以及多个实例）共享的请求限速，作为上下文管理器使用：with limiter: 发送请求。
+
+    令牌桶限制每秒请求数（上限为 rate，为 None 时不限速）。桶里最多1个令牌，请求按 1/rate 的间隔均匀发出，
+    空闲之后也不会突发，任意1秒内不超过 rate 个；信号量限制同时在途的请求数。
+    流控时调用 throttled()：速率乘以 DECREASE_FACTOR，所有线程暂停 BASE_PAUSE 秒（连续流控时加倍）再继续，
+    同一批并发请求同时被限流只降速一次；成功时调用 succeeded()：速率按上限的 1/RECOVERY_STEPS 回升，
+    实际允许的速率低于 rate 时稳定在它附近。不限速时流控只触发统一暂停。
+    timeout 为同一个请求持续被限流多久（秒）后放弃（见 fetcher.call_with_retry）。clock / sleep 可以替换，用于测试。
+    """
+
+    def __init__(self, rate, max_concurrent=8, timeout=600, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = float(rate) if rate else None
+        self.rate = self.max_rate
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = 1.0
+        self.updated = clock()
+        self.paused_until = self.updated
+        self.last_decrease = None
+        self.streak = 0  # 连续流控的次数，成功后清零
+        self.throttles = 0
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        """占用一个并发名额，并等待令牌（暂停期间不发放令牌）"""
+        self.semaphore.acquire()
+        try:
+            while True:
+                with self.lock:
+                    now = self.clock()
+                    wait = self.paused_until - now
+                    if wait <= 0:
+                        if self.rate is None:
+                            return
+                        self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                        self.updated = now
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            return
+                        wait = (1 - self.tokens) / self.rate
+                self.sleep(wait)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def release(self):
+        self.semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def succeeded(self):
+        with self.lock:
+            self.streak = 0
+            if self.rate is not None:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / RECOVERY_STEPS)
+
+    def throttled(self):
+        """
+        记录一次流控，返回本次开始的暂停秒数；已经在暂停中（同一批请求的其他线程先报告了流控）时返回 None。
+        被限流的请求在暂停结束后重新排队获取令牌。
+        """
+        with self.lock:
+            now = self.clock()
+            self.throttles += 1
+            if now < self.paused_until:
+                return None
+            # 暂停前发出、暂停后才返回的请求也可能被限流，距上次降速不到一个令牌的间隔时不再降速
+            if self.rate is not None and (self.last_decrease is None or now - self.last_decrease >= 1 / self.rate):
+                self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+                self.last_decrease = now
+            pause = min(MAX_PAUSE, BASE_PAUSE * 2 ** self.streak)
+            self.streak += 1
+            self.paused_until = now + pause
+            self.tokens = 0.0
+            self.updated = self.paused_until
+            return pause
+
+    def describe(self):
+        return "不限速" if self.rate is None else f"请求速率降为每秒{self.rate:.1f}次"
+
+
+def limiter_from_config(config, replay=False):
+    """按 API_RATE_LIMIT、MAX_CONCURRENT_REQUESTS 和 API_THROTTLE_TIMEOUT 创建共享的限速器；回放录制的响应时不限速"""
+    rate = None if replay else option(config, "API_RATE_LIMIT")
+    return RateLimiter(rate, option(config, "MAX_CONCURRENT_REQUESTS"), option(config, "API_THROTTLE_TIMEOUT"))
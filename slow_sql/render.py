@@ -0,0 +1,721 @@
+# slow_sql/render.py
+# 报告渲染：飞书卡片、文本消息、Markdown 和控制台表格
+
+from slow_sql.feishu import encode_payload
+from slow_sql.heatmap import WEEKDAYS, heat_coverage, hour_totals, local_heat, peak_hour, shade_line
+
+# 多张卡片时标题后追加的页码，按最长的情况预留字节数
+PAGE_SUFFIX = "（{page}/{pages}）"
+PAGE_SUFFIX_RESERVE = len(PAGE_SUFFIX.format(page=999, pages=999).encode())
+
+# === 飞书卡片元素 ===
+
+
+def md_div(content):
+    return {"tag": "div", "text": {"tag": "lark_md", "content": content}}
+
+
+def md_field(content, short=True):
+    return {"is_short": short, "text": {"tag": "lark_md", "content": content}}
+
+
+def fields_div(fields):
+    return {"tag": "div", "fields": fields}
+
+
+def hr():
+    return {"tag": "hr"}
+
+
+def new_card(title, template, intro=None):
+    """创建卡片消息：标题、颜色模板，以及开头的说明文字和分隔线（没有 intro 时元素为空）"""
+    return {
+        "msg_type": "interactive",
+        "card": {
+            "config": {
+                "wide_screen_mode": True
+            },
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": title
+                },
+                "template": template
+            },
+            "elements": [md_div(intro), hr()] if intro else []
+        }
+    }
+
+
+def payload_size(obj):
+    """序列化后（与发送时相同的方式）的字节数"""
+    return len(encode_payload(obj))
+
+
+def text_size(text):
+    """字符串作为 JSON 字符串内容时的字节数（不含引号），多个字符串拼接时可以直接相加"""
+    return payload_size(text) - 2
+
+
+class CardSplitter(object):
+    """
+    按序列化后的字节数把卡片元素分到多张卡片，每张不超过 max_bytes。
+
+    卡片的字节数 = 空卡片的字节数 + 各元素的字节数 + 元素之间的逗号，每个元素只在加入时序列化一次，
+    不需要每次检查大小都重新序列化整张卡片。多张卡片时标题后追加页码（已预留字节数）。
+    """
+
+    def __init__(self, title, template, intro, max_bytes):
+        self.title = title
+        self.template = template
+        self.max_bytes = max_bytes
+        self.cards = []  # [[卡片, 当前字节数], ...]
+        self.new_page()
+        self.add(md_div(intro), hr())
+
+    def new_page(self):
+        card = new_card(self.title, self.template)
+        self.cards.append([card, payload_size(card) + PAGE_SUFFIX_RESERVE])
+
+    def elements(self):
+        return self.cards[-1][0]["card"]["elements"]
+
+    def remaining(self):
+        """当前卡片还能容纳的一个元素的字节数"""
+        card, size = self.cards[-1]
+        return self.max_bytes - size - (1 if card["card"]["elements"] else 0)
+
+    def add(self, *elements):
+        """添加一组元素（如一条SQL的详情），同一组放在同一张卡片中；当前卡片放不下时换到新卡片"""
+        sizes = [payload_size(element) for element in elements]
+        group_size = sum(sizes) + len(elements) - 1
+        if group_size > self.remaining() and self.elements():
+            self.new_page()
+        if group_size > self.remaining():
+            print(f"[WARN] 单个卡片元素 {group_size} 字节，超过卡片大小上限 {self.max_bytes} 字节")
+        card = self.cards[-1]
+        card[1] += group_size + (1 if self.elements() else 0)
+        self.elements().extend(elements)
+
+    def finish(self):
+        """返回卡片列表：去掉每张卡片末尾的分隔线，多张卡片时在标题后追加页码"""
+        pages = len(self.cards)
+        for page, (card, _) in enumerate(self.cards, 1):
+            elements = card["card"]["elements"]
+            while elements and elements[-1] == hr():
+                elements.pop()
+            if pages > 1:
+                card["card"]["header"]["title"]["content"] += PAGE_SUFFIX.format(page=page, pages=pages)
+        return [card for card, _ in self.cards]
+
+
+def truncate(text, limit):
+    """超过 limit 个字符时截断并以 ... 结尾，使消息更美观"""
+    if len(text) > limit:
+        return text[:limit - 3] + "..."
+    return text
+
+
+# === 周报（DescribeSlowLogRecords） ===
+
+
+def format_instances(item, limit=3):
+    """按执行次数列出该SQL所在的实例"""
+    breakdown = sorted(item.get("instances", {}).items(), key=lambda x: x[1]["count"], reverse=True)
+    text = ", ".join(f"{instance_id}({data['count']}次)" for instance_id, data in breakdown[:limit])
+    if len(breakdown) > limit:
+        text += f" 等{len(breakdown)}个实例"
+    return text
+
+
+def format_shares(values, count, limit=3):
+    """按执行次数占比列出主机或账号，只有一个值时直接显示该值"""
+    if len(values) == 1:
+        return values[0][0] or '未知'
+    text = ", ".join(f"{value or '未知'}({round(weight * 100 / max(count, 1))}%)" for value, weight in values[:limit])
+    if len(values) > limit:
+        text += f" 等{len(values)}个"
+    return text
+
+
+def instance_table(instance_results, failed_instances):
+    """多实例模式的各实例概况表格"""
+    rows = [
+        f"| {instance_id} | {data['total_records']} | {data['fetched']} | {data['sql_count']} | {round(data['total_time'] / 1000, 1)} |"
+        for instance_id, data in sorted(instance_results.items(), key=lambda x: x[1]["total_time"], reverse=True)
+    ]
+    rows += [f"| {instance_id} | 拉取失败 | - | - | - |" for instance_id in failed_instances]
+    return "| 实例 | 总记录数 | 分析记录数 | SQL数 | 总耗时(s) |\n|------|---------|-----------|-------|----------|\n" + "\n".join(rows)
+
+
+def format_change(current, baseline, field, digits=0):
+    """格式化为 “基线 → 本周 (+x%)”"""
+    old, new = baseline[field], current[field]
+    text = f"{round(old, digits) if digits else round(old)} → {round(new, digits) if digits else round(new)}"
+    if old > 0:
+        text += f" ({(new - old) * 100 / old:+.0f}%)"
+    return text
+
+
+def format_week_changes(changes, limit=10):
+    """生成周环比的 Markdown 表格：新增、变慢、好转各最多 limit 条"""
+    header = ("| SQL | 数据库 | 执行次数 | 平均耗时(ms) | P99耗时(ms) | 平均扫描行数 |\n"
+              "|-----|--------|---------|------------|-----------|------------|\n")
+    sections = []
+    if changes["new"]:
+        rows = [f"| {entry['sql'][:60]} | {entry['db_name']} | {entry['current']['count']} | "
+                f"{round(entry['current']['avg_time'], 2)} | {round(entry['current']['p99_time'], 2)} | "
+                f"{round(entry['current']['avg_scanned_rows'])} |"
+                for entry in changes["new"][:limit]]
+        sections.append(f"**🆕 新增 {len(changes['new'])} 条:**\n" + header + "\n".join(rows))
+    for name, title in (("regressed", "📈 变慢"), ("improved", "📉 好转")):
+        if not changes[name]:
+            continue
+        rows = []
+        for entry in changes[name][:limit]:
+            current, baseline = entry["current"], entry["baseline"]
+            if current is None:
+                rows.append(f"| {entry['sql'][:60]} | {entry['db_name']} | {round(baseline['count'])} → 0 | 本周未出现 | - | - |")
+                continue
+            rows.append(f"| {entry['sql'][:60]} | {entry['db_name']} | {format_change(current, baseline, 'count')} | "
+                        f"{format_change(current, baseline, 'avg_time', 2)} | {format_change(current, baseline, 'p99_time', 2)} | "
+                        f"{format_change(current, baseline, 'avg_scanned_rows')} |")
+        sections.append(f"**{title} {len(changes[name])} 条:**\n" + header + "\n".join(rows))
+    return "\n\n".join(sections)
+
+
+ROLLUP_TITLES = {"table": "表", "db": "数据库", "account": "账号", "host": "主机"}
+
+
+def format_rollups(rollups, limit=10):
+    """按维度汇总的 Markdown 表格，每个维度一个，按总耗时降序最多 limit 行；返回 [(维度名称, 表格), ...]"""
+    tables = []
+    for dimension, items in rollups.items():
+        if not items:
+            continue
+        title = ROLLUP_TITLES[dimension]
+        rows = [f"| {item['value'] or '未知'} | {item['count']} | {round(item['total_time'] / 1000, 1)} | "
+                f"{item['total_scanned_rows']} | {item['sql_count']} | {truncate(item['top_sql'], 60)} |"
+                for item in items[:limit]]
+        tables.append((title, f"| {title} | 执行次数 | 总耗时(s) | 扫描行数 | SQL数 | 耗时最高的SQL |\n"
+                              "|------|---------|----------|---------|-------|-------------|\n" + "\n".join(rows)))
+    return tables
+
+
+def format_heatmap(heat, utc_offset):
+    """一周的时段分布：每行一天，24个字符依次为0-23时，颜色越深执行次数越多，最后一行为高峰时段；没有执行时为空字符串"""
+    heat = local_heat(heat, utc_offset)
+    maximum = max(heat)
+    if not maximum:
+        return ""
+    lines = [f"{WEEKDAYS[day]} {shade_line(heat[day * 24:(day + 1) * 24], maximum)}" for day in range(7)]
+    weekday, hour, count = peak_hour(heat)
+    lines.append(f"高峰: {weekday} {hour:02d}时（{count} 次）")
+    return "\n".join(lines)
+
+
+def format_heatmaps(summary, multi_instance, utc_offset):
+    """总体（多实例时还有各实例）的时段分布，返回 [(名称, 热力图), ...]，没有执行的省略"""
+    heatmaps = [("全部实例" if multi_instance else "", summary.heat_total)]
+    if multi_instance:
+        heatmaps.extend(sorted(summary.instance_heat.items()))
+    return [(name, text) for name, text in ((name, format_heatmap(heat, utc_offset)) for name, heat in heatmaps) if text]
+
+
+def format_hour_profile(item, utc_offset):
+    """一条SQL按小时合计的时段分布（一行24个字符）和高峰时段，没有时段分布时为空字符串"""
+    heat = item.get("heat")
+    if heat is None:
+        return ""
+    local = local_heat(heat, utc_offset)
+    totals = hour_totals(local)
+    if not max(totals):
+        return ""
+    weekday, hour, count = peak_hour(local)
+    text = f"{shade_line(totals, max(totals))}（0-23时，高峰 {weekday} {hour:02d}时 {count} 次"
+    coverage = heat_coverage(heat, item["count"])
+    if coverage < 0.995:
+        text += f"，覆盖 {coverage:.0%} 的执行"
+    return text + "）"
+
+
+def heatmap_heading(report, name=""):
+    return f"{name + ' ' if name else ''}慢查询时段分布（执行次数，每行24格为0-23时，UTC{report['utc_offset']:+d}）"
+
+
+def item_metrics(item):
+    """报告中展示的平均耗时、最大耗时、平均扫描行数和平均解析行数"""
+    count = item["count"]
+    return {
+        "avg_time": round(item["total_time"] / count, 2) if count > 0 else 0,
+        "max_time": round(item["max_time"], 2),
+        "avg_rows": round(item["total_scanned_rows"] / count) if count > 0 else 0,
+        "avg_parse_rows": round(item["total_parse_rows"] / count) if count > 0 else 0,
+    }
+
+
+def format_analysis(item, separator="；"):
+    """SQL 分析（见 analysis.py）的摘要：全表扫描风险、写法问题和候选索引，没有分析结果或没有问题时为空字符串"""
+    analysis = item.get("analysis")
+    if not analysis:
+        return ""
+    parts = []
+    if item.get("full_scan"):
+        scanned, returned = item["full_scan"]
+        parts.append(f"⚠️ 全表扫描风险（平均扫描 {scanned} 行，返回 {returned} 行）")
+    parts.extend(analysis["warnings"])
+    parts.extend(item.get("sample_warnings", ()))
+    if analysis["indexes"]:
+        parts.append(f"候选索引: {', '.join(analysis['indexes'])}")
+    return separator.join(parts)
+
+
+def report_title(report):
+    title = f"🐢 本周慢 SQL 报告（{report['start_time'].date()} ~ {report['end_time'].date()}）"
+    if report["multi_instance"]:
+        title += f" · {report['instance_count']} 个实例"
+    return title
+
+
+def report_intro(report):
+    return (f"总共发现 {report['total_records']} 条慢查询记录，分析了 {report['stats']['fetched']} 条"
+            f"（按过滤规则排除了 {report['stats']['excluded']} 条记录：{report['excluded_text']}）")
+
+
+def build_report_cards(report, max_bytes, detail_count=20, chunk_size=30, heatmap_count=5):
+    """
+    周报卡片：概况、各实例概况（多实例）、周环比、按维度汇总、时段分布、前 detail_count 条SQL的详情
+    （前 heatmap_count 条附带星期×小时的时段分布，其余只按小时合计），其余SQL以表格形式展示，每段最多 chunk_size 条。
+
+    每张卡片序列化后不超过 max_bytes 字节，超过时按顺序拆分为多张卡片；一条SQL的详情不会被拆开，
+    表格按剩余空间分段。
+    """
+    top = report["top"]
+    cards = CardSplitter(report_title(report), "red",
+                         f"**{report_intro(report)}，{report['coverage_text']}，以下是最需要优化的前{len(top)}条:**",
+                         max_bytes)
+
+    # 多实例时先展示各实例概况
+    if report["multi_instance"]:
+        cards.add(md_div(f"**各实例概况:**\n{report['instance_table']}"), hr())
+
+    # 与前几周对比的新增 / 变慢 / 好转
+    if report["week_changes_text"]:
+        cards.add(md_div(f"**周环比（对比前 {report['baseline_weeks']} 周）:**\n{report['week_changes_text']}"), hr())
+
+    # 按表、数据库、账号、主机汇总的 Top-N
+    for title, table in report["rollup_tables"]:
+        cards.add(md_div(f"**按{title}汇总（总耗时 Top {report['rollup_limit']}）:**\n{table}"), hr())
+
+    # 总体和各实例的时段分布（星期 × 小时）
+    for name, heatmap in report["heatmaps"]:
+        cards.add(md_div(f"**{heatmap_heading(report, name)}:**\n{heatmap}"), hr())
+
+    # 添加每条慢查询的详细信息（仅展示前 detail_count 条详情，其余以表格形式展示）
+    for i, item in enumerate(top[:detail_count]):
+        metrics = item_metrics(item)
+        group = [fields_div([md_field(f"**#{i+1} SQL:** `{truncate(item['sql'], 200)}`", short=False)])]
+
+        # 基本信息
+        fields = [
+            md_field(f"**数据库:** {item['db_name']}"),
+            md_field(f"**主机:** {format_shares(item['hosts'], item['count'])}"),
+            md_field(f"**账号:** {format_shares(item['users'], item['count'])}"),
+            md_field(f"**执行次数:** {item['count']}"),
+        ]
+        if report["multi_instance"]:
+            fields.append(md_field(f"**实例:** {format_instances(item)}", short=False))
+        group.append(fields_div(fields))
+
+        # 性能指标
+        group.append(fields_div([
+            md_field(f"**平均耗时:** {metrics['avg_time']}ms"),
+            md_field(f"**最大耗时:** {metrics['max_time']}ms"),
+            md_field(f"**P95 耗时:** {round(item['p95_time'], 2)}ms"),
+            md_field(f"**P99 耗时:** {round(item['p99_time'], 2)}ms"),
+            md_field(f"**平均扫描行数:** {metrics['avg_rows']}"),
+            md_field(f"**P99 扫描行数:** {round(item['p99_scanned_rows'])}"),
+            md_field(f"**平均解析行数:** {metrics['avg_parse_rows']}"),
+        ]))
+
+        # SQL 分析：全表扫描风险、写法问题和候选索引
+        analysis = format_analysis(item)
+        if analysis:
+            group.append(fields_div([md_field(f"**分析:** {analysis}", short=False)]))
+
+        # 时段分布：前 heatmap_count 条为星期 × 小时，其余按小时合计
+        heatmap = format_heatmap(item["heat"], report["utc_offset"]) if i < heatmap_count and item.get("heat") else ""
+        if heatmap:
+            group.append(md_div(f"**时段分布（UTC{report['utc_offset']:+d}）:**\n{heatmap}"))
+        else:
+            profile = format_hour_profile(item, report["utc_offset"])
+            if profile:
+                group.append(fields_div([md_field(f"**时段分布:** {profile}", short=False)]))
+
+        # 添加分隔线（每张卡片末尾的分隔线在 finish 时去掉）
+        group.append(hr())
+        cards.add(*group)
+
+    # 超过 detail_count 条时，将剩余记录以简洁表格形式添加
+    if len(top) > detail_count:
+        table_rows = []
+        for i, item in enumerate(top[detail_count:], detail_count + 1):
+            metrics = item_metrics(item)
+            # 表格中SQL还是需要限制长度，否则会影响可读性
+            table_rows.append(f"| {i} | {truncate(item['sql'], 80)} | {item['db_name']} | {item.get('username', '未知')} | "
+                              f"{item['count']} | {metrics['avg_time']} | {metrics['avg_rows']} | {metrics['avg_parse_rows']} |")
+
+        table_header = "| 序号 | SQL | 数据库 | 账号 | 执行次数 | 平均耗时(ms) | 平均扫描行数 | 平均解析行数 |\n|------|-----|--------|------|---------|------------|------------|------------|\n"
+        add_table(cards, md_div("**剩余需优化的SQL查询:**"), table_header, table_rows, detail_count + 1, chunk_size)
+    return cards.finish()
+
+
+def add_table(cards, heading, table_header, rows, first_number, chunk_size):
+    """
+    将表格按段加入卡片：每段最多 chunk_size 行，并且不超过当前卡片的剩余空间（放不下一行时换到新卡片）。
+
+    每行只计算一次字节数；heading 与第一段放在同一张卡片中。
+    """
+    def chunk_title(first, last):
+        return f"**记录 {first}-{last}:**\n"
+
+    # 段落元素除行以外部分的字节数，按最长的段落标题估算
+    last_number = first_number + len(rows) - 1
+    base_size = payload_size(md_div(chunk_title(last_number, last_number) + table_header))
+    heading_size = payload_size(heading) + 1
+    chunk, chunk_bytes, first = [], 0, first_number
+
+    def flush():
+        nonlocal heading, heading_size
+        element = md_div(chunk_title(first, first + len(chunk) - 1) + table_header + "\n".join(chunk))
+        if heading is None:
+            cards.add(element)
+        else:
+            cards.add(heading, element)
+            heading, heading_size = None, 0
+
+    for row in rows:
+        row_size = text_size(row) + (2 if chunk else 0)  # 行之间的换行符转义后为2字节
+        if chunk and (len(chunk) >= chunk_size or heading_size + base_size + chunk_bytes + row_size > cards.remaining()):
+            flush()
+            first += len(chunk)
+            chunk, chunk_bytes = [], 0
+            row_size = text_size(row)
+        if not chunk and heading_size + base_size + row_size > cards.remaining() and cards.elements():
+            cards.new_page()
+        chunk.append(row)
+        chunk_bytes += row_size
+    if chunk:
+        flush()
+
+
+def build_report_text(report, limit=20):
+    """卡片消息发送失败时使用的简单文本消息"""
+    top = report["top"]
+    lines = []
+    for i, item in enumerate(top[:limit]):
+        metrics = item_metrics(item)
+        analysis = format_analysis(item)
+        profile = format_hour_profile(item, report["utc_offset"])
+        lines.append(
+            f"- **#{i+1}** SQL: {item['sql'][:150]}...\n" +
+            f"  数据库: {item['db_name']} | 主机: {format_shares(item['hosts'], item['count'])} | 账号: {format_shares(item['users'], item['count'])}\n" +
+            f"  执行: {item['count']}次 | 平均: {metrics['avg_time']}ms | P95: {round(item['p95_time'], 2)}ms | P99: {round(item['p99_time'], 2)}ms | 最大: {metrics['max_time']}ms\n" +
+            f"  扫描行: {metrics['avg_rows']} | 解析行: {metrics['avg_parse_rows']}" +
+            (f"\n  分析: {analysis}" if analysis else "") +
+            (f"\n  时段分布: {profile}" if profile else ""))
+    return {
+        "msg_type": "text",
+        "content": {
+            "text": f"{report_title(report)}\n\n{report_intro(report)}，以下是最需要优化的前{limit}条:\n\n" +
+                    "\n".join(lines) +
+                    f"\n\n注意：共发现 {len(top)} 条需要优化的SQL，此处仅展示前{limit}条。"
+        }
+    }
+
+
+def print_report(report):
+    """输出结果到控制台"""
+    print("\n===== 慢查询报告 =====")
+    print(f"时间范围: {report['start_time'].date()} ~ {report['end_time'].date()}")
+    print(f"总记录数: {report['total_records']}, 分析记录数: {report['stats']['fetched']}")
+    print(report["coverage_text"])
+    print(f"按过滤规则（{report['excluded_text']}）排除了 {report['stats']['excluded']} 条记录")
+    if report["multi_instance"]:
+        print("各实例概况:")
+        print(report["instance_table"])
+    if report["week_changes_text"]:
+        print(f"周环比（对比前 {report['baseline_weeks']} 周）:")
+        print(report["week_changes_text"])
+    for title, table in report["rollup_tables"]:
+        print(f"按{title}汇总（总耗时 Top {report['rollup_limit']}）:")
+        print(table)
+    for name, heatmap in report["heatmaps"]:
+        print(f"{heatmap_heading(report, name)}:")
+        print(heatmap)
+    print(f"Top {len(report['top'])} 慢查询:")
+    print("| 序号 | SQL | 数据库 | 主机 | 账号 | 次数 | 平均耗时(ms) | P95耗时(ms) | P99耗时(ms) | 最大耗时(ms) | 平均扫描行数 | P99扫描行数 |")
+    print("|------|-----|--------|------|------|------|--------------|-------------|-------------|--------------|------------|------------|")
+    for i, item in enumerate(report["top"]):
+        metrics = item_metrics(item)
+        # 控制台输出时SQL仍需要限制长度，以便打印
+        print(f"| {i+1} | {truncate(item['sql'], 100)} | {item['db_name']} | {format_shares(item['hosts'], item['count'], limit=1)} | "
+              f"{format_shares(item['users'], item['count'], limit=1)} | {item['count']} | {metrics['avg_time']} | "
+              f"{round(item['p95_time'], 2)} | {round(item['p99_time'], 2)} | {metrics['max_time']} | {metrics['avg_rows']} | "
+              f"{round(item['p99_scanned_rows'])} |")
+        if report["multi_instance"]:
+            print(f"|    | 实例: {format_instances(item)} |")
+        analysis = format_analysis(item)
+        if analysis:
+            print(f"|    | 分析: {analysis} |")
+        profile = format_hour_profile(item, report["utc_offset"])
+        if profile:
+            print(f"|    | 时段分布: {profile} |")
+
+
+# === 慢日志统计（DescribeSlowLogs） ===
+
+
+def statistics_row(item, multi_instance, sql_limit):
+    """从 SQLSlowLog 记录中取出报告展示的字段"""
+    db_name = item.get('DBName', 'N/A')
+    if multi_instance:  # 多实例时数据库前标注实例ID
+        db_name = f"{item['DBInstanceId']}/{db_name}"
+    total_count = item.get('MySQLTotalExecutionCounts', 0)
+    total_time = float(item.get('MySQLTotalExecutionTimes', 0))
+    return {
+        "db_name": db_name,
+        # 这个API返回的是SQL模板
+        "sql_template": truncate(item.get('SQLText', 'N/A'), sql_limit),
+        "total_count": total_count,
+        "avg_time": round(total_time / total_count if total_count > 0 else 0, 2),
+        "max_time": item.get('MaxExecutionTimeMS', 0),
+        "parse_rows": item.get('ParseTotalRowCounts', 0),
+        "max_scan_rows": item.get('ParseMaxRowCount', 0),
+        "create_time": item.get('CreateTime', 'N/A'),
+    }
+
+
+def statistics_title(statistics):
+    title = f"🐢 慢 SQL 统计报告 ({statistics['start_time'].strftime('%Y-%m-%d')} ~ {statistics['end_time'].strftime('%Y-%m-%d')})"
+    if statistics["multi_instance"]:
+        title += f" · {statistics['instance_count']} 个实例"
+    return title
+
+
+def build_statistics_markdown(statistics, limit=50):
+    """慢日志统计的 Markdown 表格（只显示前 limit 条）"""
+    markdown = "### 慢查询统计报告\n\n"
+    markdown += f"**查询时间范围**: {statistics['start_time'].strftime('%Y-%m-%d')} 至 {statistics['end_time'].strftime('%Y-%m-%d')}\n\n"
+    markdown += f"**{statistics['coverage_text']}**\n\n"
+    if statistics["multi_instance"]:
+        failed = statistics["failed_instances"]
+        markdown += f"**实例数**: {statistics['instance_count']}" + (f"（拉取失败: {', '.join(failed)}）" if failed else "") + "\n\n"
+    markdown += "| # | 数据库 | SQL模板 | 执行次数 | 平均执行时间(ms) | 最大执行时间(ms) | 解析行数(总计) | 扫描行数(最大) |\n"
+    markdown += "|---|--------|---------|----------|----------------|----------------|--------------|----------------|\n"
+    for i, item in enumerate(statistics["records"][:limit]):
+        row = statistics_row(item, statistics["multi_instance"], 300)
+        markdown += (f"| {i+1} | {row['db_name']} | `{row['sql_template']}` | {row['total_count']} | {row['avg_time']} | "
+                     f"{row['max_time']} | {row['parse_rows']} | {row['max_scan_rows']} |\n")
+    return markdown
+
+
+def build_statistics_cards(statistics, max_bytes, limit=20):
+    """慢日志统计卡片：执行次数最多的前 limit 条SQL模板，每张卡片不超过 max_bytes 字节"""
+    records = statistics["records"][:limit]
+    cards = CardSplitter(statistics_title(statistics), "orange",
+                         f"**总共发现 {len(statistics['records'])} 条慢查询统计记录，{statistics['coverage_text']}，以下是执行次数最多的前{limit}条:**",
+                         max_bytes)
+    for i, item in enumerate(records):
+        row = statistics_row(item, statistics["multi_instance"], 500)
+        cards.add(
+            fields_div([md_field(f"**#{i+1} SQL模板:** `{row['sql_template']}`", short=False)]),
+            fields_div([
+                md_field(f"**数据库:** {row['db_name']}"),
+                md_field(f"**创建时间:** {row['create_time']}"),
+                md_field(f"**执行次数:** {row['total_count']}"),
+                md_field(f"**平均执行时间:** {row['avg_time']}ms"),
+                md_field(f"**最大执行时间:** {row['max_time']}ms"),
+                md_field(f"**解析行数(总计):** {row['parse_rows']}"),
+            ]),
+            # 每张卡片末尾的分隔线在 finish 时去掉
+            hr(),
+        )
+    return cards.finish()
+
+
+# === 综合报告（DescribeSlowLogs 关联 DescribeSlowLogRecords） ===
+
+
+def combined_metrics(item):
+    """模板统计的执行次数、平均执行时间和最大执行时间，以及明细样本覆盖的执行次数占比"""
+    count = item["count"]
+    return {
+        "avg_time": round(item["total_time"] / count, 2) if count > 0 else 0,
+        "max_time": round(item["max_time"], 2),
+        "sample_ratio": round(item["sample_count"] * 100 / count) if count > 0 else 0,
+    }
+
+
+def combined_title(combined):
+    title = f"🐢 慢 SQL 综合报告（{combined['start_time'].date()} ~ {combined['end_time'].date()}）"
+    if combined["multi_instance"]:
+        title += f" · {combined['instance_count']} 个实例"
+    return title
+
+
+def combined_intro(combined):
+    text = (f"模板统计共 {combined['template_count']} 条SQL、{combined['total_count']} 次执行，"
+            f"其中 {combined['matched']} 条关联到明细，明细样本覆盖 {round(combined['sample_ratio'] * 100)}% 的执行次数"
+            f"（明细按过滤规则排除了 {combined['excluded_text']} 的记录）")
+    if combined["failed_instances"]:
+        text += f"，拉取失败的实例: {', '.join(combined['failed_instances'])}"
+    return text
+
+
+def build_combined_cards(combined, max_bytes, limit=20):
+    """综合报告卡片：执行次数最多的前 limit 条SQL，模板统计的总量与明细的样例SQL、账号和主机分布并列展示"""
+    items = combined["items"][:limit]
+    cards = CardSplitter(combined_title(combined), "orange",
+                         f"**{combined_intro(combined)}，{combined['coverage_text']}，以下是执行次数最多的前{len(items)}条:**",
+                         max_bytes)
+    for i, item in enumerate(items):
+        metrics = combined_metrics(item)
+        group = [fields_div([md_field(f"**#{i+1} SQL模板:** `{truncate(item['sql_template'], 300)}`", short=False)])]
+        if item["sample"]:
+            group.append(fields_div([md_field(f"**样例SQL:** `{truncate(item['sample'], 300)}`", short=False)]))
+        fields = [
+            md_field(f"**数据库:** {item['db_name']}"),
+            md_field(f"**执行次数:** {item['count']}"),
+            md_field(f"**平均执行时间:** {metrics['avg_time']}ms"),
+            md_field(f"**最大执行时间:** {metrics['max_time']}ms"),
+            md_field(f"**解析行数(总计):** {item['parse_rows']}"),
+            md_field(f"**扫描行数(最大):** {item['max_scan_rows']}"),
+        ]
+        if item["sample"]:
+            fields += [
+                md_field(f"**账号:** {format_shares(item['users'], item['sample_count'])}"),
+                md_field(f"**主机:** {format_shares(item['hosts'], item['sample_count'])}"),
+                md_field(f"**明细样本:** {item['sample_count']}次（{metrics['sample_ratio']}%）"),
+                md_field(f"**P95 / P99 耗时:** {round(item['p95_time'], 2)} / {round(item['p99_time'], 2)}ms"),
+            ]
+        else:
+            fields.append(md_field("**明细样本:** 无", short=False))
+        if combined["multi_instance"]:
+            fields.append(md_field(f"**实例:** {format_instances(item)}", short=False))
+        group.append(fields_div(fields))
+        # 每张卡片末尾的分隔线在 finish 时去掉
+        group.append(hr())
+        cards.add(*group)
+    return cards.finish()
+
+
+def build_combined_text(combined, limit=20):
+    """卡片消息发送失败时使用的简单文本消息"""
+    lines = []
+    for i, item in enumerate(combined["items"][:limit]):
+        metrics = combined_metrics(item)
+        line = (f"- **#{i+1}** SQL模板: {truncate(item['sql_template'], 150)}\n"
+                f"  数据库: {item['db_name']} | 执行: {item['count']}次 | 平均: {metrics['avg_time']}ms | 最大: {metrics['max_time']}ms")
+        if item["sample"]:
+            line += (f"\n  账号: {format_shares(item['users'], item['sample_count'])} | "
+                     f"主机: {format_shares(item['hosts'], item['sample_count'])} | 明细样本: {metrics['sample_ratio']}%")
+        lines.append(line)
+    return {
+        "msg_type": "text",
+        "content": {
+            "text": f"{combined_title(combined)}\n\n{combined_intro(combined)}，以下是执行次数最多的前{len(lines)}条:\n\n" +
+                    "\n".join(lines)
+        }
+    }
+
+
+def build_combined_markdown(combined, limit=50):
+    """综合报告的 Markdown 表格（只显示前 limit 条）"""
+    markdown = "### 慢查询综合报告\n\n"
+    markdown += f"**查询时间范围**: {combined['start_time'].date()} 至 {combined['end_time'].date()}\n\n"
+    markdown += f"**{combined_intro(combined)}**\n\n**{combined['coverage_text']}**\n\n"
+    markdown += "| # | 数据库 | SQL模板 | 执行次数 | 平均执行时间(ms) | 最大执行时间(ms) | 明细样本 | 主要账号 | 主要主机 | P99耗时(ms) |\n"
+    markdown += "|---|--------|---------|----------|----------------|----------------|---------|---------|---------|------------|\n"
+    for i, item in enumerate(combined["items"][:limit]):
+        metrics = combined_metrics(item)
+        if item["sample"]:
+            sample = (f"{metrics['sample_ratio']}% | {format_shares(item['users'], item['sample_count'], limit=1)} | "
+                      f"{format_shares(item['hosts'], item['sample_count'], limit=1)} | {round(item['p99_time'], 2)}")
+        else:
+            sample = "无 | - | - | -"
+        markdown += (f"| {i+1} | {item['db_name']} | `{truncate(item['sql_template'], 100)}` | {item['count']} | "
+                     f"{metrics['avg_time']} | {metrics['max_time']} | {sample} |\n")
+    return markdown
+
+
+# === 实时告警（常驻模式） ===
+
+
+def alert_title(now):
+    return f"🚨 慢 SQL 实时告警（{now.strftime('%Y-%m-%d %H:%M')}）"
+
+
+def alert_metrics(alert):
+    """告警中展示的最近1小时指标及对应的基线"""
+    baseline_rate = alert["baseline_rate"]
+    baseline_avg_time = alert["baseline_avg_time"]
+    return {
+        "baseline_rate": round(baseline_rate, 1) if baseline_rate is not None else "基线不足",
+        "avg_time": round(alert["avg_time"], 2),
+        "baseline_avg_time": round(baseline_avg_time, 2) if baseline_avg_time is not None else "-",
+        "max_time": round(alert["max_time"], 2),
+    }
+
+
+def build_alert_cards(alerts, now, max_bytes):
+    """实时告警卡片：每条SQL的告警原因、最近1小时的执行次数和耗时以及对应的基线，每张卡片不超过 max_bytes 字节"""
+    cards = CardSplitter(alert_title(now), "red",
+                         f"**最近1小时有 {len(alerts)} 条SQL的执行频率或耗时明显升高:**", max_bytes)
+    for i, alert in enumerate(alerts):
+        metrics = alert_metrics(alert)
+        cards.add(
+            fields_div([
+                md_field(f"**#{i+1} SQL:** `{truncate(alert['sql'], 200)}`", short=False),
+                md_field(f"**原因:** {'；'.join(alert['reasons'])}", short=False),
+            ]),
+            fields_div([
+                md_field(f"**实例:** {alert['instance_id']}"),
+                md_field(f"**数据库:** {alert['db_name']}"),
+                md_field(f"**账号:** {alert['username']}"),
+                md_field(f"**最近1小时执行次数:** {alert['count']}"),
+                md_field(f"**过去7天每小时平均:** {metrics['baseline_rate']}"),
+                md_field(f"**最近1小时平均耗时:** {metrics['avg_time']}ms"),
+                md_field(f"**过去24小时平均耗时:** {metrics['baseline_avg_time']}ms"),
+                md_field(f"**最近1小时最大耗时:** {metrics['max_time']}ms"),
+            ]),
+            hr(),
+        )
+    return cards.finish()
+
+
+def build_alert_text(alerts, now, limit=20):
+    """告警卡片发送失败时使用的简单文本消息"""
+    lines = []
+    for i, alert in enumerate(alerts[:limit]):
+        metrics = alert_metrics(alert)
+        lines.append(
+            f"- **#{i+1}** [{alert['instance_id']}] {alert['sql'][:150]}\n" +
+            f"  原因: {'；'.join(alert['reasons'])}\n" +
+            f"  最近1小时: {alert['count']}次，平均 {metrics['avg_time']}ms | 基线: 每小时 {metrics['baseline_rate']} 次，平均 {metrics['baseline_avg_time']}ms")
+    return {
+        "msg_type": "text",
+        "content": {
+            "text": f"{alert_title(now)}\n\n" + "\n".join(lines) +
+                    (f"\n\n共 {len(alerts)} 条告警，此处仅展示前{limit}条。" if len(alerts) > limit else "")
+        }
+    }
+
+
+def print_alerts(alerts):
+    """输出告警到控制台（常驻模式的日志）"""
+    for alert in alerts:
+        metrics = alert_metrics(alert)
+        print(f"[WARN] [{alert['instance_id']}] {truncate(alert['sql'], 100)} | {'；'.join(alert['reasons'])} | "
+              f"最近1小时 {alert['count']}次，平均 {metrics['avg_time']}ms，最大 {metrics['max_time']}ms | "
+              f"基线每小时 {metrics['baseline_rate']}次，平均 {metrics['baseline_avg_time']}ms")
@@ -0,0 +1,119 @@
+# slow_sql/replay.py
+# 录制与回放阿里云 API 响应：录制时把每一页的 JSON 压缩保存到目录中，回放时从目录读取，不访问网络
+#
+# 目录结构：
+#   manifest.json                          录制时间，回放时用它还原报告的时间范围
+#   <Action>/<请求参数摘要>.json.gz          每个请求（实例、时间窗口、页码）一个文件
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST = "manifest.json"
+MANIFEST_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# SDK 发送请求时会把这些公共参数写入查询参数，不参与摘要
+COMMON_PARAMS = ("Version", "Action", "Format")
+
+
+class ReplayMissError(Exception):
+    """回放目录中没有该请求的录制结果（录制时的时间范围、实例或分页与本次运行不一致）"""
+
+
+def request_key(request):
+    """返回 (Action, 请求参数摘要)；参数值统一转为字符串，SDK 请求对象与 ReplayRequest 得到相同的摘要"""
+    params = request.get_query_params()
+    raw = "&".join(f"{name}={params[name]}" for name in sorted(params) if name not in COMMON_PARAMS)
+    return request.get_action_name(), hashlib.sha1(raw.encode()).hexdigest()
+
+
+def response_path(directory, request):
+    action, digest = request_key(request)
+    return os.path.join(directory, action, digest + ".json.gz")
+
+
+def write_manifest(directory, now):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump({"now": now.strftime(MANIFEST_TIME_FORMAT)}, f)
+
+
+def read_manifest_time(directory):
+    """返回录制时的运行时间，回放时报告的时间范围与录制时一致"""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return datetime.datetime.strptime(json.load(f)["now"], MANIFEST_TIME_FORMAT)
+
+
+class RecordingClient(object):
+    """包装 AcsClient：正常调用 API，并将每个响应压缩保存到 directory"""
+
+    def __init__(self, client, directory):
+        self.client = client
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    def do_action_with_exception(self, request):
+        # 在发送前计算路径，SDK 发送时会修改请求的查询参数
+        path = response_path(self.directory, request)
+        response = self.client.do_action_with_exception(request)
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        body = response if isinstance(response, bytes) else response.encode()
+        # 先写临时文件再重命名，中断时不会留下不完整的录制结果
+        with gzip.open(path + ".tmp", "wb", compresslevel=6) as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        return response
+
+
+class ReplayClient(object):
+    """代替 AcsClient，从录制目录读取响应"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def do_action_with_exception(self, request):
+        path = response_path(self.directory, request)
+        try:
+            with gzip.open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            action, _ = request_key(request)
+            raise ReplayMissError(f"回放目录 {self.directory} 中没有 {action} 请求 {request.get_query_params()} 的录制结果")
+
+
+class ReplayRequest(object):
+    """
+    回放时代替 SDK 的请求类，不需要安装 SDK。
+
+    set_Xxx(value) 记录为查询参数 Xxx，与 SDK 请求对象的 get_query_params() 一致；
+    set_accept_format 在 SDK 中不是查询参数，这里同样忽略。
+    """
+
+    def __init__(self, action):
+        self.action = action
+        self.params = {}
+
+    def get_action_name(self):
+        return self.action
+
+    def get_query_params(self):
+        return self.params
+
+    def set_accept_format(self, value):
+        pass
+
+    def __getattr__(self, name):
+        if not name.startswith("set_"):
+            raise AttributeError(name)
+
+        def setter(value):
+            self.params[name[4:]] = value
+        return setter
+
+
+def replay_request_class(action):
+    """返回可以像 SDK 请求类一样无参数构造的类"""
+    return lambda: ReplayRequest(action)
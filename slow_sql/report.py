@@ -0,0 +1,387 @@
+# slow_sql/report.py
+# 慢SQL周报：拉取（或从本地存储读取）最近7天的慢日志记录，流式聚合评分后推送到飞书
+
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from slow_sql import aliyun, feishu, instrument, render
+from slow_sql.aggregator import (aggregate_page, build_rollups, merge_stats, merge_summary, new_stats, new_summary,
+                                 top_items)
+from slow_sql.analysis import AnalysisCache, open_analysis_cache
+from slow_sql.decoding import load_decoder
+from slow_sql.export import Exporter, iter_export_pages
+from slow_sql.fetcher import (PAGE_SIZE, describe_coverage, iter_pages, last_days, merge_coverage, new_coverage,
+                              utc_now)
+from slow_sql.heatmap import write_heatmap_csv
+from slow_sql.history import compare_weeks, init_history, save_week, week_key
+from slow_sql.ratelimit import limiter_from_config
+from slow_sql.replay import read_manifest_time, write_manifest
+from slow_sql.rules import Rules, RulesError, load_rules
+from slow_sql.settings import get_instances, get_webhooks, option, print_config
+from slow_sql.store import (count_records, get_synced_until, iter_store_pages, open_store, prune_records,
+                            save_page, set_synced_until)
+
+# DescribeSlowLogRecords 的时间格式（UTC，精确到分钟）
+API_TIME_FORMAT = "%Y-%m-%dT%H:%MZ"
+# 增量同步时回退的时间，补齐延迟写入的慢日志
+SYNC_OVERLAP = datetime.timedelta(hours=1)
+# 单个时间窗口最多获取50页，对应5000条记录
+MAX_PAGES = 50
+TOP_K = 200
+# 按表、数据库、账号、主机汇总时每个维度展示的项数
+ROLLUP_LIMIT = 10
+
+
+def collect(config, instances, window_start, window_end, store_path=None, sync_only=False, offline=False,
+            record_dir=None, replay_dir=None, clients=None, rules=None, exporter=None, export_source=None):
+    """
+    拉取并聚合所有实例的慢查询记录（超过分页上限的时间窗口自动二分，子窗口并发拉取，每页到达即处理）。
+
+    配置了 store_path 时先增量同步到本地存储，再从本地存储读取；offline 时不调用 API，只读本地存储。
+    AGGREGATE_PROCESSES 大于 1 时记录按 SQL 分片到多个工作进程聚合（见 parallel.ShardedAggregator）。
+    rules 为过滤规则（见 rules.Rules），未传入时使用默认规则。
+    exporter（见 export.Exporter）不为 None 时每页记录同时写入导出文件；export_source 为导出目录时不调用 API，基于导出的记录聚合。
+    record_dir / replay_dir 见 aliyun.create_clients；clients 为已创建的客户端（如与模板统计拉取共用），未传入时新建。
+    返回 {"summary", "stats", "coverage", "total_records", "instance_results", "failed_instances"}。
+    """
+    workers = option(config, "FETCH_WORKERS")
+    max_concurrent = option(config, "MAX_CONCURRENT_REQUESTS")
+    rules = rules or Rules()
+    if clients is None:
+        clients = {} if offline or export_source else aliyun.create_clients(config, instances, record_dir=record_dir, replay_dir=replay_dir)
+        if replay_dir:
+            print(f"[INFO] 回放模式，从 {replay_dir} 读取录制的API响应")
+        elif clients:
+            print(f"[INFO] 成功初始化阿里云客户端，共 {len(clients)} 个区域")
+    # 所有实例共享的请求速率和并发请求上限
+    request_limiter = limiter_from_config(config, replay=bool(replay_dir))
+    decode_page = None
+    if clients:
+        decoder_name, decode_page = load_decoder(option(config, "JSON_DECODER"))
+        print(f"[INFO] 使用 {decoder_name} 解析API响应")
+    processes = option(config, "AGGREGATE_PROCESSES")
+    sharded = None
+    if processes > 1 and not sync_only:
+        from slow_sql.parallel import ShardedAggregator
+        sharded = ShardedAggregator(processes, rules)
+        print(f"[INFO] 使用 {processes} 个进程聚合慢查询记录")
+
+    def process_instance(instance):
+        """拉取并聚合单个实例的慢查询记录，返回 (summary, stats, coverage, total_records)；多进程聚合时 summary 和 stats 为 None"""
+        # 本地存储的连接在这个工作线程中打开，记录读取和聚合完毕后关闭
+        store = open_store(store_path) if store_path else None
+        try:
+            return aggregate_instance(instance, store)
+        finally:
+            if store is not None:
+                store.close()
+
+    def aggregate_instance(instance, store):
+        instance_id = instance["instance_id"]
+        label = f"[{instance_id}] " if len(instances) > 1 else ""
+        summary = new_summary()
+        stats = new_stats()
+        coverage = new_coverage()
+
+        def fetch(sync_start):
+            return iter_pages(clients[instance["region_id"]], aliyun.slow_log_records_request_builder(instance_id, replay=bool(replay_dir)),
+                              "SQLSlowRecord", sync_start, window_end,
+                              API_TIME_FORMAT, datetime.timedelta(minutes=1), "ExecutionStartTime", coverage,
+                              page_size=PAGE_SIZE, max_pages=MAX_PAGES, workers=workers,
+                              limiter=request_limiter, label=label, decode_page=decode_page)
+
+        if store is not None:
+            if offline:
+                print(f"[INFO] {label}离线模式，直接读取本地存储 {store_path}")
+            else:
+                # 增量同步：只拉取本地存储高水位之后的时间段（回退 SYNC_OVERLAP 以补齐延迟写入的慢日志）
+                synced_until = get_synced_until(store, instance_id)
+                sync_start = window_start if synced_until is None else max(window_start, synced_until - SYNC_OVERLAP)
+                if sync_start < window_end:
+                    print(f"[INFO] {label}增量同步 {sync_start} ~ {window_end} 的慢查询记录到本地存储 {store_path}")
+                    for _, page_records in fetch(sync_start):
+                        with instrument.stage("store_write"):
+                            save_page(store, instance_id, page_records)
+                    # 高水位与常驻模式一样是真实的 UTC 时间，不超过当前时间（传入的窗口按本地时间计算时也不会跳过未拉取的记录）
+                    set_synced_until(store, instance_id, min(window_end, utc_now()))
+                    print(f"[INFO] {label}本次同步获取 {coverage['total_records']} 条记录，{describe_coverage(coverage)}")
+                else:
+                    print(f"[INFO] {label}本地存储已同步到 {synced_until}，无需调用API")
+            if sync_only:
+                return summary, stats, coverage, 0
+            total_records = count_records(store, instance_id, window_start, window_end)
+            pages = instrument.timed("store_read", iter_store_pages(store, instance_id, window_start, window_end))
+        elif export_source:
+            pages = count_pages(instrument.timed("export_read", iter_export_pages(export_source, instance_id, window_start,
+                                                                                  window_end)), coverage)
+        else:
+            pages = (page_records for _, page_records in fetch(window_start))
+        if exporter is not None:
+            pages = exporter.export_pages(instance_id, pages)
+
+        if sharded is not None:
+            sharded.feed(instance_id, pages)
+            return None, None, coverage, total_records if store_path else coverage["total_records"]
+        for page_index, page_records in enumerate(pages):
+            # 数据量很小时输出前几条记录的调试信息
+            with instrument.stage("aggregate"):
+                aggregate_page(summary, page_records, rules, stats,
+                               debug=page_index == 0 and len(page_records) < 10)
+        if not store_path:
+            total_records = coverage["total_records"]
+        print(f"[INFO] {label}已累计获取 {stats['fetched']} 条慢查询记录，聚合为 {len(summary)} 条SQL")
+        return summary, stats, coverage, total_records
+
+    result = {
+        "summary": new_summary(),
+        "stats": new_stats(),
+        "coverage": new_coverage(),
+        "total_records": 0,
+        "instance_results": {},  # 实例ID -> 该实例的统计，用于分实例概况
+        "failed_instances": [],
+    }
+
+    # 各实例并发拉取，实际请求速率和并发请求数由 request_limiter 统一限制
+    completed = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(instances), max_concurrent)) as executor:
+            futures = {executor.submit(process_instance, instance): instance["instance_id"] for instance in instances}
+            for future in as_completed(futures):
+                instance_id = futures[future]
+                try:
+                    completed.append((instance_id,) + future.result())
+                except Exception as e:
+                    print(f"[ERROR] [{instance_id}] 调用阿里云API失败: {e}")
+                    result["failed_instances"].append(instance_id)
+        # 多进程聚合时所有实例拉取完毕后才能取得各实例的聚合结果；拉取失败的实例已发送的记录不计入结果
+        partials = sharded.finish() if sharded is not None else {}
+    finally:
+        if sharded is not None:
+            sharded.close()
+
+    for instance_id, instance_summary, instance_stats, instance_coverage, instance_total in completed:
+        if sharded is not None:
+            instance_summary, instance_stats = partials.get(instance_id, (new_summary(), new_stats()))
+            label = f"[{instance_id}] " if len(instances) > 1 else ""
+            print(f"[INFO] {label}已累计获取 {instance_stats['fetched']} 条慢查询记录，聚合为 {len(instance_summary)} 条SQL")
+        with instrument.stage("merge"):
+            merge_summary(result["summary"], instance_summary, instance_id, rules.score)
+        merge_stats(result["stats"], instance_stats)
+        merge_coverage(result["coverage"], instance_coverage)
+        result["total_records"] += instance_total
+        result["instance_results"][instance_id] = {
+            "total_records": instance_total,
+            "fetched": instance_stats["fetched"],
+            "sql_count": len(instance_summary),
+            "total_time": sum(instance_summary.total_time),
+        }
+    return result
+
+
+def count_pages(pages, coverage):
+    """读取导出文件时没有 API 报告的总记录数，按实际读取的记录计数"""
+    for page_records in pages:
+        coverage["total_records"] += len(page_records)
+        yield page_records
+
+
+def compare_history(config, store_path, summary, top, window_start, failed_instances, formula=None):
+    """与本地保存的前几周聚合结果对比，并保存本周结果；没有本地存储时返回 None"""
+    if not store_path:
+        return None
+    history = init_history(open_store(store_path))
+    try:
+        week = week_key(window_start)
+        changes = compare_weeks(history, summary, top, week, weeks=option(config, "REGRESSION_BASELINE_WEEKS"),
+                                ratio=option(config, "REGRESSION_RATIO"))
+        print(f"[INFO] 周环比: 新增 {len(changes['new'])} 条，变慢 {len(changes['regressed'])} 条，好转 {len(changes['improved'])} 条")
+        if failed_instances:
+            print("[WARN] 部分实例拉取失败，本周聚合结果不保存到历史，避免影响之后的周环比")
+        else:
+            save_week(history, week, summary, formula)
+    finally:
+        history.close()
+    return changes
+
+
+def analyze_top(config, store_path, top, now=None):
+    """为 Top SQL 加上表、条件列、候选索引和全表扫描风险（见 analysis.py），解析结果按SQL指纹缓存"""
+    path = option(config, "ANALYSIS_CACHE_PATH") or store_path
+    cache = AnalysisCache(open_analysis_cache(path) if path else None, option(config, "ANALYSIS_CACHE_SIZE"), now)
+    try:
+        cache.annotate(top)
+    finally:
+        if cache.conn is not None:
+            cache.conn.close()
+    print(f"[INFO] SQL分析: 缓存命中 {cache.hits} 条，新解析 {cache.misses} 条")
+
+
+def export_heatmaps(config, summary, top, multi_instance):
+    """HEATMAP_CSV 不为 None 时将总体、各实例和 Top SQL 的时段分布写入 CSV"""
+    path = option(config, "HEATMAP_CSV")
+    if not path:
+        return
+    heatmaps = [("total", "", "", summary.heat_total)]
+    if multi_instance:
+        heatmaps += [("instance", instance_id, "", heat) for instance_id, heat in sorted(summary.instance_heat.items())]
+    heatmaps += [("sql", item["key"], item["sql"], item["heat"]) for item in top if item["heat"] is not None]
+    write_heatmap_csv(path, heatmaps, option(config, "HEATMAP_UTC_OFFSET"))
+    print(f"[INFO] 已将 {len(heatmaps)} 个时段分布写入 {path}")
+
+
+def build_report(config, instance_count, start_time, end_time, result, coverage_text, week_changes, top, rules=None):
+    """汇总 render 生成卡片、文本消息和控制台输出所需的数据"""
+    multi_instance = instance_count > 1
+    return {
+        "start_time": start_time,
+        "end_time": end_time,
+        "instance_count": instance_count,
+        "multi_instance": multi_instance,
+        "total_records": result["total_records"],
+        "stats": result["stats"],
+        "excluded_text": (rules or Rules()).describe(),
+        "coverage_text": coverage_text,
+        "instance_table": render.instance_table(result["instance_results"], result["failed_instances"]) if multi_instance else "",
+        "week_changes_text": render.format_week_changes(week_changes) if week_changes else "",
+        "rollup_tables": render.format_rollups(build_rollups(result["summary"], ROLLUP_LIMIT)),
+        "rollup_limit": ROLLUP_LIMIT,
+        "heatmaps": render.format_heatmaps(result["summary"], multi_instance, option(config, "HEATMAP_UTC_OFFSET")),
+        "utc_offset": option(config, "HEATMAP_UTC_OFFSET"),
+        "baseline_weeks": option(config, "REGRESSION_BASELINE_WEEKS"),
+        "top": top,
+    }
+
+
+def push_report(client, webhooks, report, max_bytes):
+    """并发推送卡片消息到所有群（超过 max_bytes 时拆分为多张卡片），卡片被飞书拒绝时改为发送简单文本消息"""
+    cards = render.build_report_cards(report, max_bytes)
+    print(f"[INFO] 发送 {len(cards)} 张卡片消息到飞书（{len(webhooks)} 个群）...")
+    sent = client.send_all(webhooks, cards, fallback=render.build_report_text(report))
+    print(f"[INFO] 已推送到 {sent}/{len(webhooks)} 个群")
+
+
+def run(config, sync_only=False, offline=False, dry_run=False, record_dir=None, replay_dir=None, export_source=None,
+        now=None):
+    """
+    生成并推送周报，返回进程退出码。
+
+    sync_only：只同步到本地存储，不生成报告（用于每日同步的定时任务）
+    offline：不调用阿里云 API，只基于本地存储生成报告（需要配置 STORE_PATH）
+    dry_run：生成报告但不推送到飞书
+    record_dir：将API响应录制到该目录
+    replay_dir：从录制目录回放API响应，时间范围与录制时一致；不读写本地存储，也不保存周环比历史
+    export_source：不调用阿里云 API，基于该目录中导出的记录（见 export.py）生成报告；不读写本地存储，也不再导出
+    """
+    instances = get_instances(config)
+    print_config(config, instances)
+    try:
+        rules = load_rules(config)
+    except RulesError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    webhooks = get_webhooks(config)
+    client = feishu.client_from_config(config)
+    if webhooks and not dry_run:
+        # 先补发之前运行未能发送的消息（仅同步的每日任务也会补发）
+        client.flush_outbox()
+    store_path = None if replay_dir or export_source else option(config, "STORE_PATH")
+    if offline and not store_path:
+        print("[ERROR] 离线模式需要配置 STORE_PATH")
+        return 1
+
+    if replay_dir:
+        now = read_manifest_time(replay_dir)
+    else:
+        # 查询窗口按 UTC 对齐：API 的时间参数以 Z 结尾，本地存储的同步高水位也是 UTC
+        now = now or utc_now()
+        if record_dir:
+            write_manifest(record_dir, now)
+            # 录制完整的时间范围，而不是本地存储高水位之后的增量
+            store_path = None
+    start_time, end_time, window_start, window_end = last_days(7, now)
+    print(f"[INFO] 查询时间范围: {window_start.strftime(API_TIME_FORMAT)} ~ {window_end.strftime(API_TIME_FORMAT)}")
+
+    export_dir = None if export_source or sync_only else option(config, "EXPORT_DIR")
+    exporter = None
+    if export_dir:
+        try:
+            exporter = Exporter(export_dir, option(config, "EXPORT_FORMAT"), now)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            return 1
+    if export_source:
+        print(f"[INFO] 基于导出目录 {export_source} 中的记录生成报告，不调用阿里云 API")
+    try:
+        result = collect(config, instances, window_start, window_end, store_path=store_path, sync_only=sync_only,
+                         offline=offline, record_dir=record_dir, replay_dir=replay_dir, rules=rules,
+                         exporter=exporter, export_source=export_source)
+    except ImportError as e:
+        print(f"[ERROR] 导入依赖失败: {e}")
+        print(f"[INFO] 请安装必要的依赖: {aliyun.INSTALL_HINT}")
+        return 1
+    if exporter is not None:
+        print(f"[INFO] 已{exporter.describe()}")
+    summary, stats, coverage = result["summary"], result["stats"], result["coverage"]
+    failed_instances = result["failed_instances"]
+
+    if len(failed_instances) == len(instances):
+        print("[ERROR] 所有实例均拉取失败")
+        return 1
+
+    if store_path and not offline:
+        retention_days = option(config, "STORE_RETENTION_DAYS")
+        store = open_store(store_path)
+        pruned = prune_records(store, window_start - datetime.timedelta(days=retention_days))
+        store.close()
+        if pruned:
+            print(f"[INFO] 已清理 {pruned} 条超过 {retention_days} 天的本地记录")
+    if sync_only:
+        print("[INFO] 仅同步模式，跳过报告生成")
+        return 0
+
+    # 离线模式没有调用 API，无法判断本地存储之外是否还有未获取的记录
+    if offline:
+        coverage_text = "离线模式，数据来自本地存储"
+    elif export_source:
+        coverage_text = f"数据来自导出目录 {export_source}"
+    else:
+        coverage_text = describe_coverage(coverage)
+    print(f"[INFO] 已累计获取 {stats['fetched']} 条慢查询记录，{coverage_text}")
+
+    if not stats["fetched"]:
+        print("[WARN] 没有找到满足条件的慢查询记录")
+        return 0
+
+    print(f"[INFO] 共获取到 {stats['fetched']} 条慢查询记录，聚合为 {len(summary)} 条SQL")
+    print(f"[INFO] 按过滤规则（{rules.describe()}）排除了 {stats['excluded']} 条记录")
+
+    # === 按评分公式计算综合评分并选出 Top 200（整列计算评分，部分选择代替全量排序） ===
+    with instrument.stage("score"):
+        top = top_items(summary, TOP_K, rules.score)
+    print(f"[INFO] 生成了 {len(top)} 条聚合的慢查询数据")
+
+    with instrument.stage("history"):
+        week_changes = compare_history(config, store_path, summary, top, window_start, failed_instances, rules.score)
+    with instrument.stage("analysis"):
+        analyze_top(config, store_path, top, now)
+    export_heatmaps(config, summary, top, len(instances) > 1)
+
+    with instrument.stage("render"):
+        report = build_report(config, len(instances), start_time, end_time, result, coverage_text, week_changes, top,
+                              rules)
+
+    # === 推送到飞书群 ===
+    webhook = getattr(config, "FEISHU_WEBHOOK", "")
+    if not top:
+        print("[INFO] 没有慢查询数据，跳过推送")
+    elif dry_run:
+        print("[INFO] 演练模式，跳过推送")
+    elif webhooks:
+        push_report(client, webhooks, report, option(config, "FEISHU_CARD_MAX_BYTES"))
+    elif not webhook:
+        print("[WARN] 飞书 Webhook URL 为空，跳过推送")
+    else:
+        print("[WARN] 飞书 Webhook URL 未配置，跳过推送")
+
+    render.print_report(report)
+    return 0
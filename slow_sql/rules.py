@@ -0,0 +1,217 @@
+# slow_sql/rules.py
+# 过滤和评分规则：从 JSON 规则文件（RULES_FILE）读取，启动时编译一次。
+# 账号、数据库、主机编译为集合查找，SQL 正则合并为一个正则，耗时阈值为一次比较，规则再多每条记录的判断开销也基本不变。
+# SQL 正则匹配的是 SQL 指纹（见 fingerprint.py：小写、字面量替换为 ?、压缩空白），同一类SQL的结果相同，可以按SQL键缓存
+#
+# 规则文件示例（各项都可以省略）:
+#   {
+#     "exclude": {
+#       "users": ["risk_dw_bin_ro"],
+#       "dbs": ["test"],
+#       "hosts": ["10.0.0.5"],
+#       "sql_patterns": ["^\\s*select\\s+sleep\\(", "information_schema"]
+#     },
+#     "min_query_time_ms": 1000,
+#     "score": "total_time * max(1, sqrt(avg_scan_rows) / 10)"
+#   }
+
+import ast
+import json
+import math
+import re
+import sys
+
+from slow_sql.fingerprint import fingerprint, fingerprint_key
+from slow_sql.settings import option
+
+# 综合评分 = 平均执行时间 × 执行次数 × max(1, sqrt(平均扫描行数) / 10)，即 总耗时 × 扫描行数系数
+DEFAULT_SCORE = "total_time * max(1, sqrt(avg_scan_rows) / 10)"
+# 未配置规则文件时的规则
+DEFAULT_RULES = {"exclude": {"users": ["risk_dw_bin_ro"]}, "score": DEFAULT_SCORE}
+EXCLUDE_FIELDS = ("users", "dbs", "hosts", "sql_patterns")
+# 评分公式可以使用的变量（每条SQL的聚合值；平均值按执行次数计算，执行次数为0时按1计算）和函数
+SCORE_VARIABLES = ("count", "total_time", "avg_time", "max_time", "total_scanned_rows", "avg_scan_rows",
+                   "total_parse_rows", "avg_parse_rows", "total_return_rows", "avg_return_rows")
+SCORE_FUNCTIONS = ("sqrt", "log", "max", "min", "abs")
+# Python 3.8 之前数字常量解析为 ast.Num（值在 n 属性中），3.8 起为 ast.Constant
+CONSTANT_NODES = (ast.Constant,) if sys.version_info >= (3, 8) else (ast.Constant, ast.Num)
+SCORE_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load,
+               ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv, ast.USub, ast.UAdd) + CONSTANT_NODES
+# SQL 正则的判断结果按 SQL 键缓存，缓存的键数超过这个数量时清空（常驻模式长时间运行）
+SQL_CACHE_SIZE = 200000
+
+
+class RulesError(ValueError):
+    """规则文件格式错误，或评分公式中有不支持的写法"""
+
+
+def constant_value(node):
+    return node.value if isinstance(node, ast.Constant) else node.n
+
+
+class ScoreFormula(object):
+    """
+    评分公式，编译为 lambda 变量...: 公式。
+
+    scalar 逐行计算（函数为 math.sqrt、内置 max 等）；vectorized(np) 返回对整列计算的版本
+    （函数换成 np.sqrt、np.maximum 等，同一个公式两种方式的结果一致）。names 为公式用到的变量。
+    某一行无法计算（除以0、对0取对数、溢出）时这一行的评分为0：scalar 捕获异常，vectorized 将 inf、nan 换成0。
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as e:
+            raise RulesError(f"评分公式 {expression!r} 有语法错误: {e.msg}")
+        names = []
+        for node in ast.walk(tree):
+            if not isinstance(node, SCORE_NODES):
+                raise RulesError(f"评分公式 {expression!r} 中不支持 {type(node).__name__}")
+            if isinstance(node, CONSTANT_NODES) and not isinstance(constant_value(node), (int, float)):
+                raise RulesError(f"评分公式 {expression!r} 中只能使用数字常量")
+            if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in SCORE_FUNCTIONS
+                                               or node.keywords):
+                raise RulesError(f"评分公式 {expression!r} 中只能调用 {', '.join(SCORE_FUNCTIONS)}")
+            if isinstance(node, ast.Name) and node.id not in SCORE_FUNCTIONS:
+                if node.id not in SCORE_VARIABLES:
+                    raise RulesError(f"评分公式 {expression!r} 中的 {node.id} 不是可用的变量（{', '.join(SCORE_VARIABLES)}）")
+                if node.id not in names:
+                    names.append(node.id)
+        self.names = tuple(names)
+        self.source = f"lambda {', '.join(self.names)}: {expression}"
+        function = eval(self.source, {"__builtins__": {}, "sqrt": math.sqrt, "log": math.log,
+                                      "max": max, "min": min, "abs": abs})
+
+        def scalar(*values):
+            try:
+                return function(*values)
+            except (ArithmeticError, ValueError):
+                return 0.0
+        self.scalar = scalar
+        self.vector = None
+        # 启动时分别用全为1和全为0的变量计算一次，公式本身的错误（如调用参数个数不对）和变量为0时的
+        # 除以0、对0取对数不会等到生成报告时才暴露
+        for sample in (1.0, 0.0):
+            try:
+                function(*(sample for _ in self.names))
+            except Exception as e:
+                hint = "（可以用 max(1, 变量) 避免除以0或对0取对数）" if sample == 0 else ""
+                raise RulesError(f"评分公式 {expression!r} 在变量为 {sample:g} 时无法计算: {e}{hint}")
+
+    def vectorized(self, np):
+        if self.vector is None:
+            function = eval(self.source, {"__builtins__": {}, "sqrt": np.sqrt, "log": np.log,
+                                          "max": np.maximum, "min": np.minimum, "abs": np.abs})
+
+            def vector(*columns):
+                with np.errstate(all="ignore"):
+                    return np.nan_to_num(function(*columns), nan=0.0, posinf=0.0, neginf=0.0)
+            self.vector = vector
+        return self.vector
+
+
+def host_ip(host):
+    """HostAddress 可能是 "账号[账号] @  [10.0.0.1]" 的形式，取最后一对方括号中的地址"""
+    end = host.rfind("]")
+    return host[host.rfind("[", 0, end) + 1:end] if end > 0 else host
+
+
+class Rules(object):
+    """
+    编译后的过滤和评分规则。
+
+    excluded(record, sql) 判断一条 SlowRecord 是否被过滤：账号、数据库、主机在集合中，
+    耗时低于 min_query_time_ms，或SQL匹配任一 sql_patterns（不区分大小写）。
+    所有 SQL 正则合并为一个，匹配SQL指纹而不是原始文本，结果只取决于SQL键（SQLHash 或指纹），
+    同一SQL只对第一次出现的语句做匹配，结果缓存。
+    score 为评分公式（见 ScoreFormula）。
+    """
+
+    def __init__(self, spec=None):
+        self.spec = DEFAULT_RULES if spec is None else spec
+        if not isinstance(self.spec, dict):
+            raise RulesError("规则文件的内容应为 JSON 对象")
+        exclude = self.spec.get("exclude", {})
+        unknown = set(exclude) - set(EXCLUDE_FIELDS)
+        if unknown:
+            raise RulesError(f"不支持的过滤项: {', '.join(sorted(unknown))}（可用: {', '.join(EXCLUDE_FIELDS)}）")
+        for field in EXCLUDE_FIELDS:
+            if not isinstance(exclude.get(field, []), list):
+                raise RulesError(f"过滤项 {field} 应为列表")
+        self.users = frozenset(exclude.get("users", ()))
+        self.dbs = frozenset(exclude.get("dbs", ()))
+        self.hosts = frozenset(exclude.get("hosts", ()))
+        self.sql_patterns = list(exclude.get("sql_patterns", ()))
+        for pattern in self.sql_patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise RulesError(f"SQL正则 {pattern!r} 有误: {e}")
+        # 每个正则放在非捕获组中再用 | 连接，一次 search 判断是否匹配任一正则
+        self.sql_re = re.compile("|".join(f"(?:{pattern})" for pattern in self.sql_patterns), re.I) \
+            if self.sql_patterns else None
+        self.min_query_time_ms = float(self.spec.get("min_query_time_ms", 0))
+        self.score = ScoreFormula(self.spec.get("score", DEFAULT_SCORE))
+        self.sql_cache = {}
+        self.excluded = self.compile_filter()
+
+    def __reduce__(self):
+        # 编译后的函数不能序列化，传给聚合进程时按原始规则重新编译
+        return Rules, (self.spec,)
+
+    def compile_filter(self):
+        """返回 excluded(record, sql)；没有配置的过滤项不做判断"""
+        users, dbs, hosts, sql_re = self.users, self.dbs, self.hosts, self.sql_re
+        min_time = self.min_query_time_ms
+        cache = self.sql_cache
+
+        def excluded(record, sql):
+            if record.AccountName in users:
+                return True
+            if dbs and record.DBName in dbs:
+                return True
+            if hosts:
+                host = record.HostAddress or ""
+                if host in hosts or host_ip(host) in hosts:
+                    return True
+            if min_time and float(record.QueryTimeMS) < min_time:
+                return True
+            if sql_re is not None:
+                key = record.SQLHash or fingerprint_key(sql)
+                hit = cache.get(key)
+                if hit is None:
+                    if len(cache) >= SQL_CACHE_SIZE:
+                        cache.clear()
+                    hit = cache[key] = sql_re.search(fingerprint(sql)) is not None
+                return hit
+            return False
+        return excluded
+
+    def describe(self):
+        """过滤规则的简短说明，用于报告中“排除了 N 条...的记录”"""
+        parts = []
+        if self.users:
+            parts.append(f"账号 {', '.join(sorted(self.users))}")
+        if self.dbs:
+            parts.append(f"数据库 {', '.join(sorted(self.dbs))}")
+        if self.hosts:
+            parts.append(f"主机 {', '.join(sorted(self.hosts))}")
+        if self.sql_patterns:
+            parts.append(f"{len(self.sql_patterns)} 条SQL正则")
+        if self.min_query_time_ms:
+            parts.append(f"耗时低于 {self.min_query_time_ms:g}ms")
+        return "，".join(parts) or "无"
+
+
+def load_rules(config):
+    """按 RULES_FILE 读取并编译规则，未配置时使用 DEFAULT_RULES；文件不存在或格式错误时抛出 RulesError"""
+    path = option(config, "RULES_FILE")
+    if not path:
+        return Rules()
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulesError(f"读取规则文件 {path} 失败: {e}")
+    return Rules(spec)
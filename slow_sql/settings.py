@@ -0,0 +1,80 @@
+# slow_sql/settings.py
+# 读取 config.py 中的配置，可选配置项在这里给出默认值
+
+import importlib
+
+# 可选配置及默认值
+DEFAULTS = {
+    "FETCH_WORKERS": 4,  # 并发拉取分页的线程数
+    "STORE_PATH": None,  # 本地慢日志存储路径，配置后增量同步，报告基于本地存储生成
+    "STORE_RETENTION_DAYS": 30,
+    "MAX_CONCURRENT_REQUESTS": 8,  # 所有实例合计的最大并发请求数
+    "API_RATE_LIMIT": 20,  # 所有实例合计每秒最多发出的请求数（每个API分别计算，见 ratelimit.py），被限流时自动降低，None 为不限速
+    "API_THROTTLE_TIMEOUT": 600,  # 同一个请求持续被限流超过该秒数时放弃该实例
+    "AGGREGATE_PROCESSES": 0,  # 聚合记录的工作进程数，0 或 1 时在主进程中聚合
+    "REGRESSION_BASELINE_WEEKS": 4,  # 周环比的基线周数
+    "REGRESSION_RATIO": 1.5,  # 判定为变慢/好转的倍数
+    "RULES_FILE": None,  # 过滤和评分规则文件（JSON，见 rules.py），未配置时排除 risk_dw_bin_ro 账号、按默认公式评分
+    "ANALYSIS_CACHE_PATH": None,  # SQL 分析结果的缓存（SQLite，见 analysis.py），为 None 时与 STORE_PATH 共用，都未配置时只在内存中缓存
+    "ANALYSIS_CACHE_SIZE": 20000,  # 缓存的SQL指纹数上限，超过时淘汰最近最少使用的
+    "EXPORT_DIR": None,  # 导出原始记录和每日聚合的目录（见 export.py），为 None 时不导出
+    "EXPORT_FORMAT": "auto",  # 导出格式：auto（安装了 pyarrow 时为 parquet，否则为 csv）/ parquet / csv
+    "HEATMAP_UTC_OFFSET": 8,  # 时段分布展示的时区（相对 UTC 的小时数），慢日志时间为 UTC
+    "HEATMAP_CSV": None,  # 时段分布导出的 CSV 路径（见 heatmap.py），为 None 时不导出
+    "JSON_DECODER": "auto",  # 解析 API 响应的后端：auto / msgspec / orjson / json
+    "FEISHU_WEBHOOKS": [],  # 同时推送的多个飞书群 Webhook，与 FEISHU_WEBHOOK 合并
+    "FEISHU_CONNECT_TIMEOUT": 5,  # 推送的连接超时（秒）
+    "FEISHU_READ_TIMEOUT": 15,  # 推送的读取超时（秒）
+    "FEISHU_MAX_RETRIES": 3,  # 网络错误、HTTP 429/5xx 和限流时的最大重试次数
+    "FEISHU_CARD_MAX_BYTES": 20000,  # 每张卡片序列化后的字节数上限，超过时拆分为多张卡片
+    "FEISHU_SEND_INTERVAL": 0.5,  # 向同一个群连续发送多张卡片的间隔（秒）
+    "DAEMON_POLL_INTERVAL": 300,  # 常驻模式的拉取间隔（秒）
+    "DAEMON_MAX_KEYS": 50000,  # 常驻模式每个滑动窗口最多单独统计的SQL数，超出的计入“其他”
+    "ALERT_MIN_EXECUTIONS": 30,  # 最近1小时执行次数达到该值的SQL才检查告警
+    "ALERT_RATE_RATIO": 5,  # 最近1小时执行次数达到过去7天每小时平均的该倍数时告警
+    "ALERT_LATENCY_RATIO": 3,  # 最近1小时平均耗时达到过去24小时平均耗时的该倍数时告警
+    "ALERT_MIN_LATENCY_MS": 1000,  # 最近1小时平均耗时低于该值（毫秒）时不做耗时告警
+    "ALERT_COOLDOWN_MINUTES": 60,  # 同一条SQL两次告警的最短间隔（分钟）
+    "OUTBOX_DIR": "outbox",  # 推送失败的消息写入的发件箱目录，下次运行时补发；为 None 时不保存
+    "METRICS_LOG": None,  # 运行指标（各阶段耗时、计数、峰值内存，见 instrument.py）追加写入的 JSON lines 文件，为 None 时只输出到控制台
+    "METRICS_TEXTFILE": None,  # 运行指标写入的 Prometheus textfile（node_exporter），路径中的 {command} 替换为子命令名
+}
+
+
+def load_config(name="config"):
+    """导入配置模块（默认为当前目录下的 config.py），不存在时抛出 ImportError"""
+    return importlib.import_module(name)
+
+
+def option(config, name):
+    return getattr(config, name, DEFAULTS[name])
+
+
+def get_webhooks(config):
+    """要推送的 Webhook 列表：FEISHU_WEBHOOK 与 FEISHU_WEBHOOKS 合并去重，忽略空值和未填写的占位值"""
+    webhooks = [getattr(config, "FEISHU_WEBHOOK", "")] + list(option(config, "FEISHU_WEBHOOKS"))
+    return [webhook for index, webhook in enumerate(webhooks)
+            if webhook and webhook != "YOUR_FEISHU_WEBHOOK_URL" and webhook not in webhooks[:index]]
+
+
+def get_instances(config):
+    """
+    读取要查询的实例列表：优先使用 DB_INSTANCES（[{"instance_id": ..., "region_id": ...}, ...]），
+    未配置时退回单实例的 DB_INSTANCE_ID / REGION_ID
+    """
+    instances = getattr(config, "DB_INSTANCES", None)
+    if instances:
+        return [{"instance_id": item["instance_id"], "region_id": item.get("region_id", config.REGION_ID)}
+                for item in instances]
+    return [{"instance_id": config.DB_INSTANCE_ID, "region_id": config.REGION_ID}]
+
+
+def print_config(config, instances):
+    """显示配置信息（敏感信息部分隐藏）"""
+    access_key_id = config.ACCESS_KEY_ID
+    print(f"[DEBUG] 实例数: {len(instances)}")
+    for instance in instances:
+        print(f"[DEBUG] 区域: {instance['region_id']}, 实例ID: {instance['instance_id']}")
+    print(f"[DEBUG] ACCESS_KEY_ID: {access_key_id[:4]}{'*' * (len(access_key_id) - 8)}{access_key_id[-4:]}")
+    webhooks = get_webhooks(config)
+    print(f"[DEBUG] FEISHU_WEBHOOK: {f'已配置 {len(webhooks)} 个' if webhooks else '未配置'}")
@@ -0,0 +1,69 @@
+# slow_sql/sketch.py
+# 可合并的分位数草图（DDSketch 思路）：按对数分桶计数，分位数的相对误差不超过 RELATIVE_ACCURACY
+
+import math
+
+RELATIVE_ACCURACY = 0.02  # 分位数相对误差 2%
+MAX_BINS = 128  # 每个草图最多保留的桶数，超过时合并最低的桶，保证每个 SQL 的内存占用有上限
+
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+
+class QuantileSketch(object):
+    """
+    值 v 落入第 ceil(log_gamma(v)) 号桶，同一桶内的值相对误差不超过 RELATIVE_ACCURACY。
+    桶计数可以直接相加，因此不同分页、天、实例的草图合并后与整体计算的结果一致。
+    0 和负数单独计数（如扫描行数为 0）。
+    """
+
+    __slots__ = ("bins", "count", "zero_count")
+
+    def __init__(self):
+        self.bins = {}
+        self.count = 0
+        self.zero_count = 0
+
+    def add(self, value, weight=1):
+        self.count += weight
+        if value <= 0:
+            self.zero_count += weight
+            return
+        index = int(math.ceil(math.log(value) / LOG_GAMMA))
+        bins = self.bins
+        if index in bins:
+            bins[index] += weight
+        else:
+            bins[index] = weight
+            if len(bins) > MAX_BINS:
+                self._collapse()
+
+    def merge(self, other):
+        self.count += other.count
+        self.zero_count += other.zero_count
+        bins = self.bins
+        for index, weight in other.bins.items():
+            bins[index] = bins.get(index, 0) + weight
+        if len(bins) > MAX_BINS:
+            self._collapse()
+
+    def _collapse(self):
+        """合并最低的桶：只损失低分位数的精度，p95/p99 等高分位数不受影响"""
+        indexes = sorted(self.bins)
+        overflow = indexes[:len(indexes) - MAX_BINS + 1]
+        target = indexes[len(overflow)]
+        self.bins[target] += sum(self.bins.pop(index) for index in overflow)
+
+    def quantile(self, q):
+        """返回第 q 分位数（0 <= q <= 1）的估计值，草图为空时返回 0"""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * GAMMA ** index / (GAMMA + 1)
+        return 2 * GAMMA ** max(self.bins) / (GAMMA + 1)
@@ -0,0 +1,142 @@
+# slow_sql/statistics.py
+# 使用 DescribeSlowLogs API 查询 RDS 实例的慢日志统计情况
+
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from slow_sql import aliyun, feishu, render
+from slow_sql.fetcher import PAGE_SIZE, describe_coverage, fetch_records, last_days, merge_coverage, new_coverage
+from slow_sql.ratelimit import limiter_from_config
+from slow_sql.replay import read_manifest_time, write_manifest
+from slow_sql.settings import get_instances, get_webhooks, option, print_config
+
+# DescribeSlowLogs 的时间格式（UTC，精确到天）
+API_TIME_FORMAT = "%Y-%m-%dZ"
+# 单个时间窗口最多获取20页数据
+MAX_PAGES = 20
+
+
+def collect(config, instances, window_start, window_end, record_dir=None, replay_dir=None, clients=None):
+    """
+    并发拉取所有实例的慢查询统计记录（超过分页上限的时间窗口按天二分，子窗口并发拉取），每条记录标注所属实例。
+
+    record_dir / replay_dir 见 aliyun.create_clients；clients 为已创建的客户端（如与明细拉取共用），未传入时新建。
+    返回 (records, coverage, failed_instances)。
+    """
+    workers = option(config, "FETCH_WORKERS")
+    max_concurrent = option(config, "MAX_CONCURRENT_REQUESTS")
+    if clients is None:
+        clients = aliyun.create_clients(config, instances, record_dir=record_dir, replay_dir=replay_dir)
+        if replay_dir:
+            print(f"[INFO] 回放模式，从 {replay_dir} 读取录制的API响应")
+        else:
+            print(f"[INFO] 成功初始化阿里云客户端，共 {len(clients)} 个区域")
+    # 所有实例共享的请求速率和并发请求上限
+    request_limiter = limiter_from_config(config, replay=bool(replay_dir))
+
+    def fetch_instance(instance):
+        """拉取单个实例的慢查询统计记录，每条记录标注所属实例"""
+        instance_id = instance["instance_id"]
+        build_request = aliyun.slow_logs_request_builder(instance_id, replay=bool(replay_dir))
+        pages, coverage = fetch_records(clients[instance["region_id"]], build_request, "SQLSlowLog",
+                                        window_start, window_end, API_TIME_FORMAT, datetime.timedelta(days=1), "CreateTime",
+                                        page_size=PAGE_SIZE, max_pages=MAX_PAGES, workers=workers,
+                                        limiter=request_limiter, label=f"[{instance_id}] " if len(instances) > 1 else "")
+        records = [record for page in pages for record in page]
+        for record in records:
+            record["DBInstanceId"] = instance_id
+        return records, coverage
+
+    records = []
+    coverage = new_coverage()
+    failed_instances = []
+
+    # 各实例并发拉取，实际请求速率和并发请求数由 request_limiter 统一限制
+    with ThreadPoolExecutor(max_workers=min(len(instances), max_concurrent)) as executor:
+        futures = {executor.submit(fetch_instance, instance): instance["instance_id"] for instance in instances}
+        for future in as_completed(futures):
+            instance_id = futures[future]
+            try:
+                instance_records, instance_coverage = future.result()
+            except Exception as e:
+                print(f"[ERROR] [{instance_id}] 调用阿里云 DescribeSlowLogs API 失败: {e}")
+                failed_instances.append(instance_id)
+                continue
+            records.extend(instance_records)
+            merge_coverage(coverage, instance_coverage)
+    return records, coverage, failed_instances
+
+
+def push_statistics(client, webhooks, cards):
+    sent = client.send_all(webhooks, cards)
+    if sent == len(webhooks):
+        print("[INFO] 成功发送慢SQL统计报告到飞书")
+    else:
+        print(f"[ERROR] 慢SQL统计报告只推送到 {sent}/{len(webhooks)} 个群")
+
+
+def run(config, dry_run=False, record_dir=None, replay_dir=None, now=None):
+    """
+    生成并推送慢日志统计报告，返回进程退出码。
+
+    dry_run 时不推送到飞书；record_dir / replay_dir 录制或回放API响应，回放时时间范围与录制时一致。
+    """
+    instances = get_instances(config)
+    print_config(config, instances)
+    webhooks = get_webhooks(config)
+    client = feishu.client_from_config(config)
+    if webhooks and not dry_run:
+        client.flush_outbox()
+    if replay_dir:
+        now = read_manifest_time(replay_dir)
+    elif record_dir:
+        now = now or datetime.datetime.now()
+        write_manifest(record_dir, now)
+
+    start_time, end_time, window_start, window_end = last_days(7, now)  # 默认查询最近7天
+    print(f"[INFO] 查询时间范围: {window_start.strftime(API_TIME_FORMAT)} ~ {window_end.strftime(API_TIME_FORMAT)}")
+
+    try:
+        records, coverage, failed_instances = collect(config, instances, window_start, window_end,
+                                                      record_dir=record_dir, replay_dir=replay_dir)
+    except ImportError as e:
+        print(f"[ERROR] 导入依赖失败: {e}")
+        print(f"[INFO] 请安装必要的依赖: {aliyun.INSTALL_HINT} requests")
+        return 1
+
+    if len(failed_instances) == len(instances):
+        print("[ERROR] 所有实例均拉取失败")
+        return 1
+
+    print(f"[INFO] 已累计获取 {len(records)} 条慢查询统计记录，{describe_coverage(coverage)}")
+    if failed_instances:
+        print(f"[WARN] 以下实例拉取失败: {', '.join(failed_instances)}")
+
+    if not records:
+        print("[WARN] 没有找到满足条件的慢查询统计记录")
+        return 0
+
+    print(f"[INFO] 共获取到 {len(records)} 条慢查询统计记录")
+
+    # 按SQL模板的执行次数排序
+    statistics = {
+        "start_time": start_time,
+        "end_time": end_time,
+        "instance_count": len(instances),
+        "multi_instance": len(instances) > 1,
+        "failed_instances": failed_instances,
+        "coverage_text": describe_coverage(coverage),
+        "records": sorted(records, key=lambda x: int(x.get('MySQLTotalExecutionCounts', 0)), reverse=True),
+    }
+    print(render.build_statistics_markdown(statistics))
+
+    # === 推送到飞书群 ===
+    if dry_run:
+        print("[INFO] 演练模式，跳过推送")
+    elif webhooks:
+        push_statistics(client, webhooks, render.build_statistics_cards(statistics, option(config, "FEISHU_CARD_MAX_BYTES")))
+    else:
+        print("[INFO] 没有配置飞书 Webhook 或没有找到慢查询记录，跳过发送")
+
+    print("[INFO] 慢查询统计报告生成完成")
+    return 0
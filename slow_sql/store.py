@@ -0,0 +1,120 @@
+# slow_sql/store.py
+# 本地 SQLite 慢日志存储：保存已拉取的 SQLSlowRecord，并按实例记录已同步到的时间（高水位）
+
+import datetime
+import hashlib
+import sqlite3
+from operator import attrgetter
+
+from slow_sql.decoding import SLOW_RECORD_FIELDS, SlowRecord
+
+# 存储的字段与 SQLSlowRecord 字段的对应关系
+RECORD_FIELDS = (
+    ("execution_start_time", "ExecutionStartTime"),
+    ("sql_hash", "SQLHash"),
+    ("sql_text", "SQLText"),
+    ("query_time_ms", "QueryTimeMS"),
+    ("scan_rows", "ScanRows"),
+    ("return_row_counts", "ReturnRowCounts"),
+    ("parse_row_counts", "ParseRowCounts"),
+    ("account_name", "AccountName"),
+    ("db_name", "DBName"),
+    ("host_address", "HostAddress"),
+    ("query_times", "QueryTimes"),
+)
+
+# 依次取出 RECORD_FIELDS 对应的 SlowRecord 字段值
+record_values = attrgetter(*(field for _, field in RECORD_FIELDS))
+# 按 SlowRecord 的字段顺序读取，NULL 取 SlowRecord 的缺省值
+FIELD_COLUMNS = {field: column for column, field in RECORD_FIELDS}
+SELECT_COLUMNS = ", ".join(f"IFNULL({FIELD_COLUMNS[name]}, {default!r})" for name, default in SLOW_RECORD_FIELDS)
+
+# 与 ExecutionStartTime 一致的存储格式，字符串比较即时间比较
+STORE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slow_records (
+    instance_id TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    execution_start_time TEXT,
+    sql_hash TEXT,
+    sql_text TEXT,
+    query_time_ms REAL,
+    scan_rows INTEGER,
+    return_row_counts INTEGER,
+    parse_row_counts INTEGER,
+    account_name TEXT,
+    db_name TEXT,
+    host_address TEXT,
+    query_times INTEGER,
+    PRIMARY KEY (instance_id, record_key)
+);
+CREATE INDEX IF NOT EXISTS idx_slow_records_time ON slow_records (instance_id, execution_start_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    instance_id TEXT PRIMARY KEY,
+    synced_until TEXT NOT NULL
+);
+"""
+
+
+def open_store(path):
+    """每个线程需要单独打开连接；多个实例并发同步时写入会排队等待"""
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_key(record):
+    """慢日志记录没有唯一ID，用各字段的摘要去重（重复同步的重叠区间不会产生重复记录）"""
+    raw = "\x1f".join(str(value) for value in record_values(record))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_synced_until(conn, instance_id):
+    row = conn.execute("SELECT synced_until FROM sync_state WHERE instance_id = ?", (instance_id,)).fetchone()
+    return datetime.datetime.strptime(row[0], STORE_TIME_FORMAT) if row else None
+
+
+def set_synced_until(conn, instance_id, synced_until):
+    """整段时间同步成功后更新高水位"""
+    conn.execute("INSERT OR REPLACE INTO sync_state (instance_id, synced_until) VALUES (?, ?)",
+                 (instance_id, synced_until.strftime(STORE_TIME_FORMAT)))
+    conn.commit()
+
+
+def save_page(conn, instance_id, records):
+    columns = ", ".join(column for column, _ in RECORD_FIELDS)
+    placeholders = ", ".join("?" for _ in range(len(RECORD_FIELDS) + 2))
+    conn.executemany(
+        f"INSERT OR IGNORE INTO slow_records (instance_id, record_key, {columns}) VALUES ({placeholders})",
+        ((instance_id, record_key(record)) + record_values(record) for record in records))
+    # 每页提交一次，避免长事务阻塞其他实例的写入；高水位仍在整段同步成功后才更新
+    conn.commit()
+
+
+def iter_store_pages(conn, instance_id, start_time, end_time, page_size=1000):
+    """按页读取 [start_time, end_time) 内的记录，还原为 SlowRecord"""
+    cursor = conn.execute(
+        f"SELECT {SELECT_COLUMNS} FROM slow_records WHERE instance_id = ? AND execution_start_time >= ? AND execution_start_time < ?",
+        (instance_id, start_time.strftime(STORE_TIME_FORMAT), end_time.strftime(STORE_TIME_FORMAT)))
+    while True:
+        rows = cursor.fetchmany(page_size)
+        if not rows:
+            break
+        yield [SlowRecord._make(row) for row in rows]
+
+
+def count_records(conn, instance_id, start_time, end_time):
+    row = conn.execute(
+        "SELECT COUNT(*) FROM slow_records WHERE instance_id = ? AND execution_start_time >= ? AND execution_start_time < ?",
+        (instance_id, start_time.strftime(STORE_TIME_FORMAT), end_time.strftime(STORE_TIME_FORMAT))).fetchone()
+    return row[0]
+
+
+def prune_records(conn, before):
+    """删除早于 before 的记录，控制本地存储大小"""
+    deleted = conn.execute("DELETE FROM slow_records WHERE execution_start_time < ?",
+                           (before.strftime(STORE_TIME_FORMAT),)).rowcount
+    conn.commit()
+    return deleted
@@ -0,0 +1,287 @@
+# slow_sql/synthetic.py
+# 合成慢日志：按 DescribeSlowLogRecords 的分页协议生成一周的记录（以及由同一批记录汇总的 DescribeSlowLogs 模板统计），
+# 用于没有线上数据时的性能测试和回放
+#
+# 用法（生成可以用 report --replay 回放的录制目录）:
+#   python -m slow_sql.synthetic --records 2000000 --instances rm-syn1,rm-syn2 --output synthetic_week
+
+import argparse
+import bisect
+import datetime
+import hashlib
+import json
+import math
+import random
+import threading
+from array import array
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+API_TIME_FORMAT = "%Y-%m-%dT%H:%MZ"
+# DescribeSlowLogs 的时间格式（精确到天）
+DAY_FORMAT = "%Y-%m-%dZ"
+
+TABLES = ("orders", "order_items", "users", "payments", "coupons", "inventory", "shipments", "audit_log",
+          "sessions", "products", "refunds", "messages")
+STATUSES = ("'PAID'", "'NEW'", "'CANCELLED'", "'REFUNDED'", "'SHIPPED'")
+DB_NAMES = ("shop", "shop_archive", "billing", "user_center", "logistics", "marketing")
+ACCOUNTS = ("app_rw", "app_ro", "report", "risk_dw_bin_ro", "ops", "etl", "billing_rw", "admin")
+HOST_COUNT = 40
+HOSTS_PER_TEMPLATE = 8
+# 约 10% 的记录没有 SQLHash（部分引擎版本不返回），聚合时需要计算SQL指纹
+MISSING_HASH_RATIO = 0.1
+
+
+class Template(object):
+    """一类SQL：生成带不同字面量的语句，以及该类SQL的耗时和扫描行数分布"""
+
+    __slots__ = ("index", "kind", "table", "db_name", "account", "sql_hash", "time_mu", "scan_mu")
+
+    def __init__(self, index, rng):
+        self.index = index
+        self.kind = rng.randrange(5)
+        self.table = TABLES[rng.randrange(len(TABLES))]
+        self.db_name = DB_NAMES[min(int(rng.expovariate(0.8)), len(DB_NAMES) - 1)]
+        self.account = ACCOUNTS[min(int(rng.expovariate(0.6)), len(ACCOUNTS) - 1)]
+        self.sql_hash = hashlib.md5(f"template-{index}".encode()).hexdigest()
+        # 耗时和扫描行数服从对数正态分布，不同模板的中位数不同
+        self.time_mu = rng.uniform(math.log(1000), math.log(8000))
+        self.scan_mu = rng.uniform(math.log(100), math.log(2000000))
+
+    def sql(self, rng):
+        table, value = self.table, rng.randrange(1, 10 ** 7)
+        if self.kind == 0:
+            return f"SELECT * FROM {table} WHERE id = {value}"
+        if self.kind == 1:
+            ids = ", ".join(str(rng.randrange(1, 10 ** 7)) for _ in range(rng.randrange(1, 20)))
+            return f"SELECT id, status, created_at FROM {table} WHERE user_id IN ({ids}) AND status = {STATUSES[value % 5]}"
+        if self.kind == 2:
+            return (f"SELECT t.*, u.name FROM {table} t JOIN users u ON t.user_id = u.id "
+                    f"WHERE t.created_at >= '2024-01-{value % 28 + 1:02d}' ORDER BY t.id DESC LIMIT {value % 100 + 10}")
+        if self.kind == 3:
+            return f"UPDATE {table} SET status = {STATUSES[value % 5]}, updated_at = NOW() WHERE id = {value}"
+        return f"SELECT COUNT(*) FROM {table} WHERE status = {STATUSES[value % 5]} AND amount > {value / 100:.2f}"
+
+    def text(self):
+        """DescribeSlowLogs 返回的SQL模板：字面量替换为 ?，保留原有的大小写和空白"""
+        table = self.table
+        if self.kind == 0:
+            return f"SELECT * FROM {table} WHERE id = ?"
+        if self.kind == 1:
+            return f"SELECT id, status, created_at FROM {table} WHERE user_id IN (?) AND status = ?"
+        if self.kind == 2:
+            return (f"SELECT t.*, u.name FROM {table} t JOIN users u ON t.user_id = u.id "
+                    f"WHERE t.created_at >= ? ORDER BY t.id DESC LIMIT ?")
+        if self.kind == 3:
+            return f"UPDATE {table} SET status = ?, updated_at = NOW() WHERE id = ?"
+        return f"SELECT COUNT(*) FROM {table} WHERE status = ? AND amount > ?"
+
+
+class SyntheticClient(object):
+    """
+    代替 AcsClient 返回合成的 DescribeSlowLogRecords 分页结果，以及 DescribeSlowLogs 的按天、按SQL模板汇总结果。
+
+    total_records 条记录按白天高、夜间低的分布分散到 [start_time, end_time) 的每一分钟；
+    SQL 模板的出现频率服从 Zipf 分布（少数SQL占大部分记录）。
+    同一实例、同一分钟的记录由固定种子生成，任意时间窗口和分页的请求都返回一致的数据。
+    """
+
+    def __init__(self, total_records, start_time, end_time, seed=1, template_count=5000):
+        self.start_time = start_time
+        self.seed = seed
+        minutes = int((end_time - start_time).total_seconds() // 60)
+        weights = [1.2 + math.sin(((start_time + datetime.timedelta(minutes=m)).hour - 9) / 24 * 2 * math.pi)
+                   for m in range(minutes)]
+        total_weight = sum(weights)
+        counts = [int(total_records * w / total_weight) for w in weights]
+        for m in range(total_records - sum(counts)):
+            counts[m % minutes] += 1
+        # prefix[m] 为第 m 分钟之前的记录数
+        self.prefix = array("q", [0])
+        for count in counts:
+            self.prefix.append(self.prefix[-1] + count)
+
+        rng = random.Random(seed)
+        self.templates = [Template(i, rng) for i in range(template_count)]
+        zipf = [1 / (i + 1) ** 1.1 for i in range(template_count)]
+        total_zipf = sum(zipf)
+        self.template_cdf = []
+        acc = 0.0
+        for weight in zipf:
+            acc += weight / total_zipf
+            self.template_cdf.append(acc)
+        # (实例ID, 天) -> 当天的模板统计，汇总需要生成当天的全部记录，只计算一次
+        self.day_templates = {}
+        self.lock = threading.Lock()
+
+    def minute_index(self, value):
+        return int((value - self.start_time).total_seconds() // 60)
+
+    def minute_records(self, instance_id, minute):
+        """生成某一分钟的全部记录"""
+        return [record for _, record in self.minute_rows(instance_id, minute)]
+
+    def minute_rows(self, instance_id, minute):
+        """生成某一分钟的全部 (模板, 记录)"""
+        count = self.prefix[minute + 1] - self.prefix[minute]
+        rng = random.Random(f"{self.seed}/{instance_id}/{minute}")
+        base = self.start_time + datetime.timedelta(minutes=minute)
+        cdf, templates = self.template_cdf, self.templates
+        records = []
+        for _ in range(count):
+            template = templates[min(bisect.bisect_left(cdf, rng.random()), len(templates) - 1)]
+            scan_rows = int(rng.lognormvariate(template.scan_mu, 1.0))
+            records.append((template, {
+                "ExecutionStartTime": (base + datetime.timedelta(seconds=rng.randrange(60))).strftime(TIME_FORMAT),
+                "SQLHash": "" if rng.random() < MISSING_HASH_RATIO else template.sql_hash,
+                "SQLText": template.sql(rng),
+                "QueryTimeMS": round(rng.lognormvariate(template.time_mu, 0.6)),
+                "ScanRows": scan_rows,
+                "ReturnRowCounts": min(scan_rows, rng.randrange(1, 1000)),
+                "ParseRowCounts": scan_rows + rng.randrange(1000),
+                "AccountName": template.account,
+                "DBName": template.db_name,
+                # 每类SQL来自固定的几台应用主机
+                "HostAddress": f"10.0.{template.index % 4}.{(template.index + rng.randrange(HOSTS_PER_TEMPLATE)) % HOST_COUNT}",
+                "QueryTimes": 1,
+            }))
+        return records
+
+    def records(self, instance_id, first_minute, last_minute, offset, limit):
+        """返回 [first_minute, last_minute] 内从第 offset 条开始的 limit 条记录，只生成涉及的分钟"""
+        prefix = self.prefix
+        start = prefix[first_minute] + offset
+        end = min(start + limit, prefix[last_minute + 1])
+        minute = bisect.bisect_right(prefix, start) - 1
+        records = []
+        while minute <= last_minute and prefix[minute] < end:
+            minute_records = self.minute_records(instance_id, minute)
+            records.extend(minute_records[max(0, start - prefix[minute]):end - prefix[minute]])
+            minute += 1
+        return records
+
+    def slow_log_templates(self, instance_id, day):
+        """第 day 天（从 start_time 所在的天算起）按SQL模板汇总的统计，按执行次数降序"""
+        key = (instance_id, day)
+        with self.lock:
+            if key in self.day_templates:
+                return self.day_templates[key]
+        day_start = self.start_time.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=day)
+        first = max(0, self.minute_index(day_start))
+        last = min(len(self.prefix) - 1, self.minute_index(day_start + datetime.timedelta(days=1)))
+        groups = {}
+        for minute in range(first, last):
+            for template, record in self.minute_rows(instance_id, minute):
+                group = groups.get(template.index)
+                if group is None:
+                    group = groups[template.index] = {
+                        "SQLText": template.text(),
+                        "SQLHASH": template.sql_hash,
+                        "DBName": template.db_name,
+                        "CreateTime": day_start.strftime(DAY_FORMAT),
+                        "MySQLTotalExecutionCounts": 0,
+                        "MySQLTotalExecutionTimes": 0,
+                        "MaxExecutionTimeMS": 0,
+                        "ParseTotalRowCounts": 0,
+                        "ParseMaxRowCount": 0,
+                        "ReturnTotalRowCounts": 0,
+                    }
+                group["MySQLTotalExecutionCounts"] += record["QueryTimes"]
+                group["MySQLTotalExecutionTimes"] += record["QueryTimeMS"]
+                group["MaxExecutionTimeMS"] = max(group["MaxExecutionTimeMS"], record["QueryTimeMS"])
+                group["ParseTotalRowCounts"] += record["ParseRowCounts"]
+                group["ParseMaxRowCount"] = max(group["ParseMaxRowCount"], record["ParseRowCounts"])
+                group["ReturnTotalRowCounts"] += record["ReturnRowCounts"]
+        rows = sorted(groups.values(), key=lambda x: x["MySQLTotalExecutionCounts"], reverse=True)
+        with self.lock:
+            self.day_templates[key] = rows
+        return rows
+
+    def describe_slow_logs(self, params):
+        """DescribeSlowLogs：开始和结束时间所在的天都包含在内，每个模板每天一行"""
+        day_zero = self.start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        last_day = (self.start_time + datetime.timedelta(minutes=len(self.prefix) - 2) - day_zero).days
+        first = max(0, (datetime.datetime.strptime(params["StartTime"], DAY_FORMAT) - day_zero).days)
+        last = min(last_day, (datetime.datetime.strptime(params["EndTime"], DAY_FORMAT) - day_zero).days)
+        rows = [row for day in range(first, last + 1) for row in self.slow_log_templates(params["DBInstanceId"], day)]
+        page_size, page_number = int(params["PageSize"]), int(params["PageNumber"])
+        records = rows[(page_number - 1) * page_size:page_number * page_size]
+        return json.dumps({
+            "TotalRecordCount": len(rows),
+            "PageNumber": page_number,
+            "PageRecordCount": len(records),
+            "Items": {"SQLSlowLog": records},
+        }, ensure_ascii=False).encode()
+
+    def do_action_with_exception(self, request):
+        if request.get_action_name() == "DescribeSlowLogs":
+            return self.describe_slow_logs(request.get_query_params())
+        if request.get_action_name() != "DescribeSlowLogRecords":
+            raise ValueError(f"合成数据不支持 {request.get_action_name()}")
+        params = request.get_query_params()
+        last = len(self.prefix) - 2
+        # 与 API 一致，结束时间所在的分钟也包含在内；超出数据范围的部分没有记录
+        first_minute = max(0, self.minute_index(datetime.datetime.strptime(params["StartTime"], API_TIME_FORMAT)))
+        last_minute = min(last, self.minute_index(datetime.datetime.strptime(params["EndTime"], API_TIME_FORMAT)))
+        if first_minute > last_minute:
+            total, records = 0, []
+        else:
+            page_size, page_number = int(params["PageSize"]), int(params["PageNumber"])
+            total = self.prefix[last_minute + 1] - self.prefix[first_minute]
+            records = self.records(params["DBInstanceId"], first_minute, last_minute,
+                                   (page_number - 1) * page_size, page_size)
+        return json.dumps({
+            "TotalRecordCount": total,
+            "PageNumber": int(params.get("PageNumber", 1)),
+            "PageRecordCount": len(records),
+            "Items": {"SQLSlowRecord": records},
+        }).encode()
+
+
+def main(argv=None):
+    """通过与周报相同的分页拉取流程请求合成数据，并录制为可以回放的目录"""
+    from slow_sql import aliyun
+    from slow_sql.fetcher import PAGE_SIZE, iter_pages, last_days, new_coverage
+    from slow_sql.replay import RecordingClient, write_manifest
+    from slow_sql.report import MAX_PAGES
+    from slow_sql.statistics import MAX_PAGES as STATISTICS_MAX_PAGES
+
+    parser = argparse.ArgumentParser(prog="python -m slow_sql.synthetic", description="生成合成的一周慢日志录制目录")
+    parser.add_argument("--records", type=int, default=2000000, help="每个实例的记录数")
+    parser.add_argument("--instances", default="rm-synthetic", help="实例ID，多个以逗号分隔（需与回放时的配置一致）")
+    parser.add_argument("--output", required=True, help="录制目录")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--statistics", action="store_true",
+                        help="同时录制 DescribeSlowLogs 的模板统计（回放 statistics、combined 子命令时需要）")
+    args = parser.parse_args(argv)
+
+    now = datetime.datetime.now()
+    _, _, window_start, window_end = last_days(7, now)
+    write_manifest(args.output, now)
+    client = RecordingClient(SyntheticClient(args.records, window_start, window_end, seed=args.seed), args.output)
+    for instance_id in args.instances.split(","):
+        coverage = new_coverage()
+        fetched = 0
+        for _, records in iter_pages(client, aliyun.slow_log_records_request_builder(instance_id, replay=True),
+                                     "SQLSlowRecord", window_start, window_end, API_TIME_FORMAT,
+                                     datetime.timedelta(minutes=1), "ExecutionStartTime", coverage,
+                                     page_size=PAGE_SIZE, max_pages=MAX_PAGES, workers=args.workers,
+                                     label=f"[{instance_id}] "):
+            fetched += len(records)
+        print(f"[INFO] [{instance_id}] 已录制 {fetched} 条记录，共 {coverage['windows']} 个时间窗口")
+        if args.statistics:
+            coverage = new_coverage()
+            fetched = 0
+            for _, records in iter_pages(client, aliyun.slow_logs_request_builder(instance_id, replay=True),
+                                         "SQLSlowLog", window_start, window_end, DAY_FORMAT,
+                                         datetime.timedelta(days=1), "CreateTime", coverage,
+                                         page_size=PAGE_SIZE, max_pages=STATISTICS_MAX_PAGES, workers=args.workers,
+                                         label=f"[{instance_id}] "):
+                fetched += len(records)
+            print(f"[INFO] [{instance_id}] 已录制 {fetched} 条模板统计，共 {coverage['windows']} 个时间窗口")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# slow_sql/window.py
+# 滑动窗口聚合：最近一段时间内每条SQL的执行次数和耗时，按时间分桶保存在环形数组中，过期的桶整体淘汰
+
+import datetime
+
+# 桶编号 = (时间 - EPOCH) // 桶长度，所有窗口使用同一个起点
+EPOCH = datetime.datetime(1970, 1, 1)
+# 窗口中最多单独统计的键数量，超出的部分计入 OTHER_KEY，长时间运行时内存占用有上限
+MAX_KEYS = 50000
+OTHER_KEY = "其他"
+
+
+class SlidingWindow(object):
+    """
+    最近 span 时间内按键汇总的执行次数、总耗时和最大耗时。
+
+    时间按 bucket 分为 span // bucket 个桶，循环使用同一个数组（环形缓冲区），每个桶为 {键: [执行次数, 总耗时, 最大耗时]}。
+    totals 为窗口内各键的合计，记录加入时累加、桶淘汰时减去，查询合计不需要遍历所有桶；
+    最大耗时不能相减，只在需要时遍历桶计算。窗口随最新的记录时间或 advance(now) 向前滑动。
+    """
+
+    def __init__(self, span, bucket, max_keys=MAX_KEYS):
+        self.span = span
+        self.bucket = bucket
+        self.size = span // bucket
+        self.slots = [{} for _ in range(self.size)]
+        self.head = None  # 最新的桶编号
+        self.totals = {}  # 键 -> [执行次数, 总耗时]
+        self.max_keys = max_keys
+
+    def bucket_index(self, ts):
+        return (ts - EPOCH) // self.bucket
+
+    def advance(self, now):
+        """将窗口滑动到 now 所在的桶，淘汰滑出窗口的桶（每个桶只淘汰一次，与停顿的时间长短无关）"""
+        index = self.bucket_index(now)
+        if self.head is None:
+            self.head = index
+            return
+        if index <= self.head:
+            return
+        for expired in range(self.head + 1, min(index, self.head + self.size) + 1):
+            self.evict(expired % self.size)
+        self.head = index
+
+    def evict(self, slot):
+        totals = self.totals
+        for key, (count, total_time, _) in self.slots[slot].items():
+            total = totals[key]
+            total[0] -= count
+            total[1] -= total_time
+            if total[0] <= 0:
+                del totals[key]
+        self.slots[slot] = {}
+
+    def add(self, key, ts, executions, query_time):
+        """加入一条记录；早于窗口的记录忽略，晚于当前最新桶的记录使窗口向前滑动。返回是否加入"""
+        index = self.bucket_index(ts)
+        if self.head is None or index > self.head:
+            self.advance(ts)
+        elif index <= self.head - self.size:
+            return False
+        totals = self.totals
+        total = totals.get(key)
+        if total is None:
+            if len(totals) >= self.max_keys:
+                key = OTHER_KEY
+                total = totals.get(key)
+            if total is None:
+                total = totals[key] = [0, 0.0]
+        total[0] += executions
+        total[1] += query_time
+        slot = self.slots[index % self.size]
+        entry = slot.get(key)
+        if entry is None:
+            slot[key] = [executions, query_time, query_time]
+        else:
+            entry[0] += executions
+            entry[1] += query_time
+            if query_time > entry[2]:
+                entry[2] = query_time
+        return True
+
+    def get(self, key):
+        """返回 (执行次数, 总耗时)，窗口中没有该键时为 (0, 0.0)"""
+        total = self.totals.get(key)
+        return (total[0], total[1]) if total is not None else (0, 0.0)
+
+    def max_time(self, key):
+        return max((slot[key][2] for slot in self.slots if key in slot), default=0.0)
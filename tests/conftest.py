@@ -0,0 +1,9 @@
+# tests/conftest.py
+# 测试复用 benchmarks 目录下的假阿里云客户端和假飞书服务（fake_aliyun.py、feishu_stub.py）
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
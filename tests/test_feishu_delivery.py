@@ -0,0 +1,83 @@
+# tests/test_feishu_delivery.py
+# 飞书推送在本地桩服务（benchmarks/feishu_stub.py）上的重试、改发文本、写入发件箱和补发行为（需要安装 requests）
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from feishu_stub import start_stub, stop_stub  # noqa: E402
+from slow_sql.feishu import FeishuClient  # noqa: E402
+
+MAX_RETRIES = 2
+TEXT = {"msg_type": "text", "content": {"text": "慢SQL周报"}}
+
+
+def card(content):
+    return {"msg_type": "interactive", "card": {"elements": [{"tag": "div", "text": {"tag": "lark_md", "content": content}}]}}
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server, base_url = start_stub()
+    yield server, base_url
+    stop_stub(server)
+
+
+@pytest.fixture
+def client(tmp_path):
+    # 重试的退避时间缩短到毫秒级，Webhook 无响应时读取超时 0.3 秒
+    return FeishuClient(timeout=(1, 0.3), max_retries=MAX_RETRIES, base_delay=0.01, outbox_dir=str(tmp_path),
+                        send_interval=0)
+
+
+def outbox_messages(client):
+    messages = []
+    for name in sorted(os.listdir(client.outbox_dir)):
+        with open(os.path.join(client.outbox_dir, name)) as f:
+            messages.append(json.load(f))
+    return messages
+
+
+@pytest.mark.parametrize("path", ["/flaky/2/retry-5xx", "/limited/2/retry-11232"])
+def test_retries_server_errors_and_rate_limits(stub, client, path):
+    server, base_url = stub
+    assert client.send(base_url + path, [card("a")], TEXT)
+    assert server.attempts[path] == 3
+    assert server.received[path] == [card("a")]
+    assert outbox_messages(client) == []
+
+
+def test_rejected_card_falls_back_to_text_without_retry(stub, client):
+    server, base_url = stub
+    path = "/reject/fallback"
+    assert client.send(base_url + path, [card("a")], TEXT)
+    # 卡片只发送一次，被拒绝后改发文本
+    assert server.attempts[path] == 2
+    assert server.received[path] == [TEXT]
+    assert outbox_messages(client) == []
+
+
+def test_hanging_webhook_is_spooled(stub, client):
+    server, base_url = stub
+    path = "/hang/spool"
+    assert not client.send(base_url + path, [card("a"), card("b")], TEXT)
+    assert server.attempts[path] == MAX_RETRIES + 1
+    messages = outbox_messages(client)
+    assert [message["payloads"] for message in messages] == [[card("a"), card("b")]]
+    assert messages[0]["webhook"] == base_url + path
+    assert messages[0]["fallback"] == TEXT
+
+
+def test_outbox_is_resent_in_order(stub, client):
+    server, base_url = stub
+    # 前 2 × (MAX_RETRIES + 1) 次请求失败：两条消息先后写入发件箱，补发时成功
+    path = f"/flaky/{2 * (MAX_RETRIES + 1)}/resend"
+    assert not client.send(base_url + path, [card("a1"), card("a2")])
+    assert not client.send(base_url + path, [card("b1")])
+    assert len(outbox_messages(client)) == 2
+    client.flush_outbox()
+    assert server.received[path] == [card("a1"), card("a2"), card("b1")]
+    assert outbox_messages(client) == []
@@ -0,0 +1,30 @@
+# tests/test_fingerprint.py
+# SQL 指纹：多行 VALUES 归并时保留 INSERT 的其余部分
+
+import pytest
+
+from slow_sql.fingerprint import normalize
+
+CASES = [
+    ("INSERT INTO t (a, b) VALUES (1, 2), (3, 4)", "insert into t(a,b) values(?+)"),
+    ("insert into t values(1,2)", "insert into t values(?+)"),
+    ("insert into t values(1,2) on duplicate key update a=values(a)",
+     "insert into t values(?+) on duplicate key update a=values(a)"),
+    ("INSERT INTO t (a, b) VALUES (1, now()), (2, now()) ON DUPLICATE KEY UPDATE b = VALUES(b), a = a + 1",
+     "insert into t(a,b) values(?+) on duplicate key update b=values(b),a=a + ?"),
+    ("INSERT INTO t (a, b) SELECT a, b FROM s WHERE id IN (1, 2, 3) ON DUPLICATE KEY UPDATE b = VALUES(b)",
+     "insert into t(a,b) select a,b from s where id in(?+) on duplicate key update b=values(b)"),
+    ("insert into t(a) select a from s where note = 'values(1)' limit 10",
+     "insert into t(a) select a from s where note=? limit ?"),
+]
+
+
+@pytest.mark.parametrize("sql, expected", CASES)
+def test_values_rows_collapse_without_swallowing_the_rest(sql, expected):
+    assert normalize(sql) == expected
+
+
+def test_row_count_does_not_change_fingerprint():
+    one = normalize("insert into t values(1,2) on duplicate key update a=values(a)")
+    many = normalize("insert into t values(1,2),(3,4),(5,6) on duplicate key update a=values(a)")
+    assert one == many
@@ -0,0 +1,47 @@
+# tests/test_parallel.py
+# 多进程聚合：按聚合键稳定分片，同一指纹的记录落在同一个分片，结果与单进程一致
+
+from fake_aliyun import make_record
+from slow_sql.aggregator import aggregate_page, new_stats, new_summary
+from slow_sql.decoding import to_record
+from slow_sql.parallel import ShardedAggregator, shard_of
+from slow_sql.rules import Rules
+
+RULES = Rules({})
+
+
+def records_without_hash(count):
+    records = []
+    for i in range(count):
+        record = make_record(i)
+        record["SQLHash"] = ""
+        # 只有字面量和空白不同，指纹相同
+        record["SQLText"] = f"select * from t{i % 7}  where id = {i} and note = 'n{i}'"
+        records.append(to_record(record))
+    return records
+
+
+def test_same_fingerprint_goes_to_same_shard():
+    records = records_without_hash(70)
+    for table in range(7):
+        assert len({shard_of(record, 4) for record in records[table::7]}) == 1
+    # 与进程无关：固定的键总是落在固定的分片
+    assert shard_of(to_record(dict(make_record(1), SQLHash="abc")), 4) == 0x352441C2 % 4
+
+
+def test_sharded_result_matches_single_process():
+    records = records_without_hash(700)
+    pages = [records[start:start + 100] for start in range(0, len(records), 100)]
+    summary, stats = new_summary(), new_stats()
+    for page in pages:
+        aggregate_page(summary, page, RULES, stats)
+
+    aggregator = ShardedAggregator(3, RULES, batch_size=50)
+    try:
+        aggregator.feed("rm-parallel", pages)
+        sharded, sharded_stats = aggregator.finish()["rm-parallel"]
+    finally:
+        aggregator.close()
+    assert sharded_stats == stats
+    assert len(sharded) == len(summary) == 7
+    assert sorted(zip(sharded.keys, sharded.count)) == sorted(zip(summary.keys, summary.count))
@@ -0,0 +1,72 @@
+# tests/test_profile.py
+# --profile 在线程池并发拉取（回放合成的录制目录）时的行为
+
+import cProfile
+import pstats
+import threading
+
+import pytest
+
+from slow_sql import cli, instrument, synthetic
+
+CONFIG = '''
+ACCESS_KEY_ID = "YOUR_ACCESS_KEY_ID"
+ACCESS_KEY_SECRET = "YOUR_ACCESS_KEY_SECRET"
+REGION_ID = "cn-hangzhou"
+DB_INSTANCE_ID = "rm-profile"
+FEISHU_WEBHOOK = ""
+FETCH_WORKERS = 4
+STORE_PATH = None
+OUTBOX_DIR = None
+'''
+
+
+@pytest.fixture
+def replay_dir(tmp_path, monkeypatch):
+    (tmp_path / "profile_config.py").write_text(CONFIG)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    assert synthetic.main(["--records", "3000", "--instances", "rm-profile", "--output", "rec"]) == 0
+    return "rec"
+
+
+def run_report(output, replay):
+    """在单独的线程中运行，线程池卡住时测试失败而不是一直等待"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("code", cli.main(
+        ["--config", "profile_config", "--profile", "--profile-output", output, "report", "--replay", replay,
+         "--dry-run"])), name="profile-runner", daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive(), "--profile 运行超时"
+    return result.get("code")
+
+
+def profiled_functions(path):
+    return {name for _, _, name in pstats.Stats(path).stats}
+
+
+def test_profile_with_threaded_fetch(replay_dir, tmp_path):
+    output = str(tmp_path / "report.pstats")
+    assert run_report(output, replay_dir) == 0
+    functions = profiled_functions(output)
+    assert "run_command" in functions
+    if instrument.PROFILE_THREADS:
+        # 拉取分页在工作线程中进行
+        assert "call_with_retry" in functions
+
+
+def test_threads_keep_running_when_profiler_cannot_be_enabled(replay_dir, tmp_path, monkeypatch):
+    class BusyProfile(cProfile.Profile):
+        """模拟其他线程中已有性能分析工具在运行"""
+
+        def enable(self, *args, **kwargs):
+            if threading.current_thread().name != "profile-runner":
+                raise ValueError("Another profiling tool is already active")
+            return super().enable(*args, **kwargs)
+
+    monkeypatch.setattr(cProfile, "Profile", BusyProfile)
+    monkeypatch.setattr(instrument, "PROFILE_THREADS", True)
+    output = str(tmp_path / "report.pstats")
+    assert run_report(output, replay_dir) == 0
+    assert "run_command" in profiled_functions(output)
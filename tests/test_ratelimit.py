@@ -0,0 +1,124 @@
+# tests/test_ratelimit.py
+# 共享限速器（ratelimit.RateLimiter）与 fetcher.call_with_retry 在服务端限流的假客户端上的行为
+
+import datetime
+import threading
+import time
+import types
+
+from fake_aliyun import (API_TIME_FORMAT, WEEK_END, WEEK_START, FakeAcsClient, ThrottlingAcsClient,
+                         build_fake_request)
+from slow_sql import report
+from slow_sql.fetcher import PAGE_SIZE, call_with_retry, fetch_records
+from slow_sql.ratelimit import DECREASE_FACTOR, RateLimiter
+
+LATENCY = 0.01
+
+
+class RecordingLimiter(RateLimiter):
+    """记录每次开始的暂停（开始时间, 结束时间）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pauses = []
+
+    def throttled(self):
+        pause = super().throttled()
+        if pause is not None:
+            self.pauses.append((self.paused_until - pause, self.paused_until))
+        return pause
+
+
+class RecordingClient(ThrottlingAcsClient):
+    """记录每个线程发出请求的时间"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request_times = {}
+
+    def do_action_with_exception(self, request):
+        self.request_times.setdefault(threading.get_ident(), []).append(time.monotonic())
+        return super().do_action_with_exception(request)
+
+
+def first_page_request():
+    return build_fake_request(WEEK_START.strftime(API_TIME_FORMAT), WEEK_END.strftime(API_TIME_FORMAT), 1)
+
+
+def fetch_all(client, pages, limiter):
+    fetched, _ = fetch_records(client, build_fake_request, "SQLSlowRecord", WEEK_START, WEEK_END, API_TIME_FORMAT,
+                               datetime.timedelta(minutes=1), "ExecutionStartTime",
+                               max_pages=pages, workers=4, limiter=limiter)
+    return [record for page in fetched for record in page]
+
+
+def test_rate_is_cut_after_throttling():
+    client = ThrottlingAcsClient(PAGE_SIZE, server_rate=1, latency=LATENCY)
+    limiter = RateLimiter(100)
+    call_with_retry(client, first_page_request(), limiter=limiter)
+    assert limiter.rate == 100
+    # 服务端1秒内只接受1个请求，第二个请求被限流后降速，暂停结束后重试成功
+    call_with_retry(client, first_page_request(), limiter=limiter)
+    assert client.throttled >= 1
+    assert limiter.throttles == client.throttled
+    assert limiter.rate <= 100 * DECREASE_FACTOR + 100 / 50
+
+
+def test_pause_is_shared_by_all_threads():
+    client = RecordingClient(PAGE_SIZE, server_rate=4, latency=LATENCY)
+    limiter = RecordingLimiter(None, max_concurrent=8)
+    barrier = threading.Barrier(8)
+
+    def send():
+        barrier.wait()
+        call_with_retry(client, first_page_request(), limiter=limiter)
+
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.accepted == 8
+    retried = [calls for calls in client.request_times.values() if len(calls) > 1]
+    # 同时被限流的线程只开始一次暂停，其他线程也等到暂停结束才重试
+    assert len(retried) >= 2
+    assert len(limiter.pauses) < client.throttled
+    _, first_pause_end = limiter.pauses[0]
+    assert all(calls[1] >= first_pause_end for calls in retried)
+
+
+def test_rate_recovers_after_throttling():
+    limiter = RateLimiter(50)
+    limiter.throttled()
+    assert limiter.rate < 50
+    # 暂停结束后请求全部成功，速率逐步回升到上限
+    client = ThrottlingAcsClient(30 * PAGE_SIZE, server_rate=1000, latency=LATENCY)
+    assert len(fetch_all(client, 30, limiter)) == 30 * PAGE_SIZE
+    assert client.throttled == 0
+    assert limiter.rate == 50
+
+
+def test_throttled_page_is_retried_not_dropped():
+    pages = 15
+    client = ThrottlingAcsClient(pages * PAGE_SIZE, server_rate=10, latency=LATENCY)
+    # 限速高于服务端上限，依靠流控自适应降速
+    records = fetch_all(client, pages, RateLimiter(40))
+    assert client.throttled > 0
+    assert len(records) == pages * PAGE_SIZE
+    assert len({record["SQLText"] for record in records}) == pages * PAGE_SIZE
+
+
+def test_throttle_timeout_fails_only_affected_instance(monkeypatch):
+    monkeypatch.setattr(report.aliyun, "slow_log_records_request_builder",
+                        lambda instance_id, replay=False: build_fake_request)
+    config = types.SimpleNamespace(API_RATE_LIMIT=50, API_THROTTLE_TIMEOUT=1, FETCH_WORKERS=2, JSON_DECODER="json")
+    instances = [{"instance_id": "rm-throttled", "region_id": "cn-beijing"},
+                 {"instance_id": "rm-ok", "region_id": "cn-hangzhou"}]
+    # 北京区域的服务端拒绝所有请求
+    clients = {"cn-beijing": ThrottlingAcsClient(3 * PAGE_SIZE, server_rate=0, latency=LATENCY),
+               "cn-hangzhou": FakeAcsClient(3 * PAGE_SIZE, latency=LATENCY)}
+    result = report.collect(config, instances, WEEK_START, WEEK_END, clients=clients)
+    assert result["failed_instances"] == ["rm-throttled"]
+    assert list(result["instance_results"]) == ["rm-ok"]
+    assert result["instance_results"]["rm-ok"]["fetched"] == 3 * PAGE_SIZE
@@ -0,0 +1,28 @@
+# tests/test_report_sync.py
+# 增量同步到本地存储时记录的高水位
+
+import datetime
+import types
+
+from fake_aliyun import FakeAcsClient, build_fake_request
+from slow_sql import report
+from slow_sql.fetcher import utc_now
+from slow_sql.store import get_synced_until, open_store
+
+
+def test_synced_until_never_passes_current_utc_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(report.aliyun, "slow_log_records_request_builder",
+                        lambda instance_id, replay=False: build_fake_request)
+    store_path = str(tmp_path / "store.db")
+    started = utc_now().replace(second=0, microsecond=0)
+    # 按 UTC+8 的本地时间计算的窗口结束时间比当前的 UTC 时间晚
+    window_end = started + datetime.timedelta(hours=8)
+    report.collect(types.SimpleNamespace(JSON_DECODER="json"), [{"instance_id": "rm-sync", "region_id": "cn-hangzhou"}],
+                   started - datetime.timedelta(days=1), window_end, store_path=store_path, sync_only=True,
+                   clients={"cn-hangzhou": FakeAcsClient(10, latency=0)})
+    store = open_store(store_path)
+    try:
+        synced_until = get_synced_until(store, "rm-sync")
+    finally:
+        store.close()
+    assert started <= synced_until <= utc_now()